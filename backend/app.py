@@ -2,6 +2,7 @@ from flask import Flask, send_from_directory
 from flask_cors import CORS
 from routes.image_recognition_routes import image_recognition_bp
 from routes.individuos_routes import individuos_bp
+from routes.health_routes import health_bp
 from config import IMAGENES_DETECTADAS, IMAGENES_REFERENCIA
 
 app = Flask(__name__)
@@ -10,6 +11,7 @@ CORS(app, origins=["http://localhost:4200"])
 # Registrar blueprints
 app.register_blueprint(image_recognition_bp, url_prefix="/api")
 app.register_blueprint(individuos_bp, url_prefix="/api")
+app.register_blueprint(health_bp)
 
 # Endpoint para servir imágenes de referencia
 @app.route("/imagenes/referencia/<filename>")
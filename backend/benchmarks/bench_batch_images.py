@@ -0,0 +1,118 @@
+# bench_batch_images.py
+# --------------------------
+# 100 imágenes: 100 llamadas secuenciales a /detectar_imagen vs una sola
+# llamada a /detectar_imagenes (NDJSON en streaming)
+#
+# Con --url se mide contra un servidor en marcha (HTTP real); sin --url se
+# usa el cliente de pruebas de Flask dentro del proceso (sin red, pero con
+# toda la pila WSGI y los modelos cargados). Las imágenes se toman de --dir
+# (se repiten hasta llegar a --imagenes) o de imagenes/referencia.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_batch_images --dir /datos/fotos --imagenes 100
+#     python -m benchmarks.bench_batch_images --url http://localhost:5000/api --imagenes 100
+# --------------------------
+
+import os
+import json
+import time
+import uuid
+import argparse
+import itertools
+import urllib.request
+from io import BytesIO
+
+from utils.encoding_cache import EXTENSIONES_IMAGEN
+
+
+def load_images(directorio: str, n: int):
+    nombres = sorted(f for f in os.listdir(directorio) if f.lower().endswith(EXTENSIONES_IMAGEN))
+    if not nombres:
+        raise SystemExit(f"No hay imágenes en {directorio}")
+    out = []
+    for i, nombre in zip(range(n), itertools.cycle(nombres)):
+        with open(os.path.join(directorio, nombre), "rb") as f:
+            out.append((f"{i:04d}_{nombre}", f.read()))
+    return out
+
+
+def multipart(campo: str, imagenes):
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for nombre, data in imagenes:
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{campo}\"; "
+                   f"filename=\"{nombre}\"\r\nContent-Type: application/octet-stream\r\n\r\n".encode())
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class HttpClient:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def post(self, ruta: str, campo: str, imagenes):
+        body, ctype = multipart(campo, imagenes)
+        req = urllib.request.Request(self.url + ruta, data=body, headers={"Content-Type": ctype})
+        with urllib.request.urlopen(req) as resp:
+            for line in resp:
+                yield line
+
+
+class FlaskClient:
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def post(self, ruta: str, campo: str, imagenes):
+        data = {campo: [(BytesIO(d), n) for n, d in imagenes]}
+        resp = self.client.post("/api" + ruta, data=data, content_type="multipart/form-data", buffered=False)
+        for line in resp.response:
+            yield line
+        resp.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="imagenes/referencia")
+    parser.add_argument("--imagenes", type=int, default=100)
+    parser.add_argument("--url", default=None, help="Base de la API, p. ej. http://localhost:5000/api")
+    args = parser.parse_args()
+
+    imagenes = load_images(args.dir, args.imagenes)
+    client = HttpClient(args.url) if args.url else FlaskClient()
+
+    # Calentamiento (pool de encodings, YOLO)
+    list(client.post("/detectar_imagen", "file", imagenes[:1]))
+
+    t0 = time.perf_counter()
+    for img in imagenes:
+        b"".join(client.post("/detectar_imagen", "file", [img]))
+    t_seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    t_primera = None
+    lineas = 0
+    resumen = None
+    for line in client.post("/detectar_imagenes", "files", imagenes):
+        for parte in line.splitlines():
+            if not parte.strip():
+                continue
+            resultado = json.loads(parte)
+            if "resumen" in resultado:
+                resumen = resultado["resumen"]
+            else:
+                lineas += 1
+                t_primera = t_primera or time.perf_counter() - t0
+    t_batch = time.perf_counter() - t0
+
+    print(f"{len(imagenes)} imágenes de {args.dir} | {'HTTP ' + args.url if args.url else 'cliente Flask en proceso'}")
+    print(f"  /detectar_imagen x{len(imagenes)} : {t_seq:7.2f} s ({len(imagenes) / t_seq:6.2f} img/s)")
+    print(f"  /detectar_imagenes      : {t_batch:7.2f} s ({len(imagenes) / t_batch:6.2f} img/s), "
+          f"primera imagen a los {1000 * (t_primera or 0):.0f} ms, {lineas} resultados")
+    print(f"  x{t_seq / t_batch:.2f} | resumen: {resumen}")
+
+
+if __name__ == "__main__":
+    main()
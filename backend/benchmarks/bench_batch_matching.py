@@ -0,0 +1,78 @@
+# bench_batch_matching.py
+# --------------------------
+# Microbenchmark del emparejamiento por frame: bucle cara a cara vs lote
+#
+# Simula la consulta a Mongo con una latencia fija por viaje de ida y vuelta.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_batch_matching --galeria 10000 --rtt-ms 0.3
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+
+from utils.face_index import FaceIndex
+
+
+class FakeMongo:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def find_one(self, individuo_id):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        return {"id": individuo_id}
+
+    def find_in(self, individuo_ids):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        return {i: {"id": i} for i in set(individuo_ids)}
+
+
+def per_face(index: FaceIndex, encs: np.ndarray, db: FakeMongo):
+    """
+    Comportamiento anterior: una consulta k=1 + split del nombre + find_one por cara.
+    """
+    for enc in encs:
+        distances, nombres = index.query_names([enc], k=1)
+        if distances[0][0] < 0.6:
+            db.find_one(nombres[0][0].split("___")[0])
+
+
+def batched(index: FaceIndex, encs: np.ndarray, db: FakeMongo):
+    _, ids = index.match(encs, 0.6)
+    db.find_in([i for i in ids if i])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--galeria", type=int, default=10000)
+    parser.add_argument("--rtt-ms", type=float, default=0.3)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n_personas = max(1, args.galeria // 5)
+    centros = rng.normal(0, 0.3, (n_personas, 128))
+    labels = rng.integers(0, n_personas, args.galeria)
+    gallery = centros[labels] + rng.normal(0, 0.03, (args.galeria, 128))
+    index = FaceIndex.from_matrix(gallery, [f"ind{l}___{i}" for i, l in enumerate(labels)])
+
+    print(f"Galería: {args.galeria} caras, RTT simulado {args.rtt_ms} ms")
+    for n_faces in (1, 10, 100):
+        encs = centros[rng.integers(0, n_personas, n_faces)] + rng.normal(0, 0.03, (n_faces, 128))
+        for nombre, fn in (("cara a cara", per_face), ("lote", batched)):
+            db = FakeMongo(args.rtt_ms / 1000)
+            t0 = time.perf_counter()
+            for _ in range(args.repeticiones):
+                fn(index, encs, db)
+            t = (time.perf_counter() - t0) / args.repeticiones
+            print(f"  {n_faces:4d} caras | {nombre:12s}: {t * 1000:8.2f} ms/frame, "
+                  f"{db.round_trips // args.repeticiones:4d} viajes a Mongo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_detection_scale.py
+# --------------------------
+# Latencia y recall de la detección de caras a varias escalas
+#
+# Para cada imagen de la carpeta (opcionalmente reescalada a una resolución
+# de prueba, p. ej. 4K) se detectan las caras a resolución completa, que se
+# toman como referencia, y a cada escala con frame_analysis.locate_faces.
+# Recall = caras de referencia con una detección de IoU >= 0.5 a esa escala.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_detection_scale --imagenes imagenes/referencia --lado 3840
+#     python -m benchmarks.bench_detection_scale --escalas 1 0.75 0.5 0.33 auto --min-cara 80
+# --------------------------
+
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from utils.encoding_cache import EXTENSIONES_IMAGEN
+from utils.face_tracker import _iou
+from utils.frame_analysis import detection_scale, locate_faces
+
+
+def load_images(folder: str, lado: int, limite: int):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(EXTENSIONES_IMAGEN):
+            continue
+        img = cv2.imread(os.path.join(folder, name))
+        if img is None:
+            continue
+        if lado:
+            f = lado / max(img.shape[:2])
+            img = cv2.resize(img, None, fx=f, fy=f, interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        if len(images) >= limite:
+            break
+    return images
+
+
+def recall(reference, found) -> int:
+    return sum(1 for r in reference if any(_iou(r, f) >= 0.5 for f in found))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--imagenes", default="imagenes/referencia")
+    parser.add_argument("--lado", type=int, default=1920, help="Lado mayor de las imágenes de prueba (0 = original)")
+    parser.add_argument("--limite", type=int, default=50)
+    parser.add_argument("--escalas", nargs="+", default=["1", "0.75", "0.5", "0.33", "auto"])
+    parser.add_argument("--min-cara", type=int, default=80)
+    parser.add_argument("--max-lado", type=int, default=1280)
+    args = parser.parse_args()
+
+    images = load_images(args.imagenes, args.lado, args.limite)
+    if not images:
+        print("No hay imágenes")
+        return
+    print(f"{len(images)} imágenes de {images[0].shape[1]}x{images[0].shape[0]}")
+
+    t0 = time.perf_counter()
+    reference = [locate_faces(img, 1.0) for img in images]
+    t_ref = (time.perf_counter() - t0) / len(images)
+    total = sum(len(r) for r in reference)
+
+    for escala in args.escalas:
+        downscale = escala if escala == "auto" else float(escala)
+        t0 = time.perf_counter()
+        found, scales = [], []
+        for img in images:
+            s = detection_scale(*img.shape[:2], downscale=downscale, min_face_size=args.min_cara,
+                                max_side=args.max_lado)
+            scales.append(s)
+            found.append(locate_faces(img, s))
+        t = (time.perf_counter() - t0) / len(images)
+        hits = sum(recall(r, f) for r, f in zip(reference, found))
+        print(
+            f"escala {escala:>5s} (efectiva {np.mean(scales):.2f}): {1000 * t:8.1f} ms/imagen "
+            f"(x{t_ref / t:.2f}) | recall {hits}/{total} = {hits / max(total, 1):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
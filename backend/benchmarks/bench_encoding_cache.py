@@ -0,0 +1,77 @@
+# bench_encoding_cache.py
+# --------------------------
+# Benchmark de arranque con la caché de encodings (10k referencias sintéticas)
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_encoding_cache --n 10000
+# --------------------------
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.encoding_cache import EncodingCache
+
+
+def _fake_encoder(rng: np.random.Generator, calls: list):
+    def encode(path: str):
+        calls.append(path)
+        return rng.normal(0, 0.1, 128)
+    return encode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--coste-encoding", type=float, default=0.25,
+                        help="Segundos estimados por face_encodings en una imagen real")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ref_dir = os.path.join(tmp, "referencia")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(ref_dir)
+        for i in range(args.n):
+            with open(os.path.join(ref_dir, f"ind{i % 1000}___{i:06d}.jpg"), "wb") as f:
+                f.write(rng.bytes(256))
+
+        cache = EncodingCache(cache_dir)
+
+        calls = []
+        t0 = time.perf_counter()
+        enc, names = cache.sync(ref_dir, _fake_encoder(rng, calls))
+        t_cold = time.perf_counter() - t0
+        print(f"Arranque en frío : {t_cold:8.3f} s ({len(calls)} encodings, sin contar face_recognition)")
+        print(f"  estimado real  : {t_cold + len(calls) * args.coste_encoding:8.1f} s")
+
+        calls = []
+        t0 = time.perf_counter()
+        enc, names = cache.sync(ref_dir, _fake_encoder(rng, calls))
+        t_warm = time.perf_counter() - t0
+        print(f"Arranque en cache: {t_warm * 1000:8.1f} ms ({len(calls)} encodings, {len(names)} refs)")
+
+        # Cambios incrementales: 10 nuevas, 10 modificadas, 10 borradas
+        for i in range(10):
+            with open(os.path.join(ref_dir, f"nuevo___{i}.jpg"), "wb") as f:
+                f.write(rng.bytes(256))
+        files = sorted(os.listdir(ref_dir))
+        for name in files[:10]:
+            with open(os.path.join(ref_dir, name), "wb") as f:
+                f.write(rng.bytes(256))
+        for name in files[10:20]:
+            os.remove(os.path.join(ref_dir, name))
+
+        calls = []
+        t0 = time.perf_counter()
+        enc, names = cache.sync(ref_dir, _fake_encoder(rng, calls))
+        t_inc = time.perf_counter() - t0
+        print(f"Arranque increm. : {t_inc * 1000:8.1f} ms ({len(calls)} encodings, {len(names)} refs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench_encoding_service.py
+# --------------------------
+# Peticiones/segundo con 1-16 clientes concurrentes: encodings en el hilo
+# de la petición (como antes) vs servicio de encodings en procesos
+#
+# Cada "cliente" es un hilo que, como /detectar_imagen, localiza y codifica
+# las caras de una imagen repetidamente durante ``--segundos``.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_encoding_service --imagen imagenes/referencia/x.jpg
+#     python -m benchmarks.bench_encoding_service --imagen foto.jpg --clientes 1 2 4 8 16 --workers 4
+# --------------------------
+
+import os
+import time
+import argparse
+import threading
+
+import numpy as np
+from PIL import Image
+
+from utils.encoding_service import EncodingService
+
+
+def run_clients(service: EncodingService, rgb: np.ndarray, clients: int, seconds: float, detection):
+    stop = time.perf_counter() + seconds
+    counts = [0] * clients
+
+    def client(i):
+        while time.perf_counter() < stop:
+            service.encode_image(rgb, detection=detection)
+            counts[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--imagen", required=True)
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--escala", default="1", help="DOWNSCALE para localizar caras (número o auto)")
+    args = parser.parse_args()
+
+    with Image.open(args.imagen) as img:
+        rgb = np.asarray(img.convert("RGB"), dtype=np.uint8)
+    downscale = args.escala if args.escala == "auto" else float(args.escala)
+    detection = {"downscale": downscale, "min_face_size": 0, "max_side": 1280}
+
+    inline = EncodingService(workers=0)
+    pool = EncodingService(workers=args.workers)
+    # Arranque del pool (carga de dlib en cada proceso) fuera de la medida
+    for fut in [pool.submit_image(rgb, detection=detection) for _ in range(args.workers)]:
+        fut.result()
+
+    print(f"Imagen {rgb.shape[1]}x{rgb.shape[0]} | {os.cpu_count()} CPUs | pool de {args.workers} procesos")
+    for clients in args.clientes:
+        r_inline = run_clients(inline, rgb, clients, args.segundos, detection)
+        r_pool = run_clients(pool, rgb, clients, args.segundos, detection)
+        print(f"{clients:3d} clientes: en hilo {r_inline:7.2f} pet/s | pool {r_pool:7.2f} pet/s "
+              f"(x{r_pool / r_inline:.2f})")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_face_index.py
+# --------------------------
+# Benchmark de altas secuenciales: KDTree reconstruido vs FaceIndex incremental
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_face_index --n 10000
+#     python -m benchmarks.bench_face_index --n 10000 --churn 20000
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from utils.face_index import FaceIndex
+
+
+def bench_rebuild(encs: np.ndarray, queries: np.ndarray) -> float:
+    """
+    Comportamiento anterior de add_reference_encoding: vstack + KDTree nuevo en cada alta.
+    """
+    t0 = time.perf_counter()
+    kdtree = KDTree(encs[:1])
+    for enc in encs[1:]:
+        kdtree = KDTree(np.vstack([kdtree.data, enc]))
+    total = time.perf_counter() - t0
+    kdtree.query(queries, k=1)
+    return total
+
+
+def bench_incremental(encs: np.ndarray, queries: np.ndarray, threshold: int) -> float:
+    index = FaceIndex(merge_threshold=threshold)
+    t0 = time.perf_counter()
+    for i, enc in enumerate(encs):
+        index.add(enc, f"ind___{i}")
+    total = time.perf_counter() - t0
+    index.wait_merge()
+    index.query(queries, k=1)
+    return total
+
+
+def bench_churn(encs: np.ndarray, rounds: int, threshold: int):
+    """
+    Altas y bajas alternadas: el tamaño del buffer y la latencia deben mantenerse estables.
+    """
+    rng = np.random.default_rng(1)
+    index = FaceIndex.from_matrix(encs, [f"base___{i}" for i in range(len(encs))], merge_threshold=threshold)
+    queries = encs[:50]
+    step = max(1, rounds // 5)
+    for r in range(rounds):
+        index.add(rng.normal(0, 0.1, 128), f"churn___{r}")
+        index.remove(f"churn___{r}")
+        if r % step == 0 or r == rounds - 1:
+            index.wait_merge()  # medir sin competir con una reconstrucción en curso
+            t0 = time.perf_counter()
+            index.query(queries, k=1)
+            t_q = (time.perf_counter() - t0) / len(queries)
+            print(f"  ronda {r:7d}: vivas={len(index):6d} muertas={index.n_dead:4d} "
+                  f"buffer={index._buffer.nbytes / 1e6:6.1f} MB consulta={t_q * 1e6:7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--threshold", type=int, default=256)
+    parser.add_argument("--churn", type=int, default=0, help="Rondas de alta+baja sobre la galería")
+    parser.add_argument("--sin-rebuild", action="store_true", help="No medir el método anterior (muy lento)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    encs = rng.normal(0, 0.1, (args.n, 128))
+    queries = encs[rng.choice(args.n, 100)] + rng.normal(0, 0.01, (100, 128))
+
+    t_new = bench_incremental(encs, queries, args.threshold)
+    print(f"FaceIndex   : {t_new:8.3f} s  ({t_new / args.n * 1e6:8.1f} us/alta)")
+
+    if not args.sin_rebuild:
+        t_old = bench_rebuild(encs, queries)
+        print(f"KDTree+vstack: {t_old:8.3f} s  ({t_old / args.n * 1e6:8.1f} us/alta)")
+        print(f"Aceleración : x{t_old / t_new:.1f}")
+
+    if args.churn:
+        print("Churn de altas/bajas:")
+        bench_churn(encs, args.churn, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# bench_image_ingest.py
+# --------------------------
+# Lectura de la imagen en /detectar_imagen, por etapas: ruta anterior
+# (guardar la subida, releer con PIL, invertir canales con copia y volver a
+# RGB con cvtColor) vs decodificación en memoria (upload_buffer + decode_rgb)
+#
+# Sin --imagen genera un JPEG sintético de 12 MP (4000x3000). Sólo mide la
+# ingestión: la detección de caras y YOLO son iguales en las dos rutas.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_image_ingest
+#     python -m benchmarks.bench_image_ingest --imagen foto.jpg --repeticiones 20
+# --------------------------
+
+import io
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from statistics import median
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.image_ingest import StageTimer, decode_rgb, upload_buffer
+
+
+def synthetic_jpeg(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    img += rng.normal(0, 12, img.shape).astype(np.float32)
+    out = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def ruta_anterior(data: bytes, tmpdir: str, timer: StageTimer) -> np.ndarray:
+    path = os.path.join(tmpdir, "subida.jpg")
+    with timer.stage("guardar_subida"):
+        with open(path, "wb") as f:
+            shutil.copyfileobj(io.BytesIO(data), f)
+    with timer.stage("leer_pil"):
+        with Image.open(path) as img:
+            frame = np.array(img.convert("RGB"), dtype=np.uint8)
+    with timer.stage("rgb_a_bgr"):
+        frame_bgr = frame[:, :, ::-1].copy()
+    with timer.stage("bgr_a_rgb"):
+        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+
+def ruta_nueva(data: bytes, timer: StageTimer) -> np.ndarray:
+    stream = io.BytesIO(data)  # como FileStorage.stream en memoria
+    with upload_buffer(stream) as buf:
+        with timer.stage("decodificacion"):
+            return decode_rgb(buf)
+
+
+def run(fn, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        timer = StageTimer()
+        rgb = fn(timer)
+        tiempos.append(timer.as_dict())
+    return rgb, {k: median(t[k] for t in tiempos) for k in tiempos[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--imagen", default=None)
+    parser.add_argument("--ancho", type=int, default=4000)
+    parser.add_argument("--alto", type=int, default=3000)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.imagen:
+        with open(args.imagen, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_jpeg(args.ancho, args.alto)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rgb_old, t_old = run(lambda t: ruta_anterior(data, tmpdir, t), args.repeticiones)
+    rgb_new, t_new = run(lambda t: ruta_nueva(data, t), args.repeticiones)
+
+    h, w = rgb_new.shape[:2]
+    diff = np.abs(rgb_old.astype(np.int16) - rgb_new.astype(np.int16)).mean()
+    print(f"Imagen {w}x{h} ({w * h / 1e6:.1f} MP, {len(data) / 1e6:.1f} MB) | mediana de {args.repeticiones}")
+    print(f"Diferencia media de píxel PIL vs cv2: {diff:.2f}")
+    print("Ruta anterior (disco + PIL + 2 copias):")
+    for k, v in t_old.items():
+        print(f"  {k:16s}: {v:8.1f} ms")
+    print("Decodificación en memoria (1 array RGB):")
+    for k, v in t_new.items():
+        print(f"  {k:16s}: {v:8.1f} ms")
+    print(f"Ahorro: {t_old['total'] - t_new['total']:.1f} ms por petición (x{t_old['total'] / t_new['total']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# bench_index_stress.py
+# --------------------------
+# Prueba de estrés del índice de caras: hilos que dan de alta y de baja
+# individuos (con fusiones y compactaciones en segundo plano, y recargas desde
+# un snapshot en disco) mientras otros hilos detectan
+#
+# Cada individuo tiene un centro propio, lejos de los demás, así que una
+# consulta con el centro de X sólo puede devolver X o ninguno. Se comprueba:
+#   - match() nunca devuelve otro individuo
+#   - los individuos "fijos" (nunca borrados) se encuentran siempre
+#   - en un snapshot, la fila devuelta, su nombre y su distancia son de la misma versión
+#   - la versión que ve cada lector nunca retrocede
+# Termina con código 1 si hay alguna inconsistencia. Una versión corta se
+# ejecuta con los tests (tests/test_face_index_stress.py).
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_index_stress --segundos 10 --escritores 2 --lectores 4
+# --------------------------
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from utils.face_index import FaceIndex, individuo_id_from_name
+
+THRESHOLD = 0.6
+
+
+class Estado:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.errores = []
+        self.consultas = 0
+        self.altas = 0
+        self.bajas = 0
+        self.recargas = 0
+
+    def error(self, msg: str):
+        with self.lock:
+            if len(self.errores) < 20:
+                self.errores.append(msg)
+
+    def hilo(self, fn, *args):
+        # Una excepción en un hilo también cuenta como inconsistencia
+        def run():
+            try:
+                fn(*args)
+            except Exception as e:
+                self.error(f"{fn.__name__}: {type(e).__name__}: {e}")
+        return threading.Thread(target=run, name=fn.__name__)
+
+
+def escritor(index: FaceIndex, centros, fotos: int, libres: list, activos: list, lock, estado: Estado,
+             stop: threading.Event, seed: int):
+    rng = np.random.default_rng(seed)
+    while not stop.is_set():
+        with lock:
+            alta = libres and (not activos or rng.random() < 0.6)
+            p = libres.pop() if alta else activos.pop(int(rng.integers(len(activos)))) if activos else None
+        if p is None:
+            continue
+        if alta:
+            encs = centros[p] + rng.normal(0, 0.02, (fotos, centros.shape[1]))
+            index.add_many(encs, [f"p{p}___{i}" for i in range(fotos)])
+            with lock:
+                activos.append(p)
+                estado.altas += 1
+        else:
+            index.remove_individuo(f"p{p}")
+            with lock:
+                libres.append(p)
+                estado.bajas += 1
+
+
+def recargador(index: FaceIndex, path: str, estado: Estado, stop: threading.Event, cada: float):
+    while not stop.wait(cada):
+        index.save(path)
+        index.reload(path)
+        estado.recargas += 1
+
+
+def lector(index: FaceIndex, centros, fijos: int, estado: Estado, stop: threading.Event, seed: int):
+    rng = np.random.default_rng(seed)
+    ultima_version = 0
+    n = 0
+    while not stop.is_set():
+        ps = rng.integers(0, len(centros), 8)
+        X = centros[ps]
+
+        dist, ids = index.match(X, THRESHOLD)
+        for p, d, ind_id in zip(ps.tolist(), dist.tolist(), ids):
+            if ind_id is not None and ind_id != f"p{p}":
+                estado.error(f"match: p{p} -> {ind_id} (d={d:.3f})")
+            if ind_id is None and p < fijos:
+                estado.error(f"match: individuo fijo p{p} no encontrado (d={d:.3f})")
+
+        snap = index.snapshot()
+        if snap.version < ultima_version:
+            estado.error(f"versión {snap.version} < {ultima_version}")
+        ultima_version = snap.version
+        d, ind = snap.query(X, 1)
+        for q, (p, row) in enumerate(zip(ps.tolist(), ind[:, 0].tolist())):
+            if row < 0:
+                continue
+            nombre = snap.names[row]
+            real = float(np.linalg.norm(snap.buffer[row] - X[q]))
+            if abs(real - d[q, 0]) > 1e-4:
+                estado.error(f"snapshot v{snap.version}: fila {row} a {real:.4f}, el árbol dice {d[q, 0]:.4f}")
+            if d[q, 0] < THRESHOLD and individuo_id_from_name(nombre) != f"p{p}":
+                estado.error(f"snapshot v{snap.version}: p{p} -> {nombre}")
+        n += len(ps)
+    with estado.lock:
+        estado.consultas += n
+
+
+def run_stress(segundos: float = 10.0, escritores: int = 2, lectores: int = 4, personas: int = 2000,
+               fijos: int = 500, fotos: int = 3, backend: str = "brute", recarga: float = 1.0):
+    """
+    Lanza los escritores, lectores y el recargador durante ``segundos`` y hace
+    la comprobación final (guardar y cargar de disco). Devuelve (estado,
+    índice, segundos reales, versión inicial); ``estado.errores`` vacío = sin
+    inconsistencias. Lo usa también tests/test_face_index_stress.py.
+    """
+    rng = np.random.default_rng(0)
+    centros = rng.normal(0, 0.09, (personas, 128))
+    iniciales = list(range(fijos))
+    encs = np.repeat(centros[iniciales], fotos, axis=0)
+    encs += rng.normal(0, 0.02, encs.shape)
+    names = [f"p{p}___{i}" for p in iniciales for i in range(fotos)]
+    # Con backends aproximados se re-ordena con las distancias exactas (las que se comprueban)
+    rerank = 16 if backend in ("float16", "int8", "ivf") else 0
+    index = FaceIndex.from_matrix(encs, names, backend=backend, merge_threshold=32, compact_threshold=16,
+                                  rerank=rerank)
+
+    # Los fijos no se dan de baja: sólo se reparten los demás entre altas y bajas
+    libres = list(range(fijos, personas))
+    activos = []
+    lock = threading.Lock()
+    estado = Estado()
+    stop = threading.Event()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        hilos = [
+            estado.hilo(escritor, index, centros, fotos, libres, activos, lock, estado, stop, 100 + i)
+            for i in range(escritores)
+        ] + [
+            estado.hilo(lector, index, centros, fijos, estado, stop, 200 + i)
+            for i in range(lectores)
+        ]
+        if recarga > 0:
+            path = os.path.join(tmpdir, "indice.npz")
+            hilos.append(estado.hilo(recargador, index, path, estado, stop, recarga))
+
+        v0 = index.version
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.start()
+        time.sleep(segundos)
+        stop.set()
+        for h in hilos:
+            h.join()
+        t = time.perf_counter() - t0
+        index.wait_merge()
+
+        # Comprobación final: el índice guardado y recargado coincide con el original
+        path = os.path.join(tmpdir, "final.npz")
+        index.save(path)
+        copia = FaceIndex.load(path, backend=backend)
+        esperado = sorted(index.names[r] for r in index.snapshot().live_rows().tolist())
+        cargado = sorted(copia.names[r] for r in copia.snapshot().live_rows().tolist())
+        if esperado != cargado or copia.version != index.version:
+            estado.error("el snapshot cargado de disco no coincide con el índice")
+    return estado, index, t, v0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--personas", type=int, default=2000)
+    parser.add_argument("--fijos", type=int, default=500, help="Individuos que nunca se borran")
+    parser.add_argument("--fotos", type=int, default=3)
+    parser.add_argument("--backend", default="brute")
+    parser.add_argument("--recarga", type=float, default=1.0, help="Segundos entre guardar+recargar (0 = no)")
+    args = parser.parse_args()
+
+    estado, index, t, v0 = run_stress(args.segundos, args.escritores, args.lectores, args.personas, args.fijos,
+                                      args.fotos, args.backend, args.recarga)
+
+    print(f"{args.escritores} escritores, {args.lectores} lectores, {t:.1f} s | backend {index.backend_name}")
+    print(f"  Altas: {estado.altas}, bajas: {estado.bajas}, recargas: {estado.recargas}")
+    print(f"  Versiones publicadas: {index.version - v0} (v{v0} -> v{index.version})")
+    print(f"  Consultas: {estado.consultas} ({estado.consultas / t:,.0f} caras/s)")
+    print(f"  Caras vivas al final: {len(index)}")
+    if estado.errores:
+        print(f"  [ERROR] {len(estado.errores)} inconsistencias:")
+        for e in estado.errores:
+            print(f"    {e}")
+        sys.exit(1)
+    print("  [OK] Sin inconsistencias")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_individuos_cache.py
+# --------------------------
+# Reconocimiento repetido (como un video con pocas personas en plano o
+# /detectar_imagen con las mismas caras): lecturas de individuos directas a
+# Mongo vs a través de la caché LRU+TTL (mongo.mongo_individuos.individuos_cache)
+#
+# Usa mongomock y cuenta las consultas a la colección (CountingCollection de
+# bench_mongo_queries); --rtt-ms suma una latencia simulada por consulta.
+# Con --cache-size menor que --personas se ven las expulsiones LRU.
+#
+# Uso (desde backend/):
+#     pip install mongomock
+#     python -m benchmarks.bench_individuos_cache --frames 2000 --personas 1 3 20 --rtt-ms 0.5
+# --------------------------
+
+import time
+import random
+import argparse
+
+import mongomock
+
+import mongo.mongo_individuos as mongo_individuos
+from benchmarks.bench_mongo_queries import CountingCollection
+
+
+def recognition_loop(lookup, individuo_ids, frames: int, caras_por_frame: int, seed: int = 0):
+    """
+    ``frames`` reconocimientos; en cada uno aparecen ``caras_por_frame``
+    individuos de ``individuo_ids``. Por cada frame: una lectura en bloque
+    (match_faces) y otra por cara (detectar_imagen / _build_video_response).
+    """
+    rng = random.Random(seed)
+    for _ in range(frames):
+        vistos = [rng.choice(individuo_ids) for _ in range(caras_por_frame)]
+        lookup["bloque"](vistos)
+        for individuo_id in vistos:
+            lookup["uno"](individuo_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--personas", type=int, nargs="+", default=[1, 3, 20],
+                        help="Individuos distintos que aparecen en el video")
+    parser.add_argument("--caras", type=int, default=2, help="Caras por frame")
+    parser.add_argument("--individuos", type=int, default=2000, help="Individuos en la colección")
+    parser.add_argument("--cache-size", type=int, default=1024)
+    parser.add_argument("--ttl", type=float, default=60.0)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Latencia de red simulada por consulta")
+    args = parser.parse_args()
+
+    db = mongomock.MongoClient()["reconocimiento_facial"]
+    ids = [str(i) for i in db["individuos"].insert_many(
+        [{"nombre": f"n{i}", "apellido1": "a", "apellido2": "b", "caras": []} for i in range(args.individuos)]
+    ).inserted_ids]
+    col = CountingCollection(db["individuos"], args.rtt_ms / 1000)
+    mongo_individuos.individuos_col = col
+    cache = mongo_individuos.individuos_cache
+
+    sin_cache = {
+        "bloque": mongo_individuos.get_individuos_by_ids,
+        "uno": mongo_individuos.get_individuo_by_id,
+    }
+    con_cache = {
+        "bloque": mongo_individuos.get_individuos_cached,
+        "uno": mongo_individuos.get_individuo_cached,
+    }
+
+    print(f"{args.frames} frames x {args.caras} caras | caché {args.cache_size} entradas, TTL {args.ttl} s")
+    for personas in args.personas:
+        en_plano = random.Random(personas).sample(ids, personas)
+        resultados = {}
+        for nombre, lookup in (("sin caché", sin_cache), ("con caché", con_cache)):
+            cache.configure(args.cache_size, args.ttl)
+            cache.invalidate()
+            cache.hits = cache.misses = cache.evictions = cache.expirations = cache.invalidations = 0
+            col.count = 0
+            t0 = time.perf_counter()
+            recognition_loop(lookup, en_plano, args.frames, args.caras)
+            resultados[nombre] = (time.perf_counter() - t0, col.count)
+
+        print(f"{personas:4d} personas en plano")
+        for nombre, (t, consultas) in resultados.items():
+            print(f"  {nombre:10s}: {consultas:7d} consultas | {1000 * t:9.1f} ms")
+        st = cache.stats()
+        print(f"  caché     : aciertos={st['aciertos']} fallos={st['fallos']} "
+              f"expulsiones={st['expulsiones']} tasa={st['tasa_aciertos']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_matchers.py
+# --------------------------
+# Recall / latencia de los backends de búsqueda sobre embeddings sintéticos agrupados
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_matchers --tamanos 1000 100000 1000000
+#     python -m benchmarks.bench_matchers --tamanos 100000 --backends brute ivf ivf-pq
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+
+from utils.matchers import BruteForceMatcher, IVFMatcher, KDTreeMatcher
+
+BUILDERS = {
+    "brute": lambda data: BruteForceMatcher(data),
+    "kdtree": lambda data: KDTreeMatcher(data),
+    "ivf": lambda data: IVFMatcher(data, n_probe=16),
+    "ivf-pq": lambda data: IVFMatcher(data, n_probe=16, pq_m=16),
+}
+
+
+def synthetic_gallery(n: int, rng: np.random.Generator, fotos_por_persona: int = 5):
+    """
+    Embeddings agrupados por persona, con una escala parecida a la de face_recognition
+    (misma persona < 0.6, personas distintas bastante más lejos).
+    """
+    n_personas = max(1, n // fotos_por_persona)
+    centros = rng.normal(0, 0.09, (n_personas, 128)).astype(np.float32)
+    labels = rng.integers(0, n_personas, n)
+    data = centros[labels] + rng.normal(0, 0.02, (n, 128)).astype(np.float32)
+    return data, centros, labels
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--backends", nargs="+", default=list(BUILDERS))
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--kdtree-max", type=int, default=100000,
+                        help="No construir KDTree por encima de este tamaño (muy lento)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.tamanos:
+        data, centros, labels = synthetic_gallery(n, rng)
+        queries = centros[rng.integers(0, len(centros), args.consultas)]
+        queries = queries + rng.normal(0, 0.02, queries.shape).astype(np.float32)
+
+        exact = BruteForceMatcher(data)
+        _, truth = exact.query(queries, k=1)
+
+        print(f"\n== {n} referencias, {args.consultas} consultas ==")
+        for name in args.backends:
+            if name == "kdtree" and n > args.kdtree_max:
+                print(f"  {name:7s}: omitido (> {args.kdtree_max})")
+                continue
+            t0 = time.perf_counter()
+            matcher = BUILDERS[name](data)
+            t_build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            _, ind = matcher.query(queries, k=1)
+            t_query = (time.perf_counter() - t0) / args.consultas
+            # recall@1 exacto (misma foto) y de identidad (misma persona)
+            recall = float(np.mean(ind[:, 0] == truth[:, 0]))
+            recall_id = float(np.mean(labels[ind[:, 0]] == labels[truth[:, 0]]))
+            print(f"  {name:7s}: build {t_build:7.2f} s | {t_query * 1000:8.3f} ms/consulta | "
+                  f"recall@1 {recall:.3f} | recall identidad {recall_id:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench_mongo_indexes.py
+# --------------------------
+# Comprueba con explain() que las consultas por cara usan los índices
+# creados por mongo.connection.ensure_indexes
+#
+# Necesita un MongoDB real (mongomock no implementa explain). Crea una base
+# de datos temporal, la llena, ejecuta explain antes y después de crear los
+# índices y falla (exit 1) si alguna consulta no usa IXSCAN. La misma
+# comprobación, con pocos documentos, está en tests/test_mongo_indexes.py.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_mongo_indexes --uri mongodb://localhost:27017/ --individuos 20000
+# --------------------------
+
+import sys
+import time
+import uuid
+import argparse
+
+from pymongo import MongoClient
+
+from mongo.connection import ensure_indexes
+
+
+def stages(plan) -> set:
+    out = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            out.add(plan["stage"])
+        for v in plan.values():
+            out |= stages(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            out |= stages(v)
+    return out
+
+
+def explain(db, col: str, query: dict):
+    res = db.command("explain", {"find": col, "filter": query}, verbosity="executionStats")
+    st = stages(res["queryPlanner"]["winningPlan"])
+    ex = res["executionStats"]
+    return st, ex["totalDocsExamined"], ex["executionTimeMillis"]
+
+
+def fill(db, individuos: int, caras: int) -> list:
+    """
+    Inserta ``individuos`` con ``caras`` caras cada uno. Devuelve las consultas
+    a comprobar: [(nombre, colección, filtro)].
+    """
+    ids = db["caras"].insert_many(
+        [{"path": f"imagenes/referencia/x___{i}.jpg"} for i in range(individuos * caras)]
+    ).inserted_ids
+    db["individuos"].insert_many([
+        {"nombre": f"n{i}", "caras": [str(c) for c in ids[i * caras:(i + 1) * caras]]}
+        for i in range(individuos)
+    ])
+    objetivo = individuos // 2
+    return [
+        ("buscar_individuo_por_cara", "individuos", {"caras": {"$in": [str(ids[objetivo * caras])]}}),
+        ("get_cara_path", "caras", {"path": f"imagenes/referencia/x___{objetivo}.jpg"}),
+    ]
+
+
+def uses_index(st: set) -> bool:
+    return "IXSCAN" in st and "COLLSCAN" not in st
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--individuos", type=int, default=20000)
+    parser.add_argument("--caras", type=int, default=3, help="Caras por individuo")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    db_name = f"bench_indices_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    try:
+        t0 = time.perf_counter()
+        consultas = fill(db, args.individuos, args.caras)
+        print(f"{args.individuos} individuos / {args.individuos * args.caras} caras insertados en "
+              f"{time.perf_counter() - t0:.1f} s")
+
+        print("Sin índices:")
+        for nombre, col, q in consultas:
+            st, docs, ms = explain(db, col, q)
+            print(f"  {nombre:26s}: {sorted(st)} docs examinados={docs} ({ms} ms)")
+
+        ensure_indexes(db)
+
+        print("Con índices:")
+        ok = True
+        for nombre, col, q in consultas:
+            st, docs, ms = explain(db, col, q)
+            ok &= uses_index(st)
+            print(f"  {nombre:26s}: {sorted(st)} docs examinados={docs} ({ms} ms) "
+                  f"{'OK' if uses_index(st) else 'FALLO'}")
+    finally:
+        client.drop_database(db_name)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bench_mongo_queries.py
+# --------------------------
+# /consultar_individuos: N+1 consultas (get_cara_id por cara) vs una página
+# de individuos + un único $in de caras
+#
+# Usa mongomock como Mongo local y cuenta las consultas (round-trips) a cada
+# colección. Opcionalmente suma un RTT simulado por consulta para estimar la
+# latencia contra un Mongo en red.
+#
+# Uso (desde backend/):
+#     pip install mongomock
+#     python -m benchmarks.bench_mongo_queries --individuos 1000 10000 --caras 3 --rtt-ms 0.5
+#
+# Ojo: mongomock busca por _id recorriendo la colección, así que el N+1 es
+# cuadrático aquí; por encima de --max-n-mas-1 sólo se cuentan sus consultas.
+# --------------------------
+
+import time
+import argparse
+
+import mongomock
+
+import mongo.mongo_caras as mongo_caras
+import mongo.mongo_individuos as mongo_individuos
+
+
+class CountingCollection:
+    """
+    Envuelve una colección y cuenta las llamadas que en Mongo real son un round-trip.
+    """
+
+    OPS = ("find", "find_one", "aggregate", "insert_one", "insert_many", "update_one", "bulk_write")
+
+    def __init__(self, col, rtt: float):
+        self._col = col
+        self.rtt = rtt
+        self.count = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._col, name)
+        if name not in self.OPS:
+            return attr
+
+        def wrapper(*args, **kwargs):
+            self.count += 1
+            if self.rtt:
+                time.sleep(self.rtt)
+            return attr(*args, **kwargs)
+
+        return wrapper
+
+
+def populate(db, n_individuos: int, caras_por_individuo: int):
+    caras = db["caras"].insert_many(
+        [{"path": f"imagenes/referencia/x___{i}.jpg"} for i in range(n_individuos * caras_por_individuo)]
+    ).inserted_ids
+    docs = []
+    for i in range(n_individuos):
+        ids = caras[i * caras_por_individuo:(i + 1) * caras_por_individuo]
+        docs.append({"nombre": f"n{i}", "apellido1": "a", "apellido2": "b", "caras": [str(c) for c in ids]})
+    db["individuos"].insert_many(docs)
+
+
+def listado_n_mas_1():
+    # Lo que hacía /consultar_individuos: todos los individuos y get_cara_id por cara
+    out = []
+    for ind in mongo_individuos.get_individuos():
+        caras = [mongo_caras.get_cara_id(c.id) for c in ind.caras]
+        out.append((ind.id, [c.path for c in caras if c]))
+    return out
+
+
+def listado_batch(limit=None, after=None):
+    individuos = mongo_individuos.get_individuos_page(limit, after)
+    caras = mongo_caras.get_caras_by_ids([c.id for ind in individuos for c in ind.caras])
+    return [(ind.id, [caras[c.id].path for c in ind.caras if c.id in caras]) for ind in individuos]
+
+
+def measure(fn, ind_col, caras_col):
+    ind_col.count = caras_col.count = 0
+    t0 = time.perf_counter()
+    result = fn()
+    t = time.perf_counter() - t0
+    return t, ind_col.count + caras_col.count, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--individuos", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--caras", type=int, default=3, help="Caras por individuo")
+    parser.add_argument("--pagina", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Latencia de red simulada por consulta")
+    parser.add_argument("--max-n-mas-1", type=int, default=2000, help="Tamaño máximo al que se mide el N+1")
+    args = parser.parse_args()
+
+    for n in args.individuos:
+        db = mongomock.MongoClient()["reconocimiento_facial"]
+        populate(db, n, args.caras)
+        ind_col = CountingCollection(db["individuos"], args.rtt_ms / 1000)
+        caras_col = CountingCollection(db["caras"], args.rtt_ms / 1000)
+        mongo_individuos.individuos_col = ind_col
+        mongo_caras.caras_col = caras_col
+
+        t_new, q_new, r_new = measure(listado_batch, ind_col, caras_col)
+        t_pag, q_pag, _ = measure(lambda: listado_batch(args.pagina), ind_col, caras_col)
+
+        print(f"{n:6d} individuos x {args.caras} caras")
+        if n <= args.max_n_mas_1:
+            t_old, q_old, r_old = measure(listado_n_mas_1, ind_col, caras_col)
+            assert sorted(r_old) == sorted(r_new)
+            print(f"  N+1            : {q_old:7d} consultas | {1000 * t_old:9.1f} ms")
+        else:
+            print(f"  N+1            : {1 + n * args.caras:7d} consultas | (no medido)")
+        print(f"  $in (todo)     : {q_new:7d} consultas | {1000 * t_new:9.1f} ms")
+        print(f"  $in (página {args.pagina}): {q_pag:4d} consultas | {1000 * t_pag:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
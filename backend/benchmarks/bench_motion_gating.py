@@ -0,0 +1,114 @@
+# bench_motion_gating.py
+# --------------------------
+# Muestreo fijo (FRAME_SKIP) vs muestreo adaptativo por movimiento (MotionGate)
+#
+# Genera un clip tipo CCTV: fondo fijo con ruido de sensor y unos pocos
+# "eventos" cortos (un bloque o una cara que cruza la escena). Para cada modo
+# mide frames analizados, tiempo total y recall de eventos (eventos con al
+# menos un frame analizado mientras ocurren).
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_motion_gating --segundos 120 --eventos 6
+#     python -m benchmarks.bench_motion_gating --cara imagenes/referencia/x.jpg --umbral 3
+# --------------------------
+
+import os
+import time
+import argparse
+import tempfile
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from utils.motion_gate import MotionGate
+from utils.video_pipeline import iter_analyzed_frames
+
+
+def make_clip(
+    path: str, seconds: int, n_events: int, event_s: float, fps: int = 25, size=(640, 360), cara=None
+) -> List[Tuple[int, int]]:
+    rng = np.random.default_rng(0)
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    fondo = np.dstack([np.tile(np.linspace(40, 200, w, dtype=np.float32), (h, 1))] * 3)
+    face = cv2.imread(cara) if cara else None
+    side = h // 3
+    if face is not None:
+        face = cv2.resize(face, (side, side))
+
+    total = seconds * fps
+    ev_len = int(event_s * fps)
+    starts = np.sort(rng.choice(np.arange(fps, total - ev_len), n_events, replace=False))
+    events = [(int(s), int(s) + ev_len) for s in starts]
+
+    for i in range(total):
+        noise = rng.normal(0, 3, (h, w, 1)).astype(np.float32)
+        frame = np.clip(fondo + noise, 0, 255).astype(np.uint8)
+        for start, end in events:
+            if start <= i < end:
+                x = int((w - side) * (i - start) / max(ev_len - 1, 1))
+                if face is not None:
+                    frame[h // 3: h // 3 + side, x:x + side] = face
+                else:
+                    cv2.rectangle(frame, (x, h // 3), (x + side, h // 3 + side), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return events
+
+
+def run(clip: str, events, frame_skip: int, gate, yolo_model):
+    info = {}
+    t0 = time.perf_counter()
+    analizados = []
+    caras = 0
+    for frame_idx, _, analysis in iter_analyzed_frames(
+        clip, frame_skip=frame_skip, workers=0, yolo_model=yolo_model, info=info, motion_gate=gate
+    ):
+        analizados.append(frame_idx)
+        caras += len(analysis["locations"])
+    t = time.perf_counter() - t0
+    idx = np.asarray(analizados)
+    vistos = sum(1 for s, e in events if ((idx >= s) & (idx < e)).any())
+    return t, info, vistos, caras
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=int, default=120)
+    parser.add_argument("--eventos", type=int, default=6)
+    parser.add_argument("--duracion-evento", type=float, default=1.5, help="Segundos que dura cada evento")
+    parser.add_argument("--frame-skip", type=int, default=5)
+    parser.add_argument("--umbral", type=float, default=4.0)
+    parser.add_argument("--min-step", type=int, default=2)
+    parser.add_argument("--max-step", type=int, default=20)
+    parser.add_argument("--max-gap", type=int, default=150)
+    parser.add_argument("--cara", default=None, help="Imagen de una cara para pegar en los eventos")
+    parser.add_argument("--yolo", default=None, help="Ruta a un modelo YOLO (por defecto sólo caras)")
+    args = parser.parse_args()
+
+    yolo_model = None
+    if args.yolo:
+        from ultralytics import YOLO
+        yolo_model = YOLO(args.yolo)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "clip.mp4")
+        events = make_clip(clip, args.segundos, args.eventos, args.duracion_evento, cara=args.cara)
+        print(f"Clip: {args.segundos} s, {len(events)} eventos de {args.duracion_evento} s")
+
+        modos = [
+            ("Fijo (FRAME_SKIP)", None),
+            ("Movimiento", MotionGate(args.umbral, args.min_step, args.max_step, args.max_gap)),
+        ]
+        for nombre, gate in modos:
+            t, info, vistos, caras = run(clip, events, args.frame_skip, gate, yolo_model)
+            n = info.get("frames_analizados", 0)
+            print(
+                f"{nombre:18s}: {t:7.2f} s | analizados {n:6d} | saltados {info.get('frames_saltados', 0):6d} "
+                f"| x{args.segundos / t:6.2f} tiempo real | recall eventos {vistos}/{len(events)} | caras {caras}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench_quantized.py
+# --------------------------
+# Memoria y precisión de la galería cuantizada (float16 / int8, con y sin
+# re-ordenación exacta) frente al KDTree float64 usado hasta ahora, con el
+# umbral MATCH_THRESHOLD (0.6)
+#
+# Galería sintética con la dispersión ajustada para que haya muchas
+# distancias cerca de 0.6: la mitad de las consultas son fotos nuevas de
+# personas de la galería y la otra mitad de personas desconocidas.
+# "decisión = ref" es el % de consultas con el mismo resultado que el KDTree
+# float64 (mismo individuo o ninguno) a 0.6.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_quantized --caras 200000 --consultas 2000
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+
+from utils.face_index import FaceIndex
+
+# MATCH_THRESHOLD de config.py (no se importa config para no cargar los modelos)
+THRESHOLD = 0.6
+
+VARIANTES = {
+    "kdtree float64": dict(backend="kdtree"),
+    "brute float64": dict(backend="brute"),
+    "float16": dict(backend="float16", buffer_dtype="float32"),
+    "float16 + rerank": dict(backend="float16", buffer_dtype="float32", rerank=16),
+    "int8": dict(backend="int8", buffer_dtype="float32"),
+    "int8 + rerank": dict(backend="int8", buffer_dtype="float32", rerank=16),
+}
+
+
+def gallery(n: int, fotos: int, consultas: int, rng: np.random.Generator):
+    personas = max(1, n // fotos)
+    centros = rng.normal(0, 0.042, (personas + consultas, 128))
+    labels = np.repeat(np.arange(personas), fotos)[:n]
+    data = centros[labels] + rng.normal(0, 0.03, (n, 128))
+    names = [f"p{l}___{i}" for i, l in enumerate(labels)]
+    # Mitad conocidas, mitad desconocidas (centros que no están en la galería)
+    q_labels = np.where(
+        np.arange(consultas) % 2 == 0,
+        rng.integers(0, personas, consultas),
+        personas + np.arange(consultas),
+    )
+    queries = centros[q_labels] + rng.normal(0, 0.03, (consultas, 128))
+    expected = [f"p{l}" if l < personas else None for l in q_labels]
+    return data, names, queries, expected
+
+
+def memory_bytes(index: FaceIndex) -> int:
+    snap = index.snapshot()
+    return snap.buffer.nbytes + snap.tree.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--caras", type=int, default=200_000)
+    parser.add_argument("--fotos", type=int, default=5, help="Fotos por persona")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTES))
+    parser.add_argument("--umbral", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data, names, queries, expected = gallery(args.caras, args.fotos, args.consultas, rng)
+    umbral = args.umbral
+
+    ref_d = ref_ids = None
+    print(f"{args.caras} caras, {args.consultas} consultas (mitad desconocidas), umbral {umbral}")
+    print(f"{'variante':>17s} {'MB':>8s} {'B/cara':>7s} {'build s':>8s} {'ms/cons':>8s} "
+          f"{'decisión=ref':>13s} {'top1=ref':>9s} {'max|Δd|':>9s} {'aciertos':>9s}")
+    for nombre in args.variantes:
+        t0 = time.perf_counter()
+        index = FaceIndex.from_matrix(data, names, initial_capacity=len(data), **VARIANTES[nombre])
+        t_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        dist, ids = index.match(queries, umbral)
+        t_query = (time.perf_counter() - t0) / len(queries)
+        _, top1 = index.match(queries, np.inf)
+
+        if ref_d is None:
+            ref_d, ref_ids, ref_top1 = dist, ids, top1
+            cerca = float(np.mean(np.abs(ref_d - umbral) < 0.05))
+        mem = memory_bytes(index)
+        print(f"{nombre:>17s} {mem / 1e6:8.1f} {mem / len(data):7.0f} {t_build:8.2f} {1000 * t_query:8.3f} "
+              f"{100 * np.mean([a == b for a, b in zip(ids, ref_ids)]):12.2f}% "
+              f"{100 * np.mean([a == b for a, b in zip(top1, ref_top1)]):8.2f}% "
+              f"{np.max(np.abs(dist - ref_d)):9.5f} "
+              f"{100 * np.mean([a == b for a, b in zip(ids, expected)]):8.2f}%")
+        del index
+
+    print(f"Consultas con la distancia de referencia a menos de 0.05 del umbral: {100 * cerca:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# bench_shared_gallery.py
+# --------------------------
+# Varios workers: cada uno con su propia copia de la galería (FaceIndex.from_matrix,
+# como hasta ahora) vs galería compartida mapeada en memoria (utils/shared_gallery.py)
+#
+# Se lanzan N procesos (como los workers de gunicorn) y cada uno informa de su
+# memoria (/proc/self/smaps_rollup): RSS, PSS y privada antes y después de
+# cargar el índice, y la PSS total de los N workers (lo que ocupan entre todos).
+# Con la galería compartida, además, el proceso principal da de alta un
+# individuo nuevo y se mide cuánto tarda cada worker en encontrarlo; después da
+# de baja individuos hasta que la galería se compacta y se comprueba que cada
+# worker pasa al fichero nuevo sin filas muertas y sigue encontrando el alta
+# (termina con código 1 si alguno falla).
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_shared_gallery --caras 100000 --workers 1 2 4
+# --------------------------
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing as mp
+
+import numpy as np
+
+from utils.face_index import FaceIndex
+from utils.shared_gallery import SharedGallery
+
+
+def memory_mb() -> dict:
+    """
+    RSS, PSS y memoria privada (MB) de este proceso. PSS reparte las páginas
+    compartidas entre los procesos que las usan.
+    """
+    campos = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            partes = line.split()
+            if len(partes) >= 2 and partes[0].endswith(":") and partes[1].isdigit():
+                campos[partes[0][:-1]] = int(partes[1]) / 1024
+    return {
+        "rss": campos.get("Rss", 0.0),
+        "pss": campos.get("Pss", 0.0),
+        "privada": campos.get("Private_Clean", 0.0) + campos.get("Private_Dirty", 0.0),
+    }
+
+
+def worker(modo: str, directorio: str, consultas: np.ndarray, nuevo: np.ndarray, cmds, results):
+    antes = memory_mb()
+    t0 = time.perf_counter()
+    if modo == "copia":
+        data = np.load(os.path.join(directorio, "galeria.npy"))
+        names = [f"p{i // 4}___{i}" for i in range(len(data))]
+        index = FaceIndex.from_matrix(data, names, backend="brute")
+        del data, names
+        gallery = None
+    else:
+        gallery = SharedGallery(directorio)
+        index = FaceIndex(backend="brute")
+        gallery.sync(index)
+        index.merge(wait=True)
+    t_carga = time.perf_counter() - t0
+    # Consultas para tocar todas las páginas de la galería
+    index.match(consultas, 0.6)
+    despues = memory_mb()
+    results.put(("listo", os.getpid(), t_carga, antes, despues))
+
+    if cmds.get() == "buscar_nuevo":
+        t0 = time.perf_counter()
+        encontrado = False
+        while time.perf_counter() - t0 < 5.0:
+            # Lo que hace get_models en cada petición
+            gallery.sync(index)
+            _, ids = index.match(nuevo, 0.6)
+            if ids[0] == "nuevo":
+                encontrado = True
+                break
+            time.sleep(0.001)
+        results.put(("visto", os.getpid(), encontrado, time.perf_counter() - t0, gallery.generation))
+
+        if cmds.get() == "compactada":
+            gallery.sync(index)
+            snap = index.snapshot()
+            _, ids = index.match(nuevo, 0.6)
+            results.put(("compactada", os.getpid(), gallery.status()["reconstruccion"], snap.n_dead,
+                         ids[0] == "nuevo"))
+
+
+def run(modo: str, n_workers: int, directorio: str, consultas, nuevo, gallery: SharedGallery):
+    ctx = mp.get_context("spawn")
+    cmds = [ctx.Queue() for _ in range(n_workers)]
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(modo, directorio, consultas, nuevo, c, results)) for c in cmds]
+    for p in procs:
+        p.start()
+    listos = [results.get() for _ in procs]
+
+    vistos = []
+    if modo == "compartida":
+        gallery.append(nuevo, ["nuevo___0"])
+        for c in cmds:
+            c.put("buscar_nuevo")
+        vistos = [results.get() for _ in procs]
+        # Bajas hasta que el escritor compacta la galería
+        build = gallery.header().build
+        p = 0
+        while gallery.header().build == build:
+            gallery.remove_individuo(f"p{p}")
+            p += 1
+        for c in cmds:
+            c.put("compactada")
+        vistos += [results.get() for _ in procs]
+    else:
+        for c in cmds:
+            c.put("fin")
+    for p in procs:
+        p.join()
+    return listos, vistos
+
+
+def media(listos, campo: str, despues: bool = True) -> float:
+    return float(np.mean([r[4 if despues else 3][campo] for r in listos]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--caras", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    galeria = rng.normal(0, 0.09, (args.caras, 128)).astype(np.float32)
+    consultas = galeria[rng.integers(0, args.caras, 64)].astype(np.float64)
+    nuevo = rng.normal(0.5, 0.09, (1, 128))
+    fallos = 0
+
+    with tempfile.TemporaryDirectory() as directorio:
+        np.save(os.path.join(directorio, "galeria.npy"), galeria.astype(np.float64))
+        gallery = SharedGallery(directorio)
+        names = [f"p{i // 4}___{i}" for i in range(args.caras)]
+
+        print(f"Galería de {args.caras} caras ({args.caras * 128 * 4 / 1e6:.0f} MB en float32) | "
+              f"memoria en MB por worker (media)")
+        print(f"{'modo':>10s} {'workers':>7s} {'carga s':>8s} {'RSS':>8s} {'PSS':>8s} {'privada':>8s} "
+              f"{'+privada índice':>16s} {'PSS total':>10s}")
+        for modo in ("copia", "compartida"):
+            for n in args.workers:
+                if modo == "compartida":
+                    # Galería nueva en cada ronda (sin el alta de la anterior)
+                    gallery.ensure(f"bench-{n}", lambda: (galeria, names))
+                listos, vistos = run(modo, n, directorio, consultas, nuevo, gallery)
+                print(f"{modo:>10s} {n:7d} {np.mean([r[2] for r in listos]):8.2f} "
+                      f"{media(listos, 'rss'):8.1f} {media(listos, 'pss'):8.1f} {media(listos, 'privada'):8.1f} "
+                      f"{media(listos, 'privada') - media(listos, 'privada', despues=False):16.1f} "
+                      f"{n * media(listos, 'pss'):10.1f}")
+                altas = [v for v in vistos if v[0] == "visto"]
+                for _, pid, encontrado, t, generacion in altas:
+                    if not encontrado:
+                        fallos += 1
+                        print(f"    [ERROR] worker {pid}: no ve el alta tras {t:.1f} s")
+                if altas:
+                    peor = max(v[3] for v in altas)
+                    print(f"{'':>10s} alta en el proceso principal visible en los {len(altas)} workers: "
+                          f"peor {1000 * peor:.1f} ms (generación {altas[0][4]})")
+                compactadas = [v for v in vistos if v[0] == "compactada"]
+                for _, pid, build, muertas, encontrado in compactadas:
+                    if build != gallery.header().build or muertas or not encontrado:
+                        fallos += 1
+                        print(f"    [ERROR] worker {pid}: reconstrucción {build}, {muertas} filas muertas, "
+                              f"alta {'vista' if encontrado else 'perdida'}")
+                if compactadas:
+                    print(f"{'':>10s} compactación tras {gallery.compact_threshold} bajas: los "
+                          f"{len(compactadas)} workers en la reconstrucción {gallery.header().build}")
+
+    if fallos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# bench_topk.py
+# --------------------------
+# Coste de pedir los k individuos más cercanos (FaceIndex.match_topk) frente
+# a la búsqueda k=1 de siempre (FaceIndex.match), en una galería con varias
+# fotos por individuo
+#
+# Para cada k se comprueba que:
+#   - el primer candidato y la decisión con el umbral son los de match()
+#   - los candidatos son los k individuos más cercanos (sin repetir), con la
+#     distancia de su foto más cercana, como una búsqueda exhaustiva
+# Termina con código 1 si alguno no coincide.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_topk --caras 100000 --fotos 5 --k 1 3 5 10
+# --------------------------
+
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from utils.face_index import FaceIndex
+
+# MATCH_THRESHOLD de config.py (no se importa config para no cargar los modelos)
+THRESHOLD = 0.6
+
+
+def gallery(n: int, fotos: int, consultas: int, rng: np.random.Generator):
+    personas = max(1, n // fotos)
+    centros = rng.normal(0, 0.042, (personas, 128))
+    labels = np.repeat(np.arange(personas), fotos)[:n]
+    data = centros[labels] + rng.normal(0, 0.03, (n, 128))
+    names = [f"p{l}___{i}" for i, l in enumerate(labels)]
+    queries = centros[rng.integers(0, personas, consultas)] + rng.normal(0, 0.03, (consultas, 128))
+    return data, labels, names, queries
+
+
+def exhaustive_topk(data: np.ndarray, labels: np.ndarray, X: np.ndarray, k: int):
+    """
+    Referencia: distancia a todas las fotos y mínimo por individuo.
+    """
+    n_ind = int(labels.max()) + 1
+    out = []
+    for x in X:
+        d = np.linalg.norm(data - x, axis=1)
+        per_ind = np.full(n_ind, np.inf)
+        np.minimum.at(per_ind, labels, d)
+        top = np.argsort(per_ind)[:k]
+        out.append([(f"p{l}", float(per_ind[l])) for l in top.tolist()])
+    return out
+
+
+def timed(fn, repeticiones: int) -> float:
+    mejor = np.inf
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--caras", type=int, default=100_000)
+    parser.add_argument("--fotos", type=int, default=5, help="Fotos por individuo")
+    parser.add_argument("--consultas", type=int, default=256)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--backend", default="brute")
+    parser.add_argument("--comprobar", type=int, default=32, help="Consultas comparadas con la búsqueda exhaustiva")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data, labels, names, queries = gallery(args.caras, args.fotos, args.consultas, rng)
+    index = FaceIndex.from_matrix(data, names, backend=args.backend)
+    ref = exhaustive_topk(data, labels, queries[: args.comprobar], max(args.k))
+    dist_1, ids_1 = index.match(queries, THRESHOLD)
+
+    t_match = timed(lambda: index.match(queries, THRESHOLD), args.repeticiones)
+    print(f"{args.caras} caras ({args.fotos} fotos por individuo), {args.consultas} consultas en un lote, "
+          f"backend {index.backend_name}")
+    print(f"{'búsqueda':>16s} {'ms/lote':>9s} {'x match':>8s} {'ratio>0.8':>10s}")
+    print(f"{'match (k=1)':>16s} {1000 * t_match:9.2f} {1.0:8.2f} {'':>10s}")
+
+    fallos = 0
+    for k in args.k:
+        t = timed(lambda: index.match_topk(queries, k, THRESHOLD), args.repeticiones)
+        dist, ids, candidatos = index.match_topk(queries, k, THRESHOLD)
+
+        if ids != ids_1 or not np.allclose(dist, dist_1):
+            fallos += 1
+            print(f"    [ERROR] k={k}: el primer candidato no coincide con match()")
+        for q, esperado in enumerate(ref):
+            got = candidatos[q]
+            if [i for i, _ in got] != [i for i, _ in esperado[:k]] or \
+                    not np.allclose([d for _, d in got], [d for _, d in esperado[:k]], atol=1e-6):
+                fallos += 1
+                print(f"    [ERROR] k={k}, consulta {q}: {got} != {esperado[:k]}")
+                break
+
+        # Caras dudosas: el segundo individuo casi tan cerca como el primero
+        ratios = [c[0][1] / c[1][1] for c in candidatos if len(c) > 1 and c[1][1] > 0]
+        dudosas = f"{100 * np.mean(np.array(ratios) > 0.8):9.1f}%" if ratios else f"{'-':>10s}"
+        print(f"{f'match_topk k={k}':>16s} {1000 * t:9.2f} {t / t_match:8.2f} {dudosas}")
+
+    if fallos:
+        sys.exit(1)
+    print("[OK] Candidatos iguales a la búsqueda exhaustiva")
+
+
+if __name__ == "__main__":
+    main()
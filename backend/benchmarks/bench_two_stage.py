@@ -0,0 +1,55 @@
+# bench_two_stage.py
+# --------------------------
+# Búsqueda plana vs búsqueda en dos fases (plantillas por individuo + re-ordenación)
+#
+# Galería con muchas fotos por persona y un porcentaje de fotos "ruidosas"
+# (en realidad de otra persona) que provocan falsos positivos en la búsqueda plana.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_two_stage --personas 2000 --fotos 20 --ruido 0.02
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+
+from utils.face_index import FaceIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--personas", type=int, default=2000)
+    parser.add_argument("--fotos", type=int, default=20)
+    parser.add_argument("--ruido", type=float, default=0.02, help="Fracción de fotos mal asignadas")
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--candidatos", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centros = rng.normal(0, 0.09, (args.personas, 128))
+    labels = np.repeat(np.arange(args.personas), args.fotos)
+    real = labels.copy()
+    ruidosas = rng.random(len(labels)) < args.ruido
+    real[ruidosas] = rng.integers(0, args.personas, int(ruidosas.sum()))
+    gallery = centros[real] + rng.normal(0, 0.03, (len(labels), 128))
+    names = [f"p{l}___{i}" for i, l in enumerate(labels)]
+
+    q_labels = rng.integers(0, args.personas, args.consultas)
+    queries = centros[q_labels] + rng.normal(0, 0.03, (args.consultas, 128))
+    expected = [f"p{l}" for l in q_labels]
+
+    for backend in ("brute", "kdtree"):
+        index = FaceIndex.from_matrix(gallery, names, backend=backend, two_stage_candidates=args.candidatos)
+        print(f"\n== {len(gallery)} fotos / {args.personas} personas, backend {backend} ==")
+        for two_stage in (False, True):
+            t0 = time.perf_counter()
+            _, ids = index.match(queries, threshold=0.6, two_stage=two_stage)
+            t = (time.perf_counter() - t0) / args.consultas
+            acc = np.mean([a == b for a, b in zip(ids, expected)])
+            nombre = "dos fases" if two_stage else "plana"
+            print(f"  {nombre:9s}: {t * 1000:7.3f} ms/cara | acierto identidad {acc:.3f}")
+
+
+if __name__ == "__main__":
+    main()
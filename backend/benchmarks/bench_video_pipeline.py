@@ -0,0 +1,98 @@
+# bench_video_pipeline.py
+# --------------------------
+# Frames/segundo: bucle secuencial anterior vs pipeline por etapas
+#
+# Genera un clip sintético (opcionalmente con una cara pegada que se mueve)
+# y lo procesa con el bucle original (cap.read() de todos los frames +
+# frame.copy() + análisis en el mismo hilo) y con utils.video_pipeline.
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_video_pipeline --segundos 20 --workers 1 2 4
+#     python -m benchmarks.bench_video_pipeline --cara imagenes/referencia/x.jpg --sin-yolo
+# --------------------------
+
+import os
+import time
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+from utils.frame_analysis import analyze_frame
+from utils.video_pipeline import iter_analyzed_frames
+
+
+def make_clip(path: str, seconds: int, fps: int = 25, size=(1280, 720), cara=None):
+    rng = np.random.default_rng(0)
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    fondo = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    face = cv2.imread(cara) if cara else None
+    if face is not None:
+        face = cv2.resize(face, (200, 200))
+    for i in range(seconds * fps):
+        frame = fondo.copy()
+        x = int((w - 220) * (0.5 + 0.5 * np.sin(i / 40)))
+        if face is not None:
+            frame[200:400, x:x + 200] = face
+        else:
+            cv2.rectangle(frame, (x, 200), (x + 200, 400), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def sequential(path: str, frame_skip: int, yolo_model) -> int:
+    cap = cv2.VideoCapture(path)
+    frame_count = processed = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_skip == 0:
+            analyze_frame(frame.copy(), yolo_model=yolo_model, with_objects=yolo_model is not None)
+            processed += 1
+        frame_count += 1
+    cap.release()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=int, default=20)
+    parser.add_argument("--frame-skip", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--cara", default=None, help="Imagen de una cara para pegar en el clip")
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sin-yolo", action="store_true")
+    args = parser.parse_args()
+
+    yolo_path = None if args.sin_yolo else args.yolo
+    yolo_model = None
+    if yolo_path:
+        from ultralytics import YOLO
+        yolo_model = YOLO(yolo_path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "clip.mp4")
+        make_clip(clip, args.segundos, cara=args.cara)
+        duracion = args.segundos
+
+        t0 = time.perf_counter()
+        n = sequential(clip, args.frame_skip, yolo_model)
+        t = time.perf_counter() - t0
+        print(f"Secuencial      : {t:7.2f} s | {n / t:6.2f} frames analizados/s | x{duracion / t:.2f} tiempo real")
+
+        for workers in args.workers:
+            # Primera pasada para arrancar el pool (carga de modelos) fuera de la medida
+            for _ in iter_analyzed_frames(clip, frame_skip=10 ** 9, workers=workers, yolo_model_path=yolo_path):
+                pass
+            t0 = time.perf_counter()
+            n = sum(1 for _ in iter_analyzed_frames(
+                clip, frame_skip=args.frame_skip, workers=workers, yolo_model_path=yolo_path))
+            t = time.perf_counter() - t0
+            print(f"Pipeline {workers:2d} proc: {t:7.2f} s | {n / t:6.2f} frames analizados/s | x{duracion / t:.2f} tiempo real")
+
+
+if __name__ == "__main__":
+    main()
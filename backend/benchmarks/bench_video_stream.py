@@ -0,0 +1,40 @@
+# bench_video_stream.py
+# --------------------------
+# Tiempo hasta el primer resultado de /detectar_video: respuesta al terminar
+# (process_video_from_path) vs streaming (iter_video_events)
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_video_stream --video imagenes/analizar/video.mp4
+# --------------------------
+
+import time
+import argparse
+
+from utils.detection_video import iter_video_events, process_video_from_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", required=True)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    process_video_from_path(args.video)
+    t_completo = time.perf_counter() - t0
+
+    primeros = {}
+    t0 = time.perf_counter()
+    for evento in iter_video_events(args.video):
+        primeros.setdefault(evento["tipo"], (time.perf_counter() - t0, evento.get("frame")))
+    t_stream = time.perf_counter() - t0
+
+    print(f"Video {args.video}")
+    print(f"  Respuesta al terminar : primer resultado a los {t_completo:7.2f} s")
+    print(f"  Streaming (total {t_stream:.2f} s):")
+    for tipo, (t, frame) in primeros.items():
+        frame_txt = f" (frame {frame})" if frame is not None else ""
+        print(f"    primer evento '{tipo}'{' ' * (10 - len(tipo))}: {t:7.2f} s{frame_txt}")
+
+
+if __name__ == "__main__":
+    main()
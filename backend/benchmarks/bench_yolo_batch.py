@@ -0,0 +1,49 @@
+# bench_yolo_batch.py
+# --------------------------
+# Latencia por frame y throughput de YOLO con lotes de 1 / 4 / 8 / 16 frames
+#
+# Uso (desde backend/):
+#     python -m benchmarks.bench_yolo_batch --frames 64 --lotes 1 4 8 16
+# --------------------------
+
+import time
+import argparse
+
+import numpy as np
+from ultralytics import YOLO
+
+from utils.frame_analysis import detect_objects_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modelo", default="yolov8n.pt")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--lotes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--alto", type=int, default=720)
+    parser.add_argument("--ancho", type=int, default=1280)
+    args = parser.parse_args()
+
+    model = YOLO(args.modelo)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (args.alto, args.ancho, 3), dtype=np.uint8) for _ in range(args.frames)]
+
+    # Calentamiento (carga de pesos, fusión de capas)
+    detect_objects_batch(frames[:2], model)
+
+    for batch_size in args.lotes:
+        latencias = []
+        t0 = time.perf_counter()
+        for start in range(0, len(frames), batch_size):
+            t_batch = time.perf_counter()
+            detect_objects_batch(frames[start: start + batch_size], model)
+            # Un frame espera a que termine todo su lote
+            latencias.append(time.perf_counter() - t_batch)
+        total = time.perf_counter() - t0
+        print(f"lote {batch_size:2d}: {len(frames) / total:7.2f} frames/s | "
+              f"latencia por frame {np.mean(latencias) * 1000:8.1f} ms | "
+              f"coste por frame {total / len(frames) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,19 @@ import os
 import cv2
 import numpy as np
 import logging
-import face_recognition
-from sklearn.neighbors import KDTree
-from ultralytics import YOLO
-from pymongo import MongoClient
-from typing import Union
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from mongo.connection import ensure_indexes, init_mongo
+from mongo.mongo_individuos import individuos_cache
+from typing import Optional, Sequence, Union
 from PIL import Image
+from utils.encoding_cache import EncodingCache
+from utils.encoding_service import EncodingService
+from utils.face_index import FaceIndex
+from utils.jobs import JobManager
+from utils.shared_gallery import SharedGallery, session_id
+from utils.startup import NotReady, Startup
 
 
 # --------------------------
@@ -21,21 +28,179 @@ from PIL import Image
 IMAGENES_REFERENCIA = "imagenes/referencia"
 IMAGENES_DETECTADAS = "imagenes/detectadas"
 IMAGENES_ANALIZAR = "imagenes/analizar"
+ENCODINGS_CACHE = "imagenes/cache"
+JOBS_DB = "imagenes/trabajos.sqlite"
+# Imágenes de una importación masiva antes de pasar a IMAGENES_REFERENCIA (y zips subidos)
+IMAGENES_IMPORTACIONES = "imagenes/importaciones"
+# /importar_caras con {"directorio", "manifest"}: sólo se aceptan rutas dentro de esta carpeta
+IMPORTAR_RAIZ = "imagenes/importar"
+# /detectar_imagen decodifica la subida en memoria; guardar además el original en
+# IMAGENES_DETECTADAS es opcional (también por petición con guardar=true)
+GUARDAR_SUBIDAS = False
 
 # --------------------------
 # Parámetros de video
 # --------------------------
 FRAME_SKIP = 5
-DOWNSCALE = 0.6
+# Escala a la que se buscan las caras (imágenes y video). Los encodings se calculan siempre a
+# resolución completa. Número = escala fija (1.0 = sin reducir); "auto" = reducir hasta que el
+# lado mayor mida DETECTION_MAX_SIDE px. En ambos casos nunca se baja de la escala necesaria
+# para seguir detectando caras de FACE_MIN_SIZE px (ver utils/frame_analysis.detection_scale).
+DOWNSCALE = "auto"
+DETECTION_MAX_SIDE = 1280
+FACE_MIN_SIZE = 80
+FACE_DETECTION = {"downscale": DOWNSCALE, "min_face_size": FACE_MIN_SIZE, "max_side": DETECTION_MAX_SIDE}
+# Procesos para analizar frames en paralelo (0 = en el mismo hilo de la petición)
+VIDEO_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Frames decodificados en cola esperando análisis (backpressure del decodificador)
+VIDEO_QUEUE_SIZE = 8
+# Lotes de YOLO: nº máximo de frames (o imágenes de /detectar_imagenes) por llamada y espera máxima (s) para completar un lote
+YOLO_BATCH_SIZE = 8
+YOLO_BATCH_MAX_WAIT = 0.05
+# /detectar_video?stream=...: segundos entre eventos de progreso
+VIDEO_PROGRESS_EVERY = 1.0
+# Muestreo adaptativo por movimiento (ver utils/motion_gate.py). Con False se analiza
+# siempre un frame de cada FRAME_SKIP.
+MOTION_GATING = True
+# Diferencia media (0-255) entre miniaturas en gris a partir de la cual hay movimiento
+MOTION_THRESHOLD = 4.0
+# Paso de revisión con movimiento / paso máximo con la escena quieta (frames)
+MOTION_MIN_STEP = 2
+MOTION_MAX_STEP = FRAME_SKIP * 4
+# Se analiza al menos un frame cada MOTION_MAX_GAP frames aunque no haya cambios
+MOTION_MAX_GAP = 150
+# Seguimiento de caras (ver utils/face_tracker.py): una cara se codifica al aparecer y al
+# re-verificarla, no en cada frame
+FACE_TRACKING = True
+TRACK_IOU_THRESHOLD = 0.3
+# Frames analizados seguidos sin ver la cara antes de cerrar su track
+TRACK_MAX_MISSING = 3
+# Frames de video entre re-verificaciones de un track (antes si es desconocido o la distancia > TRACK_LOW_CONFIDENCE)
+TRACK_REVERIFY_EVERY = 75
+TRACK_LOW_CONFIDENCE = 0.5
+
+# Procesos que calculan encodings para las peticiones y la carga de referencias
+# (0 = en el hilo de la petición). Ver utils/encoding_service.py
+ENCODING_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# /detectar_imagenes: imágenes por tanda (una búsqueda en el índice y lotes de YOLO_BATCH_SIZE por
+# tanda; se decodifica la siguiente mientras se resuelve la actual) y máximo por petición
+IMAGENES_POR_TANDA = 16
+MAX_IMAGENES_PETICION = 1000
+# .zip en /detectar_imagenes (tamaños descomprimidos según la cabecera de cada entrada, que
+# zipfile no deja superar al leer): entradas, bytes por imagen y bytes en total
+MAX_ZIP_ENTRADAS = 5000
+MAX_IMAGEN_BYTES = 50 * 1024 * 1024
+MAX_ZIP_BYTES = 2 * 1024 * 1024 * 1024
+
+# --------------------------
+# MongoDB (un único cliente compartido, ver mongo/connection.py)
+# --------------------------
+MONGO_URI = "mongodb://localhost:27017/"
+MONGO_DB = "reconocimiento_facial"
+# Opciones del MongoClient: tamaño del pool, timeouts (ms) y write concern
+MONGO_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 0,
+    "serverSelectionTimeoutMS": 5000,
+    "connectTimeoutMS": 5000,
+    "socketTimeoutMS": 30000,
+    "w": 1,
+}
+# Caché LRU+TTL de individuos en la detección (0 entradas la desactiva)
+INDIVIDUOS_CACHE_SIZE = 1024
+INDIVIDUOS_CACHE_TTL = 60.0
+# GET /consultar_individuos paginado: máximo de individuos por página (limit mayor se recorta)
+INDIVIDUOS_LIMIT_MAX = 500
+
+# --------------------------
+# Trabajos asíncronos (/detectar_video?async=true)
+# --------------------------
+# Videos procesándose a la vez y máximo de trabajos pendientes antes de rechazar con 429
+JOBS_WORKERS = 2
+JOBS_MAX_QUEUE = 32
+# Cada proceso renueva sus trabajos cada JOBS_HEARTBEAT segundos; un trabajo pendiente
+# sin renovar durante 3 latidos (su proceso murió) lo reanuda un único proceso
+JOBS_HEARTBEAT = 5.0
+
+# --------------------------
+# Modelos
+# --------------------------
+YOLO_MODEL_PATH = "yolov8n.pt"
+# Encodings, YOLO y Mongo se cargan en hilos en segundo plano al importar config
+# (False = en serie antes de servir, como antes). Ver utils/startup.py y /health/ready
+STARTUP_BACKGROUND = True
+# Segundos que una petición espera a que terminen de cargar los modelos antes de responder 503
+MODELS_WAIT_TIMEOUT = 10.0
+# Si MongoDB no responde al arrancar se reintenta en segundo plano, con espera creciente
+# entre intentos hasta este máximo (s)
+MONGO_RETRY_MAX_DELAY = 30.0
+
+# --------------------------
+# Parámetros del índice de caras
+# --------------------------
+# Nº de caras nuevas (segmento delta) a partir del cual se reconstruye el índice en segundo plano
+INDEX_MERGE_THRESHOLD = 256
+# Nº de caras borradas (tombstones) a partir del cual se compacta el índice
+INDEX_COMPACT_THRESHOLD = 64
+# Backend del segmento principal: "brute" (exacto, float32 + BLAS), "auto" (brute y,
+# desde MATCHER_IVF_MIN caras, ivf), "ivf" (aproximado, k-means + PQ opcional),
+# "kdtree" (sklearn) o "float16" / "int8" (fuerza bruta sobre la galería cuantizada:
+# 256 / 128 bytes por cara). La búsqueda aproximada sólo se usa si se elige aquí
+MATCHER_BACKEND = "brute"
+# Candidatos del segmento principal cuya distancia exacta se recalcula con las filas en
+# coma flotante antes de aplicar MATCH_THRESHOLD (0 = no; recomendado con int8/float16/ivf)
+MATCHER_RERANK = 0
+# Tipo de las filas del índice: "float64" o "float32" (mitad de memoria, misma decisión a 0.6)
+INDEX_BUFFER_DTYPE = "float64"
+# Con "auto", a partir de este nº de caras se pasa de fuerza bruta a IVF
+MATCHER_IVF_MIN = 200_000
+# Parámetros IVF: n_lists (None = sqrt(N)), n_probe y pq_m (0 = sin PQ)
+MATCHER_IVF_PARAMS = {"n_lists": None, "n_probe": 16, "pq_m": 0}
+# Búsqueda en dos fases: primero plantillas (centroides) por individuo y luego
+# re-ordenación con las fotos de los N individuos candidatos
+TWO_STAGE_MATCHING = False
+TWO_STAGE_CANDIDATES = 5
+# Distancia máxima para considerar que una cara coincide con una referencia
+# (cada petición puede pedir otro con ``umbral``, hasta MATCH_THRESHOLD_MAX)
+MATCH_THRESHOLD = 0.6
+MATCH_THRESHOLD_MAX = 1.0
+# Individuos candidatos por cara (con su distancia) en las respuestas de detección;
+# cada petición puede pedir otro nº con ``top_k``, hasta MATCH_TOP_K_MAX
+MATCH_TOP_K = 3
+MATCH_TOP_K_MAX = 10
+# Snapshot del índice en disco (POST /api/indice/guardar y /api/indice/recargar):
+# una réplica lo guarda y las demás lo cargan sin recalcular ni reconstruir nada
+FACE_INDEX_SNAPSHOT = "imagenes/cache/indice.npz"
+
+# --------------------------
+# Varios workers (gunicorn -c gunicorn.conf.py app:app)
+# --------------------------
+# Galería de encodings compartida por todos los workers: fichero sólo-añadir mapeado en
+# memoria con contador de generación (ver utils/shared_gallery.py). El primer worker la
+# construye, el resto la mapea, y las altas/bajas de cualquiera se ven en los demás en su
+# siguiente petición. Se activa sola con gunicorn.conf.py (define GALERIA_SESION).
+GALERIA_COMPARTIDA = bool(os.environ.get("GALERIA_SESION"))
+GALERIA_DIR = "imagenes/cache/galeria"
+if GALERIA_COMPARTIDA:
+    # El paralelismo lo dan los propios workers de gunicorn: sin pools de encodings ni de
+    # análisis de video por worker (cada proceso del pool volvería a cargar dlib y YOLO),
+    # así cada worker es un único proceso con un dlib y un YOLO
+    ENCODING_WORKERS = 0
+    VIDEO_WORKERS = 0
 
 # --------------------------
 # Variables globales
 # --------------------------
-kdtree = None
-reference_names = []
+face_index = None
+shared_gallery = None
 yolo_model = None
 mongo_client = None
 mongo_db = None
+encoding_service = None
+_encoding_service_lock = threading.Lock()
+job_manager = None
+_job_manager_lock = threading.Lock()
+startup = Startup()
 
 logger = logging.getLogger(__name__)
 
@@ -52,68 +217,165 @@ def read_image_safe(path: str) -> np.ndarray:
     return np.array(img, dtype=np.uint8)
 
 
+# --------------------------
+# Servicio de encodings (pool de procesos)
+# --------------------------
+def get_encoding_service() -> EncodingService:
+    global encoding_service
+    with _encoding_service_lock:
+        if encoding_service is None:
+            # Dentro de un proceso worker (spawn vuelve a importar la app) no se crea otro pool
+            workers = ENCODING_WORKERS if multiprocessing.parent_process() is None else 0
+            encoding_service = EncodingService(workers)
+        return encoding_service
+
+
+# --------------------------
+# Trabajos asíncronos (video, importación masiva)
+# --------------------------
+def get_job_manager() -> JobManager:
+    """
+    Gestor de trabajos compartido; cada módulo de rutas registra sus handlers.
+    """
+    global job_manager
+    with _job_manager_lock:
+        if job_manager is None:
+            job_manager = JobManager(
+                JOBS_DB, max_workers=JOBS_WORKERS, max_queue=JOBS_MAX_QUEUE, heartbeat=JOBS_HEARTBEAT
+            )
+        return job_manager
+
+
 # --------------------------
 # Cargar encodings de referencias
 # --------------------------
-def load_reference_encodings():
-    global kdtree, reference_names
+def _reference_encoding_result(filepath: str, face_encs) -> Union[np.ndarray, None]:
+    if len(face_encs) != 1:
+        logger.warning(f"[WARN] {os.path.basename(filepath)}: debe contener exactamente UNA cara")
+        return None
+    return face_encs[0]
+
+
+def _encode_reference_image(filepath: str) -> Union[np.ndarray, None]:
+    """
+    Calcula el encoding de una imagen de referencia.
+    Devuelve None si no contiene exactamente una cara; si no se puede leer o
+    codificar lanza la excepción (EncodingCache no la guarda y la reintenta).
+    """
+    _, face_encs = get_encoding_service().encode_path(filepath)
+    return _reference_encoding_result(filepath, face_encs)
+
+
+def _encode_reference_images(filepaths):
+    """
+    Versión en paralelo de _encode_reference_image: todas las imágenes se
+    envían a la vez al servicio de encodings. Las que fallan se devuelven
+    como la excepción (EncodingCache no las guarda y las reintenta).
+    """
+    service = get_encoding_service()
+    futures = [service.submit_path(path) for path in filepaths]
+    results = []
+    for path, fut in zip(filepaths, futures):
+        try:
+            _, face_encs = fut.result()
+            results.append(_reference_encoding_result(path, face_encs))
+        except Exception as e:
+            results.append(e)
+    return results
 
-    encodings = []
-    names = []
+
+def load_reference_encodings():
+    """
+    Carga los encodings de referencia usando la caché persistente en disco.
+    Sólo se codifican las imágenes nuevas o modificadas desde el último arranque.
+    """
+    global face_index
 
     logger.info(f"Cargando imágenes de referencia desde: {IMAGENES_REFERENCIA}")
 
     if not os.path.exists(IMAGENES_REFERENCIA):
         os.makedirs(IMAGENES_REFERENCIA)
 
-    for filename in os.listdir(IMAGENES_REFERENCIA):
-        if not filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            continue
-
-        filepath = os.path.join(IMAGENES_REFERENCIA, filename)
-        try:
-            img_rgb = read_image_safe(filepath)
-            face_encs = face_recognition.face_encodings(img_rgb)
-            if len(face_encs) != 1:
-                logger.warning(f"[WARN] {filename}: debe contener exactamente UNA cara")
-                continue
-            encodings.append(face_encs[0])
-            names.append(os.path.splitext(filename)[0])
-        except Exception as e:
-            logger.warning(f"[WARN] Error al generar encodings de {filename}: {e}")
-            continue
+    def sync_cache():
+        cache = EncodingCache(ENCODINGS_CACHE)
+        return cache.sync(IMAGENES_REFERENCIA, _encode_reference_image, _encode_reference_images)
 
-    if encodings:
-        kdtree = KDTree(np.array(encodings))
-        reference_names = names
-        logger.info(f"[OK] KDTree cargado con {len(reference_names)} referencias")
+    if GALERIA_COMPARTIDA:
+        face_index = _load_shared_gallery(sync_cache)
+    else:
+        encodings, names = sync_cache()
+        face_index = FaceIndex.from_matrix(encodings, names, **_face_index_params())
+    if len(face_index) > 0:
+        logger.info(f"[OK] Índice de caras cargado con {len(face_index)} referencias")
     else:
-        kdtree = None
-        reference_names = []
         logger.warning("[WARN] No se encontraron encodings válidos.")
 
 
+def _face_index_params() -> dict:
+    return dict(
+        merge_threshold=INDEX_MERGE_THRESHOLD,
+        compact_threshold=INDEX_COMPACT_THRESHOLD,
+        backend=MATCHER_BACKEND,
+        ivf_min=MATCHER_IVF_MIN,
+        ivf_params=MATCHER_IVF_PARAMS,
+        two_stage=TWO_STAGE_MATCHING,
+        two_stage_candidates=TWO_STAGE_CANDIDATES,
+        rerank=MATCHER_RERANK,
+        buffer_dtype=INDEX_BUFFER_DTYPE,
+    )
+
+
+def _load_shared_gallery(sync_cache) -> FaceIndex:
+    """
+    Sólo el primer worker de este arranque sincroniza la caché de encodings y
+    escribe la galería; el resto espera al lock y la mapea tal cual.
+    """
+    global shared_gallery
+    gallery = SharedGallery(GALERIA_DIR, compact_threshold=INDEX_COMPACT_THRESHOLD)
+    gallery.ensure(session_id(), sync_cache)
+    index = FaceIndex(**_face_index_params())
+    gallery.sync(index)
+    index.merge(wait=True)
+    shared_gallery = gallery
+    logger.info(f"[OK] Galería compartida {GALERIA_DIR} mapeada (generación {gallery.generation})")
+    return index
+
+
+def _sync_shared_gallery():
+    # Aplica las altas/bajas hechas por otros workers (sin cambios: sólo lee la cabecera)
+    if shared_gallery is not None and face_index is not None:
+        shared_gallery.sync(face_index)
+
+
 # --------------------------
 # Cargar modelo YOLO
 # --------------------------
-def load_yolo_model(model_path: str = "yolov8n.pt"):
+def load_yolo_model(model_path: str = YOLO_MODEL_PATH):
     global yolo_model
     try:
+        # Importación diferida: torch/ultralytics tardan varios segundos en importarse
+        from ultralytics import YOLO
         yolo_model = YOLO(model_path)
         logger.info("[OK] Modelo YOLO cargado correctamente.")
     except Exception as e:
         yolo_model = None
         logger.error(f"[ERROR] No se pudo cargar YOLO: {e}")
+        raise
 
 
 # --------------------------
 # Conexión a MongoDB
 # --------------------------
-def test_mongo_connection(uri="mongodb://localhost:27017/", db_name="reconocimiento_facial"):
+def test_mongo_connection(uri=MONGO_URI, db_name=MONGO_DB):
+    """
+    Crea el cliente Mongo compartido por toda la aplicación, prueba la
+    conexión y crea los índices (individuos.caras y caras.path único).
+    """
     global mongo_client, mongo_db
     try:
-        mongo_client = MongoClient(uri)
-        mongo_db = mongo_client[db_name]
+        mongo_db = init_mongo(uri, db_name, **MONGO_OPTIONS)
+        individuos_cache.configure(INDIVIDUOS_CACHE_SIZE, INDIVIDUOS_CACHE_TTL)
+        mongo_client = mongo_db.client
         # Probar conexión
         mongo_client.admin.command("ping")
         logger.info(f"[OK] Conexión exitosa a MongoDB: {uri}, DB: {db_name}")
@@ -121,15 +383,41 @@ def test_mongo_connection(uri="mongodb://localhost:27017/", db_name="reconocimie
         mongo_client = None
         mongo_db = None
         logger.error(f"[ERROR] No se pudo conectar a MongoDB: {e}")
+        raise
+
+    try:
+        ensure_indexes(mongo_db)
+        logger.info("[OK] Índices de MongoDB creados")
+    except Exception as e:
+        logger.warning(f"[WARN] No se pudieron crear los índices de MongoDB: {e}")
 
 
 # --------------------------
 # Obtener modelos globales
 # --------------------------
-def get_models():
-    if kdtree is None:
-        raise RuntimeError("KDTree no cargado todavía (sin encodings).")
-    return kdtree, reference_names, yolo_model
+def get_models(timeout: Optional[float] = MODELS_WAIT_TIMEOUT):
+    """
+    Índice de caras, nombres y YOLO. Si todavía se están cargando espera hasta
+    ``timeout`` segundos (None = sin límite) y si no lanza NotReady (503).
+    Una galería vacía es válida: ninguna cara coincide. YOLO puede ser None.
+    """
+    if not startup.wait(("referencias", "yolo"), timeout):
+        raise NotReady("Los modelos se están cargando todavía", startup.status())
+    if face_index is None:
+        raise NotReady("No se pudieron cargar los encodings de referencia", startup.status())
+    _sync_shared_gallery()
+    return face_index, face_index.names, yolo_model
+
+
+def wait_references():
+    """
+    Espera a que terminen de cargar los encodings de referencia; si no, lanza
+    NotReady (503). Las altas/bajas en el índice antes de que termine la carga
+    se perderían al sustituirlo, así que las rutas que modifican individuos o
+    caras la llaman antes de tocar Mongo o el disco.
+    """
+    if not startup.wait(("referencias",), MODELS_WAIT_TIMEOUT):
+        raise NotReady("Los encodings de referencia se están cargando todavía", startup.status())
 
 
 # --------------------------
@@ -137,40 +425,152 @@ def get_models():
 # --------------------------
 def add_reference_encoding(cara_path: str):
     """
-    Agrega una nueva cara al KDTree y a reference_names.
+    Agrega una nueva cara al índice de caras.
+    La inserción es O(1) amortizada: la cara entra en el segmento delta
+    y el segmento principal se reconstruye en segundo plano al superar el umbral.
     """
-    global kdtree, reference_names
-
-    import os
-    import numpy as np
-    import face_recognition
-    from config import read_image_safe
-
     if not os.path.exists(cara_path):
         raise FileNotFoundError(f"No se encontró la imagen: {cara_path}")
 
-    img_rgb = read_image_safe(cara_path)
-    encs = face_recognition.face_encodings(img_rgb)
+    _, encs = get_encoding_service().encode_path(cara_path)
 
     if len(encs) != 1:
         raise ValueError("La imagen debe contener exactamente una cara")
 
-    new_enc = encs[0]
+    wait_references()
+    _ensure_face_index()
+
+    # Mismo formato de nombre que load_reference_encodings (<individuo_id>___<uuid>)
+    if shared_gallery is not None:
+        shared_gallery.append(encs[:1], [_reference_name(cara_path)])
+        shared_gallery.sync(face_index)
+    else:
+        face_index.add(encs[0], _reference_name(cara_path))
+
 
-    if kdtree is None:
-        # Primer encoding
-        kdtree = KDTree(np.array([new_enc]))
-        reference_names = [os.path.basename(cara_path)]
+def add_reference_encodings(cara_paths: Sequence[str], encodings: np.ndarray):
+    """
+    Versión masiva de add_reference_encoding para caras ya codificadas:
+    una sola inserción en el índice (una sola reconstrucción del segmento
+    principal) y un solo guardado de la caché de encodings.
+    """
+    if len(cara_paths) == 0:
+        return
+    wait_references()
+    _ensure_face_index()
+    names = [_reference_name(p) for p in cara_paths]
+    if shared_gallery is not None:
+        shared_gallery.append(encodings, names)
+        shared_gallery.sync(face_index)
     else:
-        # Agregar al KDTree existente
-        all_encs = np.vstack([kdtree.data, new_enc])
-        kdtree = KDTree(all_encs)
-        reference_names.append(os.path.basename(cara_path))
+        face_index.add_many(encodings, names)
+
+    try:
+        # Con varios workers, el lock de la galería evita que dos guardados se pisen
+        with shared_gallery.locked() if shared_gallery is not None else nullcontext():
+            EncodingCache(ENCODINGS_CACHE).add(cara_paths, encodings)
+    except Exception as e:
+        logger.warning(f"[WARN] No se pudo actualizar la caché de encodings: {e}")
+
+
+def _ensure_face_index():
+    global face_index
+    if face_index is None:
+        face_index = FaceIndex(**_face_index_params())
+
+
+# --------------------------
+# Eliminar encodings dinámicamente
+# --------------------------
+def _reference_name(cara_path: str) -> str:
+    return os.path.splitext(os.path.basename(cara_path))[0]
+
+
+def remove_reference_encoding(cara_path: str) -> int:
+    """
+    Quita del índice la cara asociada a un fichero de referencia.
+    Devuelve el número de filas borradas.
+    """
+    wait_references()
+    if face_index is None:
+        return 0
+    removed = face_index.remove(_reference_name(cara_path))
+    if shared_gallery is not None:
+        # La baja local ya está hecha; el evento es para los demás workers
+        shared_gallery.remove(_reference_name(cara_path))
+        shared_gallery.sync(face_index)
+    return removed
+
+
+def remove_individuo_encodings(individuo_id: str) -> int:
+    """
+    Quita del índice todas las caras de un individuo.
+    """
+    wait_references()
+    if face_index is None:
+        return 0
+    removed = face_index.remove_individuo(individuo_id)
+    if shared_gallery is not None:
+        shared_gallery.remove_individuo(individuo_id)
+        shared_gallery.sync(face_index)
+    return removed
+
+
+# --------------------------
+# Snapshot del índice en disco
+# --------------------------
+def save_index_snapshot(path: str = FACE_INDEX_SNAPSHOT) -> dict:
+    """
+    Guarda la versión actual del índice (escritura atómica).
+    """
+    wait_references()
+    _ensure_face_index()
+    version = face_index.save(path)
+    return {"version": version, "caras": len(face_index.snapshot()), "path": path}
+
+
+def reload_index_snapshot(path: str = FACE_INDEX_SNAPSHOT) -> dict:
+    """
+    Sustituye el índice de este proceso por el snapshot de ``path`` (p. ej.
+    guardado por otra réplica). Las detecciones en curso terminan con la
+    versión anterior; las nuevas ven la cargada.
+    """
+    if shared_gallery is not None:
+        raise RuntimeError("Con GALERIA_COMPARTIDA el índice se sincroniza desde la galería")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No existe el snapshot del índice: {path}")
+    wait_references()
+    _ensure_face_index()
+    version = face_index.reload(path)
+    return {"version": version, "caras": len(face_index.snapshot()), "path": path}
+
+
+def index_status() -> dict:
+    wait_references()
+    _ensure_face_index()
+    _sync_shared_gallery()
+    snap = face_index.snapshot()
+    return {
+        "version": snap.version,
+        "caras": len(snap),
+        "filas": snap.size,
+        "segmento_principal": snap.tree_size,
+        "borradas": snap.n_dead,
+        "backend": face_index.backend_name,
+        "backend_configurado": face_index.backend,
+        "pid": os.getpid(),
+        "galeria_compartida": shared_gallery.status() if shared_gallery is not None else None,
+    }
 
 
 # --------------------------
 # Inicialización automática
 # --------------------------
-load_reference_encodings()
-load_yolo_model()
-test_mongo_connection()
+startup.register("referencias", load_reference_encodings)
+startup.register("yolo", load_yolo_model, required=False)
+startup.register("mongo", test_mongo_connection, retry_max_delay=MONGO_RETRY_MAX_DELAY)
+
+# En los procesos hijos (pools con spawn vuelven a importar config) no se carga
+# nada al importar: sólo si algo llama a get_models
+if multiprocessing.parent_process() is None:
+    startup.start(background=STARTUP_BACKGROUND)
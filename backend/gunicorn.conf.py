@@ -0,0 +1,25 @@
+# gunicorn.conf.py
+# --------------------------
+# Servir con varios workers:
+#     gunicorn -c gunicorn.conf.py app:app
+# --------------------------
+#
+# La galería de caras se comparte: el primer worker escribe imagenes/cache/galeria
+# y los demás la mapean (ver utils/shared_gallery.py y GALERIA_COMPARTIDA en
+# config.py). Cada worker es un único proceso con su dlib y su YOLO: con
+# GALERIA_COMPARTIDA no se crean los pools de encodings ni de video
+# (ENCODING_WORKERS = VIDEO_WORKERS = 0) y el paralelismo lo dan los workers.
+
+import os
+import uuid
+
+bind = "0.0.0.0:5000"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+# /detectar_video síncrono puede tardar varios minutos
+timeout = 600
+
+
+def on_starting(server):
+    # Identificador de este arranque, heredado por todos los workers: la galería
+    # sólo se reconstruye si es de un arranque anterior
+    os.environ["GALERIA_SESION"] = uuid.uuid4().hex
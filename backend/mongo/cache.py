@@ -0,0 +1,109 @@
+# cache.py
+# --------------------------
+# Caché en memoria LRU con TTL para las lecturas de individuos en el camino
+# de detección (cada cara reconocida consultaba Mongo)
+# --------------------------
+#
+# Se guardan los documentos (dicts) y no los objetos Individuo, porque las
+# rutas modifican los objetos que reciben; cada lectura crea uno nuevo.
+# La caché es por proceso: las rutas de individuos_routes la invalidan
+# explícitamente al crear/modificar/borrar y el TTL acota lo desactualizada
+# que puede estar en otros procesos (p. ej. varios workers de gunicorn).
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Diccionario acotado a ``maxsize`` entradas (expulsa la menos usada) en el
+    que cada entrada caduca a los ``ttl`` segundos. ``maxsize=0`` la desactiva.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def configure(self, maxsize: int, ttl: float):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._evict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Devuelve las claves presentes y vigentes; el resto cuenta como fallo.
+        """
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        Borra una clave, o toda la caché si ``key`` es None.
+        """
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def _evict(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "max_entradas": self.maxsize,
+                "ttl_s": self.ttl,
+                "aciertos": self.hits,
+                "fallos": self.misses,
+                "expulsiones": self.evictions,
+                "caducadas": self.expirations,
+                "invalidaciones": self.invalidations,
+                "tasa_aciertos": round(self.hits / consultas, 4) if consultas else None,
+            }
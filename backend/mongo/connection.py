@@ -0,0 +1,98 @@
+# connection.py
+# --------------------------
+# Conexión compartida a MongoDB: un único MongoClient (con su pool) para
+# toda la aplicación e índices creados al arrancar
+# --------------------------
+#
+# config.test_mongo_connection llama a ``init_mongo`` con los parámetros de
+# config (pool, timeouts, write concern) y después a ``ensure_indexes``.
+# mongo_caras y mongo_individuos acceden a sus colecciones con
+# ``collection(nombre)``, que resuelve la base de datos compartida en cada
+# uso, así que el cliente se puede inyectar (p. ej. mongomock en benchmarks).
+
+import logging
+import threading
+from typing import List, Optional
+
+from pymongo import ASCENDING, MongoClient
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URI = "mongodb://localhost:27017/"
+DEFAULT_DB = "reconocimiento_facial"
+
+_client: Optional[MongoClient] = None
+_db: Optional[Database] = None
+_lock = threading.Lock()
+
+
+def _connect(uri: str, db_name: str, client: Optional[MongoClient], options) -> Database:
+    global _client, _db
+    if _client is not None and _client is not client:
+        _client.close()
+    _client = client if client is not None else MongoClient(uri, **options)
+    _db = _client[db_name]
+    return _db
+
+
+def init_mongo(
+    uri: str = DEFAULT_URI,
+    db_name: str = DEFAULT_DB,
+    client: Optional[MongoClient] = None,
+    **options,
+) -> Database:
+    """
+    Crea el cliente compartido (``options`` se pasan a MongoClient: maxPoolSize,
+    serverSelectionTimeoutMS, w, ...) o usa el ``client`` inyectado.
+    """
+    with _lock:
+        return _connect(uri, db_name, client, options)
+
+
+def get_client() -> MongoClient:
+    get_db()
+    return _client
+
+
+def get_db() -> Database:
+    """
+    Base de datos compartida; si nadie ha llamado a init_mongo se conecta con los valores por defecto.
+    """
+    if _db is None:
+        with _lock:
+            if _db is None:
+                _connect(DEFAULT_URI, DEFAULT_DB, None, {})
+    return _db
+
+
+class _Collection:
+    """
+    Referencia perezosa a una colección de la base de datos compartida.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+
+def collection(name: str) -> _Collection:
+    return _Collection(name)
+
+
+# --------------------------
+# Índices
+# --------------------------
+def ensure_indexes(db: Optional[Database] = None) -> List[str]:
+    """
+    Crea (si no existen) los índices que usan las consultas:
+    - individuos.caras (multikey): buscar_individuo_por_cara.
+    - caras.path (único): get_cara_path.
+    """
+    db = db if db is not None else get_db()
+    return [
+        db["individuos"].create_index([("caras", ASCENDING)], name="caras_1"),
+        db["caras"].create_index([("path", ASCENDING)], name="path_1", unique=True),
+    ]
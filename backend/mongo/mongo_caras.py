@@ -1,14 +1,12 @@
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
 from models.cara import Cara
-from pymongo import MongoClient
+from mongo.connection import collection
 
 # -------------------------
-# Conexión Mongo y colección
+# Colección (cliente Mongo compartido, ver mongo/connection.py)
 # -------------------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["reconocimiento_facial"]
-caras_col = db["caras"]
+caras_col = collection("caras")
 
 # ----------------- CREATE -----------------
 def crear_cara(cara: Cara) -> Cara:
@@ -20,6 +18,16 @@ def crear_cara(cara: Cara) -> Cara:
     cara.id = str(result.inserted_id)
     return cara
 
+# ----------------- CREATE VARIAS -----------------
+def crear_caras(paths: List[str]) -> List[Cara]:
+    """
+    Guarda varias caras con un único insert_many y las retorna con su id, en el mismo orden.
+    """
+    if not paths:
+        return []
+    result = caras_col.insert_many([{"path": p} for p in paths])
+    return [Cara(id=str(_id), path=p) for _id, p in zip(result.inserted_ids, paths)]
+
 # ----------------- DELETE -----------------
 def borrar_cara(cara_id: str) -> bool:
     try:
@@ -62,6 +70,27 @@ def get_cara_id(cara_id: str) -> Optional[Cara]:
     del doc["_id"]
     return Cara.from_dict(doc)
 
+# ----------------- GET VARIAS POR ID -----------------
+def get_caras_by_ids(cara_ids: List[str]) -> Dict[str, Cara]:
+    """
+    Recupera varias caras con una sola consulta $in, trayendo sólo el path.
+    Devuelve un dict id -> Cara (los ids inválidos o inexistentes no aparecen).
+    """
+    obj_ids = []
+    for cara_id in set(cara_ids):
+        try:
+            obj_ids.append(ObjectId(cara_id))
+        except Exception:
+            continue
+    if not obj_ids:
+        return {}
+
+    caras: Dict[str, Cara] = {}
+    for doc in caras_col.find({"_id": {"$in": obj_ids}}, {"path": 1}):
+        cara_id = str(doc["_id"])
+        caras[cara_id] = Cara(id=cara_id, path=doc.get("path", ""))
+    return caras
+
 # ----------------- GET BY PATH -----------------
 def get_cara_path(path: str) -> Optional[Cara]:
     print("Path buscar: ", path)
@@ -1,17 +1,21 @@
 from typing import List, Dict, Optional
 from bson import ObjectId
 from numpy import append
-from pymongo import MongoClient
+from pymongo import UpdateOne
+from mongo.cache import TTLCache
+from mongo.connection import collection
 from models.individuo import Individuo
 from models.cara import Cara
-from mongo.mongo_caras import get_cara_id, get_cara_path
+from mongo.mongo_caras import get_cara_id, get_cara_path, get_caras_by_ids
 
 # -------------------------
-# Conexión Mongo y colección
+# Colección (cliente Mongo compartido, ver mongo/connection.py)
 # -------------------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["reconocimiento_facial"]
-individuos_col = db["individuos"]
+individuos_col = collection("individuos")
+
+# Caché de lecturas de individuos para la detección; config.test_mongo_connection la configura
+# con individuos_cache.configure(INDIVIDUOS_CACHE_SIZE, INDIVIDUOS_CACHE_TTL)
+individuos_cache = TTLCache(maxsize=1024, ttl=60.0)
 
 # ----------------- GET ALL INDIVIDUOS -----------------
 def get_individuos() -> List[Individuo]:
@@ -31,6 +35,35 @@ def get_individuos() -> List[Individuo]:
     return individuos
 
 
+# ----------------- GET PÁGINA DE INDIVIDUOS -----------------
+def get_individuos_page(limit: Optional[int] = None, after_id: Optional[str] = None) -> List[Individuo]:
+    """
+    Retorna individuos ordenados por _id, con paginación por cursor:
+    los ``limit`` siguientes a ``after_id`` (todos si limit es None).
+    Lanza ValueError si ``after_id`` no es un id válido.
+    """
+    query = {}
+    if after_id:
+        try:
+            query["_id"] = {"$gt": ObjectId(after_id)}
+        except Exception:
+            raise ValueError(f"Cursor inválido: {after_id}")
+
+    cursor = individuos_col.find(
+        query, {"nombre": 1, "apellido1": 1, "apellido2": 1, "caras": 1}
+    ).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    individuos: List[Individuo] = []
+    for doc in cursor:
+        doc["id"] = str(doc["_id"])
+        del doc["_id"]
+        individuo_obj = Individuo.from_dict(doc)
+        if individuo_obj:
+            individuos.append(individuo_obj)
+    return individuos
+
 # ----------------- CREATE -----------------
 def crear_individuo(individuo: Individuo) -> Optional[Individuo]:
     data = individuo.to_dict()
@@ -38,6 +71,21 @@ def crear_individuo(individuo: Individuo) -> Optional[Individuo]:
     data["id"] = str(result.inserted_id)
     return Individuo.from_dict(data)
 
+# ----------------- CREATE VARIOS -----------------
+def crear_individuos(individuos: List[Individuo]) -> List[Individuo]:
+    """
+    Crea varios individuos con un único insert_many. Retorna los individuos con id, en el mismo orden.
+    """
+    if not individuos:
+        return []
+    docs = [ind.to_dict() for ind in individuos]
+    result = individuos_col.insert_many(docs)
+    creados = []
+    for doc, _id in zip(docs, result.inserted_ids):
+        doc["_id"] = str(_id)
+        creados.append(Individuo.from_dict(doc))
+    return creados
+
 # ----------------- MODIFY -----------------
 def modificar_individuo(individuo: Individuo) -> Optional[Individuo]:
     if not individuo.id:
@@ -86,6 +134,58 @@ def get_individuo_by_id(individuo_id: str) -> Optional[Individuo]:
     del doc["_id"]
     return Individuo.from_dict(doc)
 
+# ----------------- GET VARIOS INDIVIDUOS -----------------
+def get_individuos_by_ids(individuo_ids: List[str]) -> Dict[str, Individuo]:
+    """
+    Recupera varios individuos con una sola consulta $in.
+    Devuelve un dict id -> Individuo (los ids inválidos o inexistentes no aparecen).
+    """
+    obj_ids = []
+    for individuo_id in set(individuo_ids):
+        try:
+            obj_ids.append(ObjectId(individuo_id))
+        except Exception:
+            continue
+    if not obj_ids:
+        return {}
+
+    individuos: Dict[str, Individuo] = {}
+    for doc in individuos_col.find({"_id": {"$in": obj_ids}}):
+        doc["id"] = str(doc["_id"])
+        del doc["_id"]
+        individuo_obj = Individuo.from_dict(doc)
+        if individuo_obj:
+            individuos[individuo_obj.id] = individuo_obj
+    return individuos
+
+# ----------------- LECTURAS CON CACHÉ (detección) -----------------
+def get_individuos_cached(individuo_ids: List[str]) -> Dict[str, Individuo]:
+    """
+    Como get_individuos_by_ids, pero sirve desde ``individuos_cache`` los ya
+    leídos y sólo consulta Mongo (un único $in) por los que faltan.
+    Cada llamada devuelve objetos Individuo nuevos.
+    """
+    ids = {i for i in individuo_ids if i}
+    docs = individuos_cache.get_many(ids)
+    faltan = [i for i in ids if i not in docs]
+    if faltan:
+        for individuo_id, individuo_obj in get_individuos_by_ids(faltan).items():
+            doc = individuo_obj.to_dict()
+            individuos_cache.put(individuo_id, doc)
+            docs[individuo_id] = doc
+    return {i: Individuo.from_dict(doc) for i, doc in docs.items()}
+
+
+def get_individuo_cached(individuo_id: str) -> Optional[Individuo]:
+    return get_individuos_cached([individuo_id]).get(individuo_id)
+
+
+def invalidar_individuo(individuo_id: Optional[str] = None):
+    """
+    Quita un individuo de la caché (o la vacía entera si ``individuo_id`` es None).
+    """
+    individuos_cache.invalidate(individuo_id)
+
 # ----------------- AGREGAR CARAS -----------------
 def agregar_caras_a_individuo(individuo_id: str, caras: List[str]) -> Optional[Individuo]:
     try:
@@ -108,6 +208,25 @@ def agregar_caras_a_individuo(individuo_id: str, caras: List[str]) -> Optional[I
 
     return get_individuo_by_id(individuo_id)
 
+# ----------------- AGREGAR CARAS A VARIOS -----------------
+def agregar_caras_a_individuos(caras_por_individuo: Dict[str, List[str]]) -> int:
+    """
+    Añade caras a varios individuos en un único bulk_write de $addToSet.
+    Retorna el número de individuos modificados.
+    """
+    ops = []
+    for individuo_id, caras in caras_por_individuo.items():
+        try:
+            obj_id = ObjectId(individuo_id)
+        except Exception:
+            continue
+        if caras:
+            ops.append(UpdateOne({"_id": obj_id}, {"$addToSet": {"caras": {"$each": caras}}}))
+    if not ops:
+        return 0
+    result = individuos_col.bulk_write(ops, ordered=False)
+    return result.modified_count
+
 # ----------------- ELIMINAR CARA -----------------
 def eliminar_cara_de_individuo(individuo_id: str, cara_id: str) -> Optional[Individuo]:
     try:
@@ -131,26 +250,21 @@ def eliminar_cara_de_individuo(individuo_id: str, cara_id: str) -> Optional[Indi
 
 # ----------------- CONSULTAR CARAS -----------------
 def consultar_caras_individuo(individuo_id: str) -> List[Cara]:
+    """
+    Caras de un individuo en dos consultas: el individuo (sólo el campo caras)
+    y todas sus caras con un único $in.
+    """
     try:
         obj_id = ObjectId(individuo_id)
     except Exception:
         return []
-    print("Obteniendo caras de usuario_obj_id: ", obj_id)
-    doc = individuos_col.find_one({"_id": obj_id})
-    print("Individuo: ", doc)
+    doc = individuos_col.find_one({"_id": obj_id}, {"caras": 1})
     if not doc:
         return []
 
     caras_id = doc.get("caras", [])
-    print("Caras_id: ", caras_id)
-    caras_objs: List[Cara] = []
-    for id in caras_id:
-        cara = get_cara_id(id)
-        print("cara: ", cara)
-        if cara:
-            caras_objs.append(cara)
-    print("Caras del individuo: ", caras_objs)
-    return caras_objs
+    caras = get_caras_by_ids(caras_id)
+    return [caras[c] for c in caras_id if c in caras]
 
 # ----------------- BUSCAR POR CARA -----------------
 def buscar_individuo_por_cara(cara_path_or_name: str) -> Optional[Individuo]:
@@ -0,0 +1,41 @@
+#health_routes.py
+
+from flask import Blueprint, jsonify
+
+from config import MODELS_WAIT_TIMEOUT, startup
+from utils.startup import NotReady
+
+# Blueprint (sin prefijo /api: lo consultan los orquestadores)
+health_bp = Blueprint("health", __name__)
+
+
+# -------------------------
+# Liveness: el proceso responde (aunque los modelos sigan cargando)
+# -------------------------
+@health_bp.route("/health/live", methods=["GET"])
+def health_live():
+    return jsonify({"estado": "vivo", "segundos_desde_inicio": startup.status()["segundos_desde_inicio"]})
+
+
+# -------------------------
+# Readiness: 200 cuando los componentes obligatorios están listos, si no 503
+# -------------------------
+@health_bp.route("/health/ready", methods=["GET"])
+def health_ready():
+    """
+    Estado de carga de cada componente (referencias, yolo, mongo): estado,
+    obligatorio, inicio, duracion_s y error.
+    """
+    status = startup.status()
+    return jsonify(status), 200 if status["listo"] else 503
+
+
+# -------------------------
+# Peticiones que llegan antes de que terminen de cargar los modelos
+# -------------------------
+@health_bp.app_errorhandler(NotReady)
+def handle_not_ready(e: NotReady):
+    response = jsonify({"error": str(e), "arranque": e.status})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(int(MODELS_WAIT_TIMEOUT))
+    return response
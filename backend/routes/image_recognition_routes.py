@@ -1,34 +1,46 @@
+import io
 import os
+import json
 import logging
-from flask import Blueprint, request, jsonify
+import zipfile
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import uuid
-import cv2
+from werkzeug.utils import secure_filename
 
-from config import FRAME_SKIP, IMAGENES_ANALIZAR, IMAGENES_DETECTADAS, get_models, read_image_safe
-from utils.detection_images import detect_faces_in_image, detect_objects_with_yolo
-from utils.detection_video import process_video_from_path
-from models.individuo import Individuo
-from mongo.mongo_individuos import get_individuo_by_id
+from config import (
+    GUARDAR_SUBIDAS, IMAGENES_ANALIZAR, IMAGENES_DETECTADAS, MAX_IMAGENES_PETICION,
+    MAX_ZIP_ENTRADAS, MAX_IMAGEN_BYTES, MAX_ZIP_BYTES,
+    MATCH_THRESHOLD, MATCH_THRESHOLD_MAX, MATCH_TOP_K, MATCH_TOP_K_MAX, get_job_manager, get_models
+)
+from utils.detection_images import detect_faces_in_rgb, detect_images_stream, detect_objects_with_yolo
+from utils.encoding_cache import EXTENSIONES_IMAGEN
+from utils.image_ingest import StageTimer, decode_rgb, save_upload, upload_buffer, write_rgb
+from utils.detection_video import iter_video_events, process_video_from_path
+from utils.jobs import JobContext, QueueFull
+from utils.startup import NotReady
+from mongo.mongo_individuos import get_individuo_cached
 
 # Blueprint
 image_recognition_bp = Blueprint("image_recognition", __name__)
 logger = logging.getLogger("detector.routes.image_recognition")
 
-# Cargar modelos
-kdtree, reference_names, yolo_model = get_models()
-
 
 # -------------------------
-# Helper parámetro live
+# Helper parámetros (query string, formulario o JSON)
 # -------------------------
-def _parse_live_param() -> bool:
-    val = request.args.get("live") or request.form.get("live")
+def _get_param(name: str):
+    val = request.args.get(name) or request.form.get(name)
     if val is None:
         try:
             j = request.get_json(silent=True) or {}
-            val = j.get("live")
+            val = j.get(name)
         except Exception:
             val = None
+    return val
+
+
+def _parse_bool_param(name: str) -> bool:
+    val = _get_param(name)
     if isinstance(val, bool):
         return val
     if val is None:
@@ -36,69 +48,179 @@ def _parse_live_param() -> bool:
     return str(val).lower() == "true"
 
 
+def _parse_live_param() -> bool:
+    return _parse_bool_param("live")
+
+
+def _parse_match_params() -> tuple:
+    """
+    (umbral, top_k) de la petición: umbral de distancia para aceptar una
+    coincidencia y nº de individuos candidatos por cara. Por defecto
+    MATCH_THRESHOLD y MATCH_TOP_K. Lanza ValueError si no son válidos.
+    """
+    umbral, top_k = _get_param("umbral"), _get_param("top_k")
+    try:
+        umbral = MATCH_THRESHOLD if umbral in (None, "") else float(umbral)
+        top_k = MATCH_TOP_K if top_k in (None, "") else int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError("umbral debe ser un número y top_k un entero")
+    if not 0 < umbral <= MATCH_THRESHOLD_MAX:
+        raise ValueError(f"umbral debe estar entre 0 y {MATCH_THRESHOLD_MAX}")
+    if not 1 <= top_k <= MATCH_TOP_K_MAX:
+        raise ValueError(f"top_k debe estar entre 1 y {MATCH_TOP_K_MAX}")
+    return umbral, top_k
+
+
 # -------------------------
 # Detectar imagen
 # -------------------------
 @image_recognition_bp.route("/detectar_imagen", methods=["POST"])
 def detectar_imagen():
+    """
+    La imagen se decodifica directamente del buffer de la subida a un único
+    array RGB que se usa para caras, YOLO y la imagen anotada. El original sólo
+    se guarda en disco con GUARDAR_SUBIDAS o ``guardar=true``.
+    La respuesta incluye los tiempos por etapa en ``tiempos_ms`` y, en
+    ``caras``, los ``top_k`` individuos candidatos de cada cara con su
+    distancia, margen y ratio (``umbral`` y ``top_k`` son opcionales).
+    """
     file = request.files.get("file")
     if not file or not file.filename:
         return jsonify({"error": "No se envió ningún archivo"}), 400
+    try:
+        umbral, top_k = _parse_match_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    unique_name = f"{uuid.uuid4().hex}_{file.filename}"
-    save_path = os.path.join(IMAGENES_DETECTADAS, unique_name)
-    os.makedirs(IMAGENES_DETECTADAS, exist_ok=True)
-    file.save(save_path)
+    timer = StageTimer()
+    unique_name = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+    guardar = GUARDAR_SUBIDAS or _parse_bool_param("guardar")
 
-    try:
-        frame = read_image_safe(save_path)
-        frame_bgr = frame[:, :, ::-1].copy()
-    except Exception as e:
-        return jsonify({"error": f"No se pudo leer la imagen: {e}"}), 400
+    with upload_buffer(file.stream) as buf:
+        try:
+            with timer.stage("decodificacion"):
+                frame_rgb = decode_rgb(buf)
+        except ValueError as e:
+            return jsonify({"error": f"No se pudo leer la imagen: {e}"}), 400
+        if guardar:
+            with timer.stage("guardar_subida"):
+                save_upload(buf, os.path.join(IMAGENES_DETECTADAS, unique_name))
 
-    frame_annotated, faces = detect_faces_in_image(frame_bgr)
-    frame_annotated, objects_detected = detect_objects_with_yolo(frame_annotated, "imagen_detectada")
+    with timer.stage("caras"):
+        frame_annotated, faces = detect_faces_in_rgb(frame_rgb, umbral, top_k)
+    with timer.stage("objetos"):
+        frame_annotated, objects_detected = detect_objects_with_yolo(frame_annotated, "imagen_detectada", rgb=True)
 
     save_path_annotated = os.path.join(IMAGENES_DETECTADAS, f"annotated_{unique_name}")
-    cv2.imwrite(save_path_annotated, frame_annotated)
+    os.makedirs(IMAGENES_DETECTADAS, exist_ok=True)
+    with timer.stage("guardar_anotada"):
+        write_rgb(save_path_annotated, frame_annotated)
 
     individuos_detectados = []
     for f in faces:
         if f.get("id"):
-            ind = get_individuo_by_id(f["id"])
+            ind = get_individuo_cached(f["id"])
             if ind:
                 individuos_detectados.append(ind.to_dict())
 
     # Convertir objetos a formato {label: "..."}
     objetos = [{"label": obj["label"]} for obj in objects_detected]
 
+    tiempos = timer.as_dict()
+    logger.info(f"/detectar_imagen {frame_rgb.shape[1]}x{frame_rgb.shape[0]}: {tiempos}")
+
     return jsonify({
         "imagen_deteccion": save_path_annotated.replace("\\", "/"),
         "individuos_detectados": individuos_detectados,
-        "objetos": objetos
+        "caras": faces,
+        "objetos": objetos,
+        "tiempos_ms": tiempos
     })
 
 
 # -------------------------
-# Detectar video
+# Detectar varias imágenes (NDJSON)
 # -------------------------
-@image_recognition_bp.route("/detectar_video", methods=["POST"])
-def endpoint_detectar_video():
-    file = request.files.get("file")
-    if not file or not file.filename:
-        return jsonify({"error": "No se envió ningún archivo"}), 400
+def _imagenes_de_zip(zf: zipfile.ZipFile) -> list:
+    """
+    (nombre, abrir) de las imágenes del zip. Los límites se comprueban con
+    ZipInfo.file_size antes de descomprimir nada (zipfile no lee más de lo
+    declarado): más de MAX_ZIP_ENTRADAS entradas o más de MAX_ZIP_BYTES en
+    total lanza ValueError; una imagen de más de MAX_IMAGEN_BYTES falla sola
+    al abrirla (error en su línea del NDJSON).
+    """
+    infos = zf.infolist()
+    if len(infos) > MAX_ZIP_ENTRADAS:
+        raise ValueError(f"El .zip tiene {len(infos)} entradas, máximo {MAX_ZIP_ENTRADAS}")
+    imagenes = [i for i in infos if not i.is_dir() and i.filename.lower().endswith(EXTENSIONES_IMAGEN)]
+    total = sum(i.file_size for i in imagenes)
+    if total > MAX_ZIP_BYTES:
+        raise ValueError(f"El .zip descomprimido ocupa {total} bytes, máximo {MAX_ZIP_BYTES}")
+    return [(i.filename, (lambda i=i: _leer_entrada_zip(zf, i))) for i in imagenes]
+
+
+def _leer_entrada_zip(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> io.BytesIO:
+    if info.file_size > MAX_IMAGEN_BYTES:
+        raise ValueError(f"ocupa {info.file_size} bytes descomprimida, máximo {MAX_IMAGEN_BYTES}")
+    return io.BytesIO(zf.read(info))
 
-    filename = os.path.basename(file.filename)
-    file_path = os.path.join(IMAGENES_ANALIZAR, filename)
-    os.makedirs(IMAGENES_ANALIZAR, exist_ok=True)
-    file.save(file_path)
 
+@image_recognition_bp.route("/detectar_imagenes", methods=["POST"])
+def detectar_imagenes():
+    """
+    Varias imágenes en ``files`` (o un .zip) en una sola petición.
+    Responde en streaming con NDJSON: una línea por imagen según se completa
+    ({indice, archivo, imagen_deteccion, individuos_detectados, caras, objetos}
+    o {indice, archivo, error}) y una última línea {"resumen": {...}}.
+    ``umbral`` y ``top_k`` como en /detectar_imagen.
+    """
+    files = [f for f in request.files.getlist("files") + request.files.getlist("file") if f and f.filename]
+    if not files:
+        return jsonify({"error": "No se envió ningún archivo"}), 400
     try:
-        result = process_video_from_path(file_path)
-    except Exception as e:
-        logger.exception(e)
-        return jsonify({"error": str(e)}), 500
+        umbral, top_k = _parse_match_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    zips = [f for f in files if f.filename.lower().endswith(".zip")]
+    if zips:
+        if len(files) > 1:
+            return jsonify({"error": "Envía un único .zip o varias imágenes"}), 400
+        try:
+            zf = zipfile.ZipFile(zips[0].stream)
+        except zipfile.BadZipFile:
+            return jsonify({"error": "El .zip no es válido"}), 400
+        try:
+            imagenes = _imagenes_de_zip(zf)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 413
+    else:
+        imagenes = [(f.filename, (lambda f=f: f.stream)) for f in files]
+
+    if len(imagenes) > MAX_IMAGENES_PETICION:
+        return jsonify({"error": f"Máximo {MAX_IMAGENES_PETICION} imágenes por petición"}), 413
+
+    # Antes de empezar el streaming: una vez enviada la cabecera ya no se puede responder 503
+    get_models()
+
+    def _ndjson():
+        for resultado in detect_images_stream(imagenes, threshold=umbral, top_k=top_k):
+            yield json.dumps(resultado, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(_ndjson()), mimetype="application/x-ndjson")
+
+
+# -------------------------
+# Detectar video
+# -------------------------
+# Datos de la búsqueda de la cara (detection_images.match_details) que se copian a la respuesta
+_CAMPOS_COINCIDENCIA = ("distancia", "margen", "ratio", "candidatos")
 
+
+def _build_video_response(result: dict) -> dict:
+    """
+    Completa el resultado de process_video_from_path con los datos de cada individuo.
+    """
     frames_out = []
     individuos_result = []
     vistos = set()
@@ -107,7 +229,7 @@ def endpoint_detectar_video():
         ind_id = f["individuo"]
         frame_path = f["frame_path"]
 
-        ind_obj = get_individuo_by_id(ind_id)
+        ind_obj = get_individuo_cached(ind_id)
         if ind_obj:
             ind_dict = ind_obj.to_dict()
             key = ind_dict["_id"]
@@ -118,13 +240,163 @@ def endpoint_detectar_video():
             vistos.add(key)
             individuos_result.append(ind_dict)
 
-        frames_out.append({"frame_path": frame_path, "individuo": ind_dict})
+        frames_out.append({
+            "frame_path": frame_path,
+            "individuo": ind_dict,
+            **{k: f[k] for k in _CAMPOS_COINCIDENCIA if k in f},
+        })
 
     # Convertir objetos a formato {label: "..."} igual que en detectar_imagen
     objetos = [{"label": obj} for obj in result.get("objetos", [])]
 
-    return jsonify({
+    return {
         "frames_deteccion": frames_out,
         "individuos_detectados": individuos_result,
-        "objetos": objetos
-    })
+        "objetos": objetos,
+        "muestreo": result.get("muestreo"),
+        "tracks": result.get("tracks", []),
+        "seguimiento": result.get("seguimiento")
+    }
+
+
+def _video_job(params: dict, ctx: JobContext) -> dict:
+    """
+    Handler de los trabajos asíncronos de video.
+    """
+    # Los trabajos reanudados al arrancar esperan a que terminen de cargar los modelos
+    get_models(timeout=None)
+    result = process_video_from_path(
+        params["path"],
+        progress_cb=ctx.progress,
+        should_stop=ctx.cancelled,
+        # Los trabajos creados antes de poder elegirlos no los llevan
+        threshold=params.get("umbral", MATCH_THRESHOLD),
+        top_k=params.get("top_k", MATCH_TOP_K),
+    )
+    ctx.check_cancelled()
+    return _build_video_response(result)
+
+
+# Trabajos asíncronos: estado persistido en SQLite, se reanudan al reiniciar
+job_manager = get_job_manager()
+job_manager.register("video", _video_job)
+job_manager.resume("video")
+
+
+def _video_stream_events(file_path: str, umbral: float = MATCH_THRESHOLD, top_k: int = MATCH_TOP_K):
+    """
+    Eventos de iter_video_events con los datos de cada individuo añadidos y el
+    resultado final con el mismo formato que /detectar_video.
+    """
+    try:
+        for evento in iter_video_events(file_path, threshold=umbral, top_k=top_k):
+            if evento["tipo"] == "individuo":
+                ind_obj = get_individuo_cached(evento["individuo"])
+                if not ind_obj:
+                    continue
+                evento["individuo"] = ind_obj.to_dict()
+            elif evento["tipo"] == "objetos":
+                evento["objetos"] = [{"label": obj} for obj in evento["objetos"]]
+            elif evento["tipo"] == "fin":
+                evento["resultado"] = _build_video_response(evento["resultado"])
+            yield evento
+    except Exception as e:
+        logger.exception(e)
+        yield {"tipo": "error", "error": str(e)}
+
+
+def _stream_response(eventos, formato: str) -> Response:
+    if formato == "sse":
+        def _sse():
+            for evento in eventos:
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+        body, mimetype = _sse(), "text/event-stream"
+    else:
+        body = (json.dumps(evento, ensure_ascii=False) + "\n" for evento in eventos)
+        mimetype = "application/x-ndjson"
+    # Sin buffer en proxies (nginx) para que cada evento llegue al momento
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+@image_recognition_bp.route("/detectar_video", methods=["POST"])
+def endpoint_detectar_video():
+    """
+    Por defecto responde al terminar el video. Con ``async=true`` crea un
+    trabajo (202). Con ``stream=ndjson`` o ``stream=sse`` responde en streaming
+    con los eventos de iter_video_events: individuo (primera aparición, con
+    segundo y frame guardado), objetos, progreso y fin (resultado completo).
+    Cada frame de individuo lleva los ``top_k`` candidatos de esa cara con su
+    distancia, margen y ratio (``umbral`` y ``top_k`` como en /detectar_imagen).
+    """
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "No se envió ningún archivo"}), 400
+    try:
+        umbral, top_k = _parse_match_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    asincrono = _parse_bool_param("async")
+    stream = (request.args.get("stream") or request.form.get("stream") or "").lower()
+    if stream == "true":
+        stream = "ndjson"
+    if stream and stream not in ("ndjson", "sse"):
+        return jsonify({"error": "stream debe ser 'ndjson' o 'sse'"}), 400
+
+    filename = os.path.basename(file.filename)
+    if asincrono:
+        # Nombre único: el archivo debe seguir ahí si el trabajo se reanuda tras un reinicio
+        filename = f"{uuid.uuid4().hex}_{filename}"
+    file_path = os.path.join(IMAGENES_ANALIZAR, filename)
+    os.makedirs(IMAGENES_ANALIZAR, exist_ok=True)
+    file.save(file_path)
+
+    if asincrono:
+        try:
+            job_id = job_manager.submit("video", {"path": file_path, "umbral": umbral, "top_k": top_k})
+        except QueueFull as e:
+            os.remove(file_path)
+            return jsonify({"error": f"Cola de trabajos llena: {e}"}), 429
+        return jsonify({"job_id": job_id, "estado": "en_cola"}), 202
+
+    if stream:
+        get_models()
+        return _stream_response(_video_stream_events(file_path, umbral, top_k), stream)
+
+    try:
+        result = process_video_from_path(file_path, threshold=umbral, top_k=top_k)
+    except NotReady:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(_build_video_response(result))
+
+
+# -------------------------
+# Trabajos asíncronos
+# -------------------------
+@image_recognition_bp.route("/trabajos", methods=["GET"])
+def endpoint_listar_trabajos():
+    limit = request.args.get("limit", default=50, type=int)
+    return jsonify({"trabajos": job_manager.store.list(limit)})
+
+
+@image_recognition_bp.route("/trabajos/<job_id>", methods=["GET"])
+def endpoint_estado_trabajo(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "No se encontró el trabajo"}), 404
+    job.pop("params", None)
+    return jsonify(job)
+
+
+@image_recognition_bp.route("/trabajos/<job_id>", methods=["DELETE"])
+def endpoint_cancelar_trabajo(job_id: str):
+    job = job_manager.cancel(job_id)
+    if not job:
+        return jsonify({"error": "No se encontró el trabajo"}), 404
+    job.pop("params", None)
+    return jsonify(job)
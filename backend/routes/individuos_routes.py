@@ -8,25 +8,98 @@ from flask import Blueprint, request, jsonify, send_file
 from models.cara import Cara
 
 # Importación de rutas y utilidades de configuración e IA
-from config import IMAGENES_REFERENCIA, IMAGENES_ANALIZAR, IMAGENES_DETECTADAS, get_models, read_image_safe, add_reference_encoding
+from config import (
+    IMAGENES_REFERENCIA, IMAGENES_ANALIZAR, IMAGENES_DETECTADAS, IMAGENES_IMPORTACIONES, IMPORTAR_RAIZ,
+    INDIVIDUOS_LIMIT_MAX,
+    read_image_safe, add_reference_encoding, remove_reference_encoding, remove_individuo_encodings, wait_references,
+    get_job_manager, index_status, save_index_snapshot, reload_index_snapshot
+)
 from utils.detection_images import detect_faces_in_image, read_image_safe
+from utils.bulk_import import importar_caras, is_within
+from utils.jobs import JobContext, QueueFull
 from models.individuo import Individuo, serialize_individuo
 
 # Funciones MongoDB para CRUD de individuos y caras
 from mongo.mongo_individuos import (
     crear_individuo, borrar_individuo,
     agregar_caras_a_individuo, consultar_caras_individuo, 
-    get_cara_id, modificar_individuo, get_individuo_by_id
+    modificar_individuo, get_individuo_by_id, invalidar_individuo, individuos_cache
 )
-from mongo.mongo_caras import crear_cara, borrar_cara 
+from mongo.mongo_caras import crear_cara, borrar_cara, get_caras_by_ids
 from werkzeug.utils import secure_filename
 
 # Crear blueprint para agrupar las rutas del módulo
 individuos_bp = Blueprint("individuos", __name__)
 logger = logging.getLogger("detector.routes.individuos")
 
-# Cargar modelos globales de reconocimiento: KDTree, nombres y YOLO
-kdtree, reference_names, yolo_model = get_models()
+
+# -------------------------
+# Importación masiva (trabajo asíncrono)
+# -------------------------
+def _importacion_job(params: dict, ctx: JobContext) -> dict:
+    try:
+        resumen = importar_caras(
+            params["origen"],
+            params.get("manifest"),
+            progress_cb=ctx.progress,
+            should_stop=ctx.cancelled,
+        )
+        ctx.check_cancelled()
+        return resumen
+    finally:
+        # El zip subido sólo se borra al terminar: si el servidor se reinicia el trabajo se reanuda
+        if params.get("borrar_origen") and os.path.exists(params["origen"]):
+            os.remove(params["origen"])
+
+
+job_manager = get_job_manager()
+job_manager.register("importacion", _importacion_job)
+job_manager.resume("importacion")
+
+
+@individuos_bp.route("/importar_caras", methods=["POST"])
+def endpoint_importar_caras():
+    """
+    Importación masiva: un .zip subido en ``file`` o un JSON
+    {"directorio": "...", "manifest": "..." (opcional)} con rutas del servidor
+    dentro de IMPORTAR_RAIZ (relativas a ella o absolutas).
+    Responde 202 con el id del trabajo; el progreso y los fallos por archivo
+    se consultan en GET /trabajos/<job_id>.
+    """
+    file = request.files.get("file")
+    if file and file.filename:
+        if not file.filename.lower().endswith(".zip"):
+            return jsonify({"error": "Se esperaba un fichero .zip"}), 400
+        os.makedirs(IMAGENES_IMPORTACIONES, exist_ok=True)
+        origen = os.path.join(IMAGENES_IMPORTACIONES, f"{uuid.uuid4().hex}.zip")
+        file.save(origen)
+        params = {"origen": origen, "borrar_origen": True}
+    else:
+        data = request.get_json(silent=True) or {}
+        directorio = data.get("directorio")
+        if not directorio:
+            return jsonify({"error": "Envía un .zip o un 'directorio' existente"}), 400
+        directorio = os.path.join(IMPORTAR_RAIZ, directorio)
+        if not is_within(IMPORTAR_RAIZ, directorio):
+            return jsonify({"error": f"El directorio debe estar dentro de {IMPORTAR_RAIZ}"}), 400
+        if not os.path.isdir(directorio):
+            return jsonify({"error": "Envía un .zip o un 'directorio' existente"}), 400
+        manifest = data.get("manifest")
+        if manifest:
+            manifest = os.path.join(IMPORTAR_RAIZ, manifest)
+            if not is_within(IMPORTAR_RAIZ, manifest):
+                return jsonify({"error": f"El manifest debe estar dentro de {IMPORTAR_RAIZ}"}), 400
+            if not os.path.isfile(manifest):
+                return jsonify({"error": "No se encontró el manifest"}), 400
+        params = {"origen": directorio, "manifest": manifest}
+
+    try:
+        job_id = job_manager.submit("importacion", params)
+    except QueueFull as e:
+        if params.get("borrar_origen"):
+            os.remove(params["origen"])
+        return jsonify({"error": f"Cola de trabajos llena: {e}"}), 429
+    return jsonify({"job_id": job_id, "estado": "en_cola"}), 202
 
 
 
@@ -58,6 +131,7 @@ def endpoint_crear_individuo():
         if not individuo_guardado:
             return jsonify({"error": "No se pudieron agregar las caras"}), 500
 
+    invalidar_individuo(individuo_guardado.id)
     return jsonify({"individuo": serialize_individuo(individuo_guardado.to_dict())})
 
 
@@ -83,6 +157,7 @@ def endpoint_modificar_individuo():
 
     # Intentar actualizar en MongoDB
     individuo_modificado = modificar_individuo(individuo)
+    invalidar_individuo(individuo.id)
     if not individuo_modificado:
         return jsonify({"error": "No se pudo modificar el individuo (posiblemente no existe)"}), 400
 
@@ -109,6 +184,11 @@ def endpoint_borrar_individuo(id):
     if not individuo:
         return jsonify({"error": "No se encontró el individuo"}), 404
 
+    # Quitar sus caras del índice de detección antes de tocar Mongo
+    # (si el índice no está listo, 503 sin haber borrado nada)
+    wait_references()
+    remove_individuo_encodings(id)
+
     # Borrar todas las caras de Mongo
     for cara in individuo.caras:
         if cara.id:
@@ -124,6 +204,7 @@ def endpoint_borrar_individuo(id):
 
     # Borrar el individuo de Mongo
     success = borrar_individuo(id)
+    invalidar_individuo(id)
     if not success:
         return jsonify({"error": "No se pudo borrar el individuo"}), 400
 
@@ -136,14 +217,37 @@ def endpoint_borrar_individuo(id):
 # -------------------------
 @individuos_bp.route("/consultar_individuos", methods=["GET"])
 def endpoint_consultar_individuos():
-    from mongo.mongo_individuos import get_individuos
-    from mongo.mongo_caras import get_cara_id
+    """
+    Sin parámetros devuelve la lista completa (como siempre).
+    Con ``limit`` (y ``after`` = último id recibido) devuelve una página:
+    {"individuos": [...], "siguiente": id para la siguiente página o null}.
+    ``limit`` debe ser un entero >= 1 y se recorta a INDIVIDUOS_LIMIT_MAX
+    (también es el tamaño de página si sólo se da ``after``).
+    Las caras de toda la página se recuperan con una única consulta $in.
+    """
+    from mongo.mongo_individuos import get_individuos_page
+    from mongo.mongo_caras import get_caras_by_ids
     import os
 
-    # Obtener todos los individuos
-    individuos = get_individuos()
-    if individuos is None:
-        return jsonify({"error": "No se pudo obtener individuos"}), 400
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    paginado = limit is not None or after is not None
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({"error": "limit debe ser un entero"}), 400
+        if limit < 1:
+            return jsonify({"error": "limit debe ser mayor o igual que 1"}), 400
+    if paginado:
+        limit = min(limit or INDIVIDUOS_LIMIT_MAX, INDIVIDUOS_LIMIT_MAX)
+
+    try:
+        individuos = get_individuos_page(limit, after)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    caras = get_caras_by_ids([c.id for ind in individuos for c in ind.caras])
 
     individuos_serializados = []
 
@@ -153,7 +257,7 @@ def endpoint_consultar_individuos():
         # Completar las caras como objetos Cara
         caras_completas = []
         for cara_id in ind_dict.get("caras", []):
-            cara_obj = get_cara_id(cara_id)
+            cara_obj = caras.get(cara_id)
             if cara_obj:
                 # Asegurarse que path sea relativo y use '/'
                 filename = os.path.basename(cara_obj.path)
@@ -168,6 +272,9 @@ def endpoint_consultar_individuos():
 
         individuos_serializados.append(ind_dict)
 
+    if paginado:
+        siguiente = individuos[-1].id if limit and len(individuos) == limit else None
+        return jsonify({"individuos": individuos_serializados, "siguiente": siguiente})
     return jsonify(individuos_serializados)
 
 
@@ -202,6 +309,57 @@ def endpoint_consultar_individuo(individuo_id: str):
     # Devolver como JSON usando to_dict()
     return jsonify({"individuo": individuo.to_dict()})
 
+
+# -------------------------
+# Estadísticas de la caché de individuos
+# -------------------------
+@individuos_bp.route("/cache_individuos", methods=["GET"])
+def endpoint_cache_individuos():
+    """
+    Aciertos, fallos, expulsiones (LRU) y caducadas (TTL) de la caché de
+    individuos de este proceso. DELETE la vacía.
+    """
+    return jsonify(individuos_cache.stats())
+
+
+@individuos_bp.route("/cache_individuos", methods=["DELETE"])
+def endpoint_vaciar_cache_individuos():
+    invalidar_individuo()
+    return jsonify(individuos_cache.stats())
+
+# -------------------------
+# Índice de caras: versión actual y snapshot en disco
+# -------------------------
+@individuos_bp.route("/indice", methods=["GET"])
+def endpoint_indice():
+    return jsonify(index_status())
+
+
+@individuos_bp.route("/indice/guardar", methods=["POST"])
+def endpoint_guardar_indice():
+    try:
+        return jsonify(save_index_snapshot())
+    except OSError as e:
+        logger.error(f"[ERROR] Guardando snapshot del índice: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@individuos_bp.route("/indice/recargar", methods=["POST"])
+def endpoint_recargar_indice():
+    """
+    Carga el snapshot guardado por otra réplica. Las altas/bajas de este
+    proceso posteriores al snapshot se pierden.
+    """
+    try:
+        return jsonify(reload_index_snapshot())
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"[ERROR] Recargando snapshot del índice: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # -------------------------
 # Agregar cara a individuo
 # -------------------------
@@ -211,6 +369,9 @@ def endpoint_agregar_cara_individuo(id: str):
     if not file or not file.filename:
         return jsonify({"error": "No se envió ningún archivo"}), 400
 
+    # Si el índice no está listo, 503 antes de guardar nada
+    wait_references()
+
     # Nombre único
     unique_id = uuid.uuid4().hex[:8]
     filename = f"{id}___{unique_id}.jpg"
@@ -243,6 +404,7 @@ def endpoint_agregar_cara_individuo(id: str):
 
     # Agregar cara al individuo
     individuo_actualizado = agregar_caras_a_individuo(id, [cara_guardada.id])
+    invalidar_individuo(id)
     if not individuo_actualizado:
         os.remove(save_path)
         return jsonify({"error": "No se pudo asociar la cara al individuo"}), 500
@@ -253,11 +415,12 @@ def endpoint_agregar_cara_individuo(id: str):
     except Exception as e:
         logger.warning(f"No se pudo agregar la cara al KDTree: {e}")
 
-    # Devolver individuo actualizado con caras completas
+    # Devolver individuo actualizado con caras completas (un único $in)
     ind_dict = individuo_actualizado.to_dict()
+    caras = get_caras_by_ids(ind_dict.get("caras", []))
     caras_completas: List[Dict] = []
     for cara_id in ind_dict.get("caras", []):
-        cara_obj = get_cara_id(cara_id)
+        cara_obj = caras.get(cara_id)
         if cara_obj:
             cara_obj.path = cara_obj.path.replace("\\", "/")
             caras_completas.append(cara_obj.to_dict())
@@ -286,6 +449,12 @@ def endpoint_eliminar_cara(cara_id: str, individuo_id: str):
     if not cara:
         return jsonify({"error": "No se encontró la cara"}), 404
 
+    # Quitar la cara del índice de detección antes de tocar Mongo
+    # (si el índice no está listo, 503 sin haber borrado nada)
+    wait_references()
+    if cara.path:
+        remove_reference_encoding(cara.path)
+
     # Borrar de Mongo
     if cara.id:
         borrar_cara(cara.id)
@@ -305,6 +474,7 @@ def endpoint_eliminar_cara(cara_id: str, individuo_id: str):
 
     # Guardar cambios en Mongo
     individuo_modificado = modificar_individuo(individuo)
+    invalidar_individuo(individuo_id)
     if not individuo_modificado:
         return jsonify({"error": "No se pudo actualizar el individuo"}), 500
 
@@ -329,6 +499,11 @@ def endpoint_crear_individuo_con_cara():
     if not nombre:
         return jsonify({"error": "Nombre obligatorio"}), 400
 
+    # Con cara, si el índice no está listo, 503 antes de crear nada
+    file = request.files.get("file")
+    if file and file.filename:
+        wait_references()
+
     # Crear objeto Individuo
     individuo = Individuo(nombre=nombre, apellido1=apellido1, apellido2=apellido2)
     individuo_guardado = crear_individuo(individuo)
@@ -337,7 +512,6 @@ def endpoint_crear_individuo_con_cara():
         return jsonify({"error": "No se pudo crear el individuo"}), 500
 
     # Si hay archivo de cara
-    file = request.files.get("file")
     if file and file.filename:
         # Crear nombre seguro y único
         filename = f"{individuo_guardado.id}___{secure_filename(file.filename)}"
@@ -362,6 +536,8 @@ def endpoint_crear_individuo_con_cara():
             except Exception as e:
                 logger.warning(f"No se pudo agregar la cara al KDTree: {e}")
 
+    invalidar_individuo(individuo_guardado.id)
+
     # Serializar y devolver
     return jsonify(serialize_individuo(individuo_guardado.to_dict())), 200
 
@@ -380,6 +556,11 @@ def endpoint_modificar_individuo_con_cara():
     if not individuo_id or not nombre:
         return jsonify({"error": "ID y nombre son obligatorios"}), 400
 
+    # Con cara, si el índice no está listo, 503 antes de guardar nada
+    file = request.files.get("file")
+    if file and file.filename:
+        wait_references()
+
     # Obtener el individuo
     individuo = get_individuo_by_id(individuo_id)
     if not individuo:
@@ -391,7 +572,6 @@ def endpoint_modificar_individuo_con_cara():
     individuo.apellido2 = apellido2
 
     # Revisar si hay archivo enviado
-    file = request.files.get("file")
     if file and file.filename:
         # Crear nombre único
         unique_id = uuid.uuid4().hex[:8]
@@ -424,6 +604,7 @@ def endpoint_modificar_individuo_con_cara():
 
         # Asociar la cara al individuo
         individuo = agregar_caras_a_individuo(individuo_id, [nueva_cara.id])
+        invalidar_individuo(individuo_id)
         if not individuo:
             os.remove(save_path)
             return jsonify({"error": "No se pudo asociar la cara al individuo"}), 500
@@ -436,6 +617,7 @@ def endpoint_modificar_individuo_con_cara():
 
     # Guardar cambios del individuo
     individuo_modificado = modificar_individuo(individuo)
+    invalidar_individuo(individuo_id)
     if not individuo_modificado:
         return jsonify({"error": "No se pudo actualizar el individuo"}), 500
 
@@ -0,0 +1,11 @@
+# conftest.py
+# --------------------------
+# Los tests importan los módulos como la app (utils.*, mongo.*, benchmarks.*),
+# con backend/ en sys.path, se lancen desde backend/ o desde la raíz:
+#     python -m pytest backend/tests
+# --------------------------
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+# test_face_index_stress.py
+# --------------------------
+# Versión corta de benchmarks/bench_index_stress.py: altas, bajas, fusiones,
+# compactaciones y recargas desde disco mientras otros hilos detectan, con
+# las mismas comprobaciones de consistencia
+# --------------------------
+
+import pytest
+
+from benchmarks.bench_index_stress import run_stress
+
+
+@pytest.mark.parametrize("backend", ["brute", "float16"])
+def test_altas_bajas_y_recargas_durante_lecturas(backend):
+    estado, index, _, v0 = run_stress(segundos=1.5, escritores=2, lectores=3, personas=300, fijos=100,
+                                      backend=backend, recarga=0.3)
+
+    assert estado.errores == []
+    # Que la prueba haya ejercitado de verdad la concurrencia
+    assert estado.altas > 0 and estado.bajas > 0 and estado.recargas > 0
+    assert estado.consultas > 0
+    assert index.version > v0
@@ -0,0 +1,45 @@
+# test_mongo_indexes.py
+# --------------------------
+# Las consultas por cara usan los índices de mongo.connection.ensure_indexes
+# (caras_1 y path_1): explain() muestra IXSCAN y no COLLSCAN.
+#
+# Necesita un MongoDB real (mongomock no implementa explain): MONGO_TEST_URI
+# (por defecto mongodb://localhost:27017/). Si no responde, se salta.
+# --------------------------
+
+import os
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from benchmarks.bench_mongo_indexes import explain, fill, uses_index
+from mongo.connection import ensure_indexes
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017/")
+
+
+@pytest.fixture
+def db():
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"MongoDB no disponible en {MONGO_TEST_URI}: {e}")
+    db_name = f"test_indices_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[db_name]
+    finally:
+        client.drop_database(db_name)
+        client.close()
+
+
+def test_consultas_por_cara_usan_indices(db):
+    consultas = fill(db, individuos=2000, caras=3)
+    assert sorted(ensure_indexes(db)) == ["caras_1", "path_1"]
+
+    for nombre, col, query in consultas:
+        st, _, _ = explain(db, col, query)
+        assert uses_index(st), f"{nombre}: {sorted(st)}"
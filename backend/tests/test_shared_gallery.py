@@ -0,0 +1,123 @@
+# test_shared_gallery.py
+# --------------------------
+# Galería compartida entre workers (utils/shared_gallery.py):
+#   - las altas y bajas de un worker se ven en los demás tras su sync
+#   - al compactarse, cada worker pasa al fichero nuevo sin filas muertas
+#     y sigue recibiendo altas incrementales
+# Dos SharedGallery sobre el mismo directorio hacen de dos workers (cada una
+# con su mapeo y su índice); la última prueba usa procesos de verdad, como
+# benchmarks/bench_shared_gallery.py.
+# --------------------------
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_shared_gallery import run
+from utils.face_index import FaceIndex
+from utils.shared_gallery import SharedGallery, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="La galería compartida sólo funciona en POSIX")
+
+THRESHOLD = 0.6
+PERSONAS = 40
+FOTOS = 2
+
+
+@pytest.fixture
+def datos():
+    # Centros lejos unos de otros: la consulta con el centro de pX sólo puede dar pX o ninguno
+    rng = np.random.default_rng(0)
+    centros = rng.normal(0, 0.09, (PERSONAS + 1, 128))
+    encs = np.repeat(centros[:PERSONAS], FOTOS, axis=0) + rng.normal(0, 0.01, (PERSONAS * FOTOS, 128))
+    names = [f"p{p}___{i}" for p in range(PERSONAS) for i in range(FOTOS)]
+    return centros, encs, names
+
+
+def _worker(directorio: str, compact_threshold: int = 64):
+    gallery = SharedGallery(directorio, compact_threshold=compact_threshold)
+    index = FaceIndex(backend="brute")
+    gallery.sync(index)
+    index.merge(wait=True)
+    return gallery, index
+
+
+def _ids(index: FaceIndex, X: np.ndarray):
+    _, ids = index.match(X, THRESHOLD)
+    return ids
+
+
+def test_altas_y_bajas_visibles_en_otro_worker(tmp_path, datos):
+    centros, encs, names = datos
+    escritor, index_escritor = _worker(str(tmp_path))
+    assert escritor.ensure("sesion", lambda: (encs, names))
+    lector, index_lector = _worker(str(tmp_path))
+    assert len(index_lector) == len(names)
+
+    nuevo = centros[PERSONAS:]
+    escritor.append(nuevo, ["nuevo___0"])
+    escritor.sync(index_escritor)
+    assert _ids(index_lector, nuevo) == [None]
+    assert lector.sync(index_lector)
+    assert _ids(index_lector, nuevo) == ["nuevo"]
+    # Sin cambios, sync no hace nada
+    assert not lector.sync(index_lector)
+
+    escritor.remove("nuevo___0")
+    escritor.remove_individuo("p3")
+    assert lector.sync(index_lector)
+    assert _ids(index_lector, np.vstack([nuevo, centros[3:5]])) == [None, None, "p4"]
+    assert lector.generation == escritor.header().generation
+
+
+def test_compactacion_reconecta_los_workers(tmp_path, datos):
+    centros, encs, names = datos
+    escritor, index_escritor = _worker(str(tmp_path), compact_threshold=5)
+    escritor.ensure("sesion", lambda: (encs, names))
+    lector, index_lector = _worker(str(tmp_path), compact_threshold=5)
+    build = escritor.header().build
+
+    borrados = 0
+    while escritor.header().build == build:
+        escritor.remove_individuo(f"p{borrados}")
+        borrados += 1
+    assert borrados == 5
+    assert escritor.header().removals == 0
+    assert escritor.header().rows == (PERSONAS - borrados) * FOTOS
+
+    assert lector.sync(index_lector)
+    snap = index_lector.snapshot()
+    assert lector.status()["reconstruccion"] == escritor.header().build
+    assert snap.n_dead == 0
+    assert len(index_lector) == (PERSONAS - borrados) * FOTOS
+    esperado = [None] * borrados + [f"p{p}" for p in range(borrados, PERSONAS)]
+    assert _ids(index_lector, centros[:PERSONAS]) == esperado
+
+    # Tras la compactación las altas vuelven a ser incrementales sobre el fichero nuevo
+    nuevo = centros[PERSONAS:]
+    escritor.append(nuevo, ["nuevo___0"])
+    assert lector.sync(index_lector)
+    assert _ids(index_lector, nuevo) == ["nuevo"]
+    assert lector.status()["reconstruccion"] == escritor.header().build
+
+
+def test_workers_en_procesos_ven_altas_y_compactacion(tmp_path):
+    # Como bench_shared_gallery, con una galería pequeña y dos procesos worker
+    rng = np.random.default_rng(0)
+    n = 400
+    galeria = rng.normal(0, 0.09, (n, 128)).astype(np.float32)
+    consultas = galeria[rng.integers(0, n, 8)].astype(np.float64)
+    nuevo = rng.normal(0.5, 0.09, (1, 128))
+    gallery = SharedGallery(str(tmp_path))
+    gallery.ensure("sesion", lambda: (galeria, [f"p{i // 4}___{i}" for i in range(n)]))
+
+    listos, vistos = run("compartida", 2, str(tmp_path), consultas, nuevo, gallery)
+
+    assert len(listos) == 2
+    altas = [v for v in vistos if v[0] == "visto"]
+    assert len(altas) == 2 and all(encontrado for _, _, encontrado, _, _ in altas)
+    compactadas = [v for v in vistos if v[0] == "compactada"]
+    assert len(compactadas) == 2
+    for _, _, build, muertas, encontrado in compactadas:
+        assert build == gallery.header().build
+        assert muertas == 0
+        assert encontrado
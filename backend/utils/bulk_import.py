@@ -0,0 +1,305 @@
+# bulk_import.py
+# --------------------------
+# Importación masiva de caras desde un zip o un directorio
+# --------------------------
+#
+# Origen:
+#   - Un .zip o un directorio con una carpeta por individuo: <carpeta>/<foto>.
+#     Si <carpeta> es el id de un individuo existente, las caras se le añaden;
+#     si no, se crea un individuo con nombre = <carpeta>.
+#   - Opcionalmente un manifest JSON (``manifest.json`` en la raíz del zip o
+#     la ruta indicada) con {"caras": [{"archivo", "individuo_id" | "nombre",
+#     "apellido1", "apellido2"}]}; ``archivo`` es relativo al zip/directorio.
+#     Las entradas absolutas o que salen del origen (``..``, enlaces) fallan.
+#
+# Proceso:
+#   1. Cada imagen se copia a IMAGENES_IMPORTACIONES y se codifica en paralelo
+#      con el servicio de encodings (debe tener exactamente una cara).
+#   2. Al final, en bloque: insert_many de individuos nuevos y de caras,
+#      bulk_write de $addToSet en individuos, las imágenes pasan a
+#      IMAGENES_REFERENCIA y el índice de caras se actualiza una sola vez.
+# Si se cancela antes del paso 2 no se importa nada.
+#
+# Uso por línea de comandos (desde backend/):
+#     python -m utils.bulk_import dataset.zip
+#     python -m utils.bulk_import /datos/caras --manifest /datos/manifest.json --guardar-indice
+# Por línea de comandos sólo se actualiza el índice en memoria de ese proceso,
+# no el de un servidor en marcha: con --guardar-indice se escribe el snapshot
+# y el servidor lo carga con POST /api/indice/recargar (o al reiniciarse).
+
+import os
+import json
+import time
+import uuid
+import shutil
+import zipfile
+import logging
+import sys
+import argparse
+from pathlib import PurePosixPath, PureWindowsPath
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from config import (
+    FACE_INDEX_SNAPSHOT, IMAGENES_REFERENCIA, IMAGENES_IMPORTACIONES, add_reference_encodings,
+    get_encoding_service, save_index_snapshot, startup
+)
+from models.individuo import Individuo
+from mongo.mongo_caras import crear_caras
+from mongo.mongo_individuos import (
+    agregar_caras_a_individuos, crear_individuos, get_individuos_by_ids, invalidar_individuo
+)
+from utils.encoding_cache import EXTENSIONES_IMAGEN
+from utils.startup import NotReady
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 256  # imágenes en vuelo en el servicio de encodings
+MAX_FALLOS_PARCIAL = 100
+
+
+# --------------------------
+# Lectura del origen
+# --------------------------
+def _item_from_folder(archivo: str, carpeta: str) -> Dict:
+    if ObjectId.is_valid(carpeta):
+        return {"archivo": archivo, "individuo_id": carpeta}
+    return {"archivo": archivo, "nombre": carpeta}
+
+
+def _items_from_manifest(manifest) -> List[Dict]:
+    caras = manifest.get("caras", []) if isinstance(manifest, dict) else manifest
+    return [dict(c) for c in caras if c.get("archivo")]
+
+
+def _items_from_zip(zf: zipfile.ZipFile) -> List[Dict]:
+    names = zf.namelist()
+    if "manifest.json" in names:
+        return _items_from_manifest(json.loads(zf.read("manifest.json")))
+    items = []
+    for name in names:
+        if name.endswith("/") or not name.lower().endswith(EXTENSIONES_IMAGEN):
+            continue
+        parts = PurePosixPath(name).parts
+        items.append(_item_from_folder(name, parts[-2]) if len(parts) >= 2 else {"archivo": name})
+    return items
+
+
+def _items_from_dir(directorio: str, manifest_path: Optional[str]) -> List[Dict]:
+    if manifest_path:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return _items_from_manifest(json.load(f))
+    items = []
+    for carpeta in sorted(os.listdir(directorio)):
+        sub = os.path.join(directorio, carpeta)
+        if not os.path.isdir(sub):
+            continue
+        for name in sorted(os.listdir(sub)):
+            if name.lower().endswith(EXTENSIONES_IMAGEN):
+                items.append(_item_from_folder(f"{carpeta}/{name}", carpeta))
+    return items
+
+
+def is_within(root: str, path: str) -> bool:
+    """
+    Si ``path`` (resolviendo ``..`` y enlaces simbólicos) queda dentro de ``root``.
+    """
+    root = os.path.realpath(root)
+    try:
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+    except ValueError:
+        # En Windows, rutas en unidades distintas
+        return False
+
+
+def _archivo_seguro(origen: str, archivo: str, es_zip: bool) -> bool:
+    if es_zip:
+        ruta = archivo.replace("\\", "/")
+        return not (PurePosixPath(ruta).is_absolute() or PureWindowsPath(ruta).drive
+                    or ".." in PurePosixPath(ruta).parts)
+    return not os.path.isabs(archivo) and is_within(origen, os.path.join(origen, archivo))
+
+
+def _individuo_key(item: Dict) -> Optional[Tuple]:
+    if item.get("individuo_id"):
+        return ("id", item["individuo_id"])
+    if item.get("nombre"):
+        return ("nuevo", item["nombre"], item.get("apellido1", ""), item.get("apellido2", ""))
+    return None
+
+
+# --------------------------
+# Importación
+# --------------------------
+def importar_caras(
+    origen: str,
+    manifest: Optional[str] = None,
+    progress_cb: Optional[Callable[[Dict, Dict], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict:
+    """
+    Importa las caras de ``origen`` (.zip o directorio).
+    ``progress_cb(progreso, parcial)`` se llama tras cada bloque de imágenes
+    codificadas; ``should_stop()`` permite cancelar antes de guardar nada.
+    Devuelve un resumen con importadas, fallidas y los fallos por archivo.
+    Lanza NotReady si los encodings de referencia o MongoDB no cargaron.
+    """
+    # Trabajos reanudados al arrancar o uso por CLI: esperar a Mongo y al índice de caras
+    necesarios = ("referencias", "mongo")
+    terminados = startup.wait(necesarios)
+    fallidos = [n for n in necesarios if not (terminados and startup.is_ready(n))]
+    if fallidos:
+        raise NotReady(f"No se puede importar: no cargó {', '.join(fallidos)}", startup.status())
+    t0 = time.monotonic()
+    es_zip = zipfile.is_zipfile(origen)
+    zf = zipfile.ZipFile(origen) if es_zip else None
+    staging = os.path.join(IMAGENES_IMPORTACIONES, uuid.uuid4().hex)
+    os.makedirs(staging, exist_ok=True)
+
+    fallos: List[Dict] = []
+    ok: List[Dict] = []
+    try:
+        items = _items_from_zip(zf) if es_zip else _items_from_dir(origen, manifest)
+        total = len(items)
+
+        # Individuos ya existentes referenciados por id (un único $in)
+        ids = [i["individuo_id"] for i in items if i.get("individuo_id")]
+        existentes = get_individuos_by_ids(ids)
+
+        validos = []
+        for item in items:
+            key = _individuo_key(item)
+            if not _archivo_seguro(origen, item["archivo"], es_zip):
+                fallos.append({"archivo": item["archivo"], "error": "Ruta fuera del origen"})
+            elif key is None:
+                fallos.append({"archivo": item["archivo"], "error": "Sin individuo (carpeta o manifest)"})
+            elif key[0] == "id" and key[1] not in existentes:
+                fallos.append({"archivo": item["archivo"], "error": f"No existe el individuo {key[1]}"})
+            else:
+                validos.append((item, key))
+
+        def _progress(fase: str, procesadas: int):
+            if progress_cb is not None:
+                progress_cb(
+                    {"fase": fase, "procesadas": procesadas, "total": total,
+                     "importadas": len(ok), "fallidas": len(fallos)},
+                    {"fallos": fallos[-MAX_FALLOS_PARCIAL:]},
+                )
+
+        # 1. Copiar y codificar en paralelo, por bloques
+        service = get_encoding_service()
+        procesadas = total - len(validos)
+        for start in range(0, len(validos), CHUNK):
+            if should_stop is not None and should_stop():
+                return {"cancelado": True}
+            bloque = []
+            for item, key in validos[start: start + CHUNK]:
+                ext = os.path.splitext(item["archivo"])[1].lower()
+                staged = os.path.join(staging, f"{uuid.uuid4().hex[:8]}{ext}")
+                try:
+                    if es_zip:
+                        with zf.open(item["archivo"]) as src, open(staged, "wb") as dst:
+                            shutil.copyfileobj(src, dst)
+                    else:
+                        shutil.copyfile(os.path.join(origen, item["archivo"]), staged)
+                    bloque.append((item, key, staged, service.submit_path(staged)))
+                except Exception as e:
+                    fallos.append({"archivo": item["archivo"], "error": f"No se pudo leer: {e}"})
+
+            for item, key, staged, fut in bloque:
+                try:
+                    _, encs = fut.result()
+                    if len(encs) != 1:
+                        raise ValueError(f"debe contener exactamente UNA cara ({len(encs)} encontradas)")
+                    ok.append({"item": item, "key": key, "staged": staged, "encoding": encs[0]})
+                except Exception as e:
+                    fallos.append({"archivo": item["archivo"], "error": str(e)})
+            procesadas += len(validos[start: start + CHUNK])
+            _progress("codificando", procesadas)
+
+        if should_stop is not None and should_stop():
+            return {"cancelado": True}
+
+        # 2. Guardar todo en bloque
+        _progress("guardando", procesadas)
+        nuevos_keys = sorted({r["key"] for r in ok if r["key"][0] == "nuevo"})
+        creados = crear_individuos([
+            Individuo(nombre=k[1], apellido1=k[2], apellido2=k[3]) for k in nuevos_keys
+        ])
+        id_por_key = {k: ind.id for k, ind in zip(nuevos_keys, creados)}
+        id_por_key.update({("id", i): i for i in existentes})
+
+        os.makedirs(IMAGENES_REFERENCIA, exist_ok=True)
+        paths = []
+        for r in ok:
+            individuo_id = id_por_key[r["key"]]
+            filename = f"{individuo_id}___{os.path.basename(r['staged'])}"
+            final = os.path.join(IMAGENES_REFERENCIA, filename)
+            os.replace(r["staged"], final)
+            r["individuo_id"] = individuo_id
+            paths.append(os.path.relpath(final, start=os.getcwd()).replace("\\", "/"))
+
+        caras = crear_caras(paths)
+        caras_por_individuo: Dict[str, List[str]] = {}
+        for r, cara in zip(ok, caras):
+            caras_por_individuo.setdefault(r["individuo_id"], []).append(cara.id)
+        agregar_caras_a_individuos(caras_por_individuo)
+        for individuo_id in caras_por_individuo:
+            invalidar_individuo(individuo_id)
+
+        if ok:
+            add_reference_encodings(paths, np.stack([r["encoding"] for r in ok]))
+
+        resumen = {
+            "total": total,
+            "importadas": len(ok),
+            "fallidas": len(fallos),
+            "individuos_creados": len(creados),
+            "individuos_actualizados": len(caras_por_individuo),
+            "fallos": fallos,
+            "duracion_s": round(time.monotonic() - t0, 2),
+        }
+        _progress("completado", procesadas)
+        logger.info(f"[OK] Importación: {len(ok)} caras importadas, {len(fallos)} fallidas")
+        return resumen
+    finally:
+        if zf is not None:
+            zf.close()
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importación masiva de caras",
+        epilog="Sólo se actualiza el índice en memoria de este proceso, no el de un servidor en marcha: "
+               "las caras quedan en MongoDB, en imagenes/referencia y en la caché de encodings, y el "
+               "servidor las ve al reiniciarse o, con --guardar-indice, tras POST /api/indice/recargar.",
+    )
+    parser.add_argument("origen", help="Fichero .zip o directorio con una carpeta por individuo")
+    parser.add_argument("--manifest", default=None, help="Manifest JSON (sólo para directorios)")
+    parser.add_argument("--guardar-indice", action="store_true",
+                        help=f"Al terminar, guardar el índice en {FACE_INDEX_SNAPSHOT} para recargarlo en el servidor")
+    args = parser.parse_args()
+
+    def _print_progress(progreso, _):
+        print(f"[{progreso['fase']}] {progreso['procesadas']}/{progreso['total']} "
+              f"importadas={progreso['importadas']} fallidas={progreso['fallidas']}")
+
+    try:
+        resumen = importar_caras(args.origen, args.manifest, progress_cb=_print_progress)
+    except NotReady as e:
+        print(f"[ERROR] {e}: {e.status.get('componentes')}", file=sys.stderr)
+        sys.exit(1)
+    for fallo in resumen["fallos"]:
+        print(f"  FALLO {fallo['archivo']}: {fallo['error']}")
+    print(f"Importadas {resumen['importadas']}/{resumen['total']} en {resumen['duracion_s']} s")
+    if args.guardar_indice:
+        snapshot = save_index_snapshot()
+        print(f"Índice guardado en {snapshot['path']} (versión {snapshot['version']}): "
+              f"POST /api/indice/recargar para cargarlo en el servidor")
+
+
+if __name__ == "__main__":
+    main()
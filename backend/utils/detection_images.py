@@ -1,50 +1,79 @@
 import os
 import cv2
-from typing import List, Dict
+import time
+import uuid
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple
 import numpy as np
-import face_recognition
 
-from config import IMAGENES_DETECTADAS, get_models, read_image_safe
+from config import (
+    IMAGENES_DETECTADAS, MATCH_THRESHOLD, MATCH_TOP_K, YOLO_BATCH_SIZE, FACE_DETECTION, IMAGENES_POR_TANDA, get_models,
+    get_encoding_service, read_image_safe
+)
 from models.individuo import Individuo
-from mongo.mongo_individuos import get_individuo_by_id, buscar_individuo_por_cara  # funciones planas
+from mongo.mongo_individuos import get_individuos_cached  # funciones planas
+from utils.frame_analysis import yolo_objects, detect_objects_batch
+from utils.image_ingest import decode_rgb, upload_buffer, write_rgb
 
-def detect_faces_in_image(image: np.ndarray):
+
+def match_details(candidates: Sequence[Tuple[str, float]]) -> Dict:
     """
-    Detecta caras en la imagen y retorna la imagen anotada y lista de dicts con info de cada cara.
-    Cada dict contiene:
-        - name: nombre del individuo detectado (o "Desconocido")
-        - location: tuple (top, right, bottom, left)
+    Datos de la búsqueda de una cara para la respuesta, a partir de sus
+    candidatos [(id, distancia)] ordenados (FaceIndex.match_topk):
+      - distancia: al individuo más cercano (haya superado el umbral o no)
+      - margen: distancia al segundo individuo menos la del primero
+      - ratio: distancia al primero / distancia al segundo (cerca de 1 = dudoso)
+      - candidatos: [{id, distancia}]
     """
-    kdtree, reference_names, _ = get_models()
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    d1 = candidates[0][1] if candidates else None
+    d2 = candidates[1][1] if len(candidates) > 1 else None
+    return {
+        "distancia": round(d1, 4) if d1 is not None else None,
+        "margen": round(d2 - d1, 4) if d2 is not None else None,
+        "ratio": round(d1 / d2, 4) if d2 else None,
+        "candidatos": [{"id": i, "distancia": round(d, 4)} for i, d in candidates],
+    }
 
-    face_locations = face_recognition.face_locations(rgb)
-    print("FACE_LOC: ", face_locations)
-    face_encodings = face_recognition.face_encodings(rgb, face_locations)
-    print("FACE_ENC: ", face_encodings)
 
-    faces: List[Dict] = []
+def match_faces(
+    face_encodings,
+    threshold: float = MATCH_THRESHOLD,
+    top_k: int = MATCH_TOP_K,
+) -> Tuple[List[Optional[str]], Dict[str, Individuo], List[Dict]]:
+    """
+    Busca todas las caras en el índice con una única consulta y recupera
+    los individuos encontrados (caché de individuos y, para los que falten,
+    un único $in a Mongo).
+    Devuelve (id de individuo o None por cara, dict id -> Individuo,
+    match_details por cara con los ``top_k`` individuos más cercanos).
+    """
+    if len(face_encodings) == 0:
+        return [], {}, []
+    face_index, _, _ = get_models()
+    _, individuo_ids, candidates = face_index.match_topk(np.asarray(face_encodings), top_k, threshold)
+    individuos = get_individuos_cached(individuo_ids)
+    return individuo_ids, individuos, [match_details(c) for c in candidates]
 
-    for loc, enc in zip(face_locations, face_encodings):
-        distances, indexes = kdtree.query([enc], k=1)
-        if distances[0][0] < 0.6:
-            nombre_imagen = reference_names[indexes[0][0]]
-            individuo_id = nombre_imagen.split("___")[0]
-        else:
-            nombre_imagen = "Desconocido"
-            individuo_id = None
-
-        if individuo_id:
-            print("IND_ID: ", individuo_id)
-            individuo = get_individuo_by_id(individuo_id)
-            if individuo:
-                name = f"{individuo.nombre}_{individuo.apellido1}"
-            else:
-                name = "Desconocido"
+
+def annotate_faces(
+    image: np.ndarray,
+    face_locations: Sequence[Tuple[int, int, int, int]],
+    individuo_ids: Sequence[Optional[str]],
+    individuos: Dict[str, Individuo],
+    details: Optional[Sequence[Dict]] = None,
+) -> List[Dict]:
+    """
+    Dibuja las caras sobre la imagen y devuelve la lista de dicts {id, location}
+    (más los datos de match_details de cada cara si se pasan en ``details``).
+    """
+    faces: List[Dict] = []
+    for i, (loc, individuo_id) in enumerate(zip(face_locations, individuo_ids)):
+        individuo = individuos.get(individuo_id) if individuo_id else None
+        if individuo:
+            name = f"{individuo.nombre}_{individuo.apellido1}"
         else:
             name = "Desconocido"
 
-        faces.append({"id": individuo_id, "location": loc})
+        faces.append({"id": individuo_id, "location": loc, **(details[i] if details else {})})
 
         top, right, bottom, left = loc
         cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
@@ -57,40 +86,80 @@ def detect_faces_in_image(image: np.ndarray):
             (0, 255, 0),
             2,
         )
+    return faces
+
+
+def annotate_objects(image: np.ndarray, objects: List[Dict], color=(255, 0, 0)) -> np.ndarray:
+    """
+    Dibuja los objetos detectados por YOLO ({label, bbox}) sobre la imagen.
+    ``color`` está en el orden de canales de la imagen (BGR por defecto).
+    """
+    for obj in objects:
+        x1, y1, x2, y2 = obj["bbox"]
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(
+            image,
+            obj["label"],
+            (x1, y1 - 10),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            color,
+            2,
+        )
+    return image
+
+
+def detect_faces_in_image(image: np.ndarray, threshold: float = MATCH_THRESHOLD, top_k: int = MATCH_TOP_K):
+    """
+    Detecta caras en la imagen y retorna la imagen anotada y lista de dicts con info de cada cara.
+    Cada dict contiene:
+        - id: id del individuo detectado (o None si es desconocido, con el umbral ``threshold``)
+        - location: tuple (top, right, bottom, left)
+        - distancia, margen, ratio y candidatos: los ``top_k`` individuos más
+          cercanos (ver match_details)
+
+    Todas las caras del frame se buscan en el índice con una única consulta
+    y los individuos se recuperan de Mongo con un único $in.
+    Las caras se localizan a la escala de FACE_DETECTION y se codifican a
+    resolución completa, en el pool de procesos del servicio de encodings.
+    """
+    get_models()
+    return _detect_faces(image, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), threshold, top_k)
+
 
+def detect_faces_in_rgb(rgb: np.ndarray, threshold: float = MATCH_THRESHOLD, top_k: int = MATCH_TOP_K):
+    """
+    Como detect_faces_in_image pero para un array RGB (p. ej. de
+    image_ingest.decode_rgb): no hace ninguna copia y anota sobre el propio array.
+    """
+    get_models()
+    return _detect_faces(rgb, rgb, threshold, top_k)
+
+
+def _detect_faces(image: np.ndarray, rgb: np.ndarray, threshold: float, top_k: int):
+    face_locations, face_encodings = get_encoding_service().encode_image(rgb, detection=FACE_DETECTION)
+
+    if not face_locations:
+        return image, []
+
+    individuo_ids, individuos, details = match_faces(face_encodings, threshold, top_k)
+    faces = annotate_faces(image, face_locations, individuo_ids, individuos, details)
     return image, faces
 
 
-def detect_objects_with_yolo(image: np.ndarray, image_name: str = "image"):
+def detect_objects_with_yolo(image: np.ndarray, image_name: str = "image", rgb: bool = False):
     """
     Detecta objetos usando YOLO (si está cargado).
     Devuelve la imagen anotada y lista de objetos con bbox.
+    Con ``rgb=True`` la imagen está en RGB: YOLO (que espera BGR) recibe una
+    vista con los canales invertidos, sin copiar la imagen.
     """
     _, _, yolo_model = get_models()
-    objects: List[Dict] = []
     if yolo_model is None:
-        return image, objects
-
-    results = yolo_model(image)
-
-    for result in results:
-        for box, cls in zip(result.boxes.xyxy, result.boxes.cls):
-            x1, y1, x2, y2 = map(int, box)
-            label = yolo_model.names[int(cls)]
-
-            objects.append({"label": label, "bbox": [x1, y1, x2, y2]})
-
-            cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
-            cv2.putText(
-                image,
-                label,
-                (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                (255, 0, 0),
-                2,
-            )
+        return image, []
 
+    objects = yolo_objects(yolo_model(image[:, :, ::-1] if rgb else image), yolo_model.names)
+    annotate_objects(image, objects, color=(0, 0, 255) if rgb else (255, 0, 0))
     return image, objects
 
 
@@ -101,3 +170,127 @@ def _save_detected_image(image: np.ndarray, original_filename: str) -> str:
     save_path = os.path.join(IMAGENES_DETECTADAS, original_filename)
     cv2.imwrite(save_path, image)
     return save_path
+
+
+# --------------------------
+# Varias imágenes (/detectar_imagenes)
+# --------------------------
+def _decode_and_submit(tanda: List[Tuple[str, Callable[[], IO]]], service) -> List[Dict]:
+    """
+    Decodifica cada imagen de la tanda y la envía al pool de encodings (sin esperar).
+    """
+    pendientes = []
+    for nombre, abrir in tanda:
+        item = {"archivo": nombre}
+        try:
+            with upload_buffer(abrir()) as buf:
+                item["rgb"] = decode_rgb(buf)
+            item["future"] = service.submit_image(item["rgb"], detection=FACE_DETECTION)
+        except Exception as e:
+            item["error"] = f"No se pudo leer la imagen: {e}"
+        pendientes.append(item)
+    return pendientes
+
+
+def _resolve_tanda(pendientes: List[Dict], yolo_model, threshold: float, top_k: int) -> Iterator[Dict]:
+    """
+    YOLO por lotes de YOLO_BATCH_SIZE imágenes mientras el pool termina los
+    encodings; después todas las caras de la tanda en una única búsqueda.
+    """
+    validos = [p for p in pendientes if "rgb" in p]
+    for start in range(0, len(validos), YOLO_BATCH_SIZE):
+        lote = validos[start: start + YOLO_BATCH_SIZE]
+        # YOLO espera BGR: vistas con los canales invertidos, sin copiar
+        objetos = detect_objects_batch([p["rgb"][:, :, ::-1] for p in lote], yolo_model)
+        for p, objs in zip(lote, objetos):
+            p["objetos"] = objs
+
+    encodings = []
+    for p in validos:
+        try:
+            p["locations"], encs = p.pop("future").result()
+            p["n_caras"] = len(encs)
+            encodings.extend(encs)
+        except Exception as e:
+            p["error"] = f"Error calculando encodings: {e}"
+            p.pop("rgb")
+
+    individuo_ids, individuos, details = match_faces(np.asarray(encodings).reshape(-1, 128), threshold, top_k)
+    inicio = 0
+    for p in pendientes:
+        if "rgb" not in p:
+            yield {"archivo": p["archivo"], "error": p["error"]}
+            continue
+        ids = individuo_ids[inicio: inicio + p["n_caras"]]
+        detalles = details[inicio: inicio + p["n_caras"]]
+        inicio += p["n_caras"]
+
+        rgb = p.pop("rgb")
+        faces = annotate_faces(rgb, p["locations"], ids, individuos, detalles)
+        annotate_objects(rgb, p["objetos"], color=(0, 0, 255))
+        save_path = os.path.join(IMAGENES_DETECTADAS, f"annotated_{uuid.uuid4().hex}_{os.path.basename(p['archivo'])}")
+        write_rgb(save_path, rgb)
+
+        detectados = []
+        for individuo_id in dict.fromkeys(f["id"] for f in faces if f["id"]):
+            if individuo_id in individuos:
+                detectados.append(individuos[individuo_id].to_dict())
+        yield {
+            "archivo": p["archivo"],
+            "imagen_deteccion": save_path.replace("\\", "/"),
+            "individuos_detectados": detectados,
+            "caras": faces,
+            "objetos": [{"label": o["label"]} for o in p["objetos"]],
+        }
+
+
+def detect_images_stream(
+    imagenes: Iterable[Tuple[str, Callable[[], IO]]],
+    por_tanda: int = IMAGENES_POR_TANDA,
+    threshold: float = MATCH_THRESHOLD,
+    top_k: int = MATCH_TOP_K,
+) -> Iterator[Dict]:
+    """
+    Detección sobre muchas imágenes, devolviendo un resultado por imagen en
+    cuanto su tanda está resuelta (para emitir NDJSON según se completa).
+
+    ``imagenes`` son pares (nombre, abrir) donde ``abrir()`` devuelve un
+    stream con los bytes de la imagen. Se procesan por tandas de ``por_tanda``:
+    los encodings de cada tanda se reparten en el pool de procesos y, mientras,
+    se decodifica y envía la siguiente; por tanda, YOLO va en lotes de
+    YOLO_BATCH_SIZE imágenes y hay una única búsqueda en el índice para
+    todas sus caras. Como mucho hay dos tandas decodificadas en memoria.
+    Cada resultado lleva ``indice`` y ``caras`` (id, location y los ``top_k``
+    candidatos de cada cara, con el umbral ``threshold``); el último elemento
+    es {"resumen": {...}}.
+    """
+    _, _, yolo_model = get_models()
+    service = get_encoding_service()
+    t0 = time.perf_counter()
+    it = iter(imagenes)
+
+    def _siguiente():
+        tanda = []
+        for item in it:
+            tanda.append(item)
+            if len(tanda) >= por_tanda:
+                break
+        return _decode_and_submit(tanda, service) if tanda else None
+
+    os.makedirs(IMAGENES_DETECTADAS, exist_ok=True)
+    indice = total = fallidas = 0
+    actual = _siguiente()
+    while actual:
+        siguiente = _siguiente()
+        for resultado in _resolve_tanda(actual, yolo_model, threshold, top_k):
+            total += 1
+            fallidas += "error" in resultado
+            yield {"indice": indice, **resultado}
+            indice += 1
+        actual = siguiente
+
+    yield {"resumen": {
+        "imagenes": total,
+        "fallidas": fallidas,
+        "duracion_ms": round(1000 * (time.perf_counter() - t0), 1),
+    }}
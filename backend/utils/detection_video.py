@@ -1,44 +1,249 @@
+import time
 import cv2
-from config import FRAME_SKIP
-from utils.detection_images import detect_faces_in_image, detect_objects_with_yolo, _save_detected_image
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from config import (
+    FRAME_SKIP, VIDEO_WORKERS, VIDEO_QUEUE_SIZE, VIDEO_PROGRESS_EVERY, YOLO_MODEL_PATH, YOLO_BATCH_SIZE, YOLO_BATCH_MAX_WAIT,
+    MOTION_GATING, MOTION_THRESHOLD, MOTION_MIN_STEP, MOTION_MAX_STEP, MOTION_MAX_GAP,
+    FACE_TRACKING, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSING, TRACK_REVERIFY_EVERY, TRACK_LOW_CONFIDENCE,
+    MATCH_THRESHOLD, MATCH_TOP_K, FACE_DETECTION, get_models, get_encoding_service
+)
+from models.individuo import Individuo
+from mongo.mongo_individuos import get_individuos_cached
+from utils.detection_images import match_details, match_faces, annotate_faces, annotate_objects, _save_detected_image
+from utils.face_tracker import FaceTracker
+from utils.motion_gate import MotionGate
+from utils.video_pipeline import iter_analyzed_frames
 
-def process_video_from_path(video_path: str, live: bool = False):
-    cap = cv2.VideoCapture(video_path)
+
+def _video_result(
+    saved_frames: Dict[str, str],
+    saved_objects: set,
+    info: Optional[Dict] = None,
+    tracker: Optional[FaceTracker] = None,
+    saved_details: Optional[Dict[str, Dict]] = None,
+) -> Dict:
+    info = info or {}
+    saved_details = saved_details or {}
+    result = {
+        "frames_deteccion": [
+            {"individuo": k, "frame_path": v.replace("\\", "/"), **saved_details.get(k, {})}
+            for k, v in saved_frames.items()
+        ],
+        "objetos": sorted(list(saved_objects)),
+        "muestreo": {
+            "modo": "movimiento" if MOTION_GATING else "fijo",
+            "frames_leidos": info.get("frames_leidos"),
+            "frames_revisados": info.get("frames_revisados"),
+            "frames_analizados": info.get("frames_analizados"),
+            "frames_saltados": info.get("frames_saltados"),
+        },
+    }
+    if tracker is not None:
+        result["tracks"] = [t for t in tracker.summary(info.get("fps") or 0.0) if t["individuo"]]
+        result["seguimiento"] = tracker.stats()
+    return result
+
+
+def _motion_gate() -> Optional[MotionGate]:
+    if not MOTION_GATING:
+        return None
+    return MotionGate(
+        threshold=MOTION_THRESHOLD,
+        min_step=MOTION_MIN_STEP,
+        max_step=MOTION_MAX_STEP,
+        max_gap=MOTION_MAX_GAP,
+    )
+
+
+def _face_tracker() -> Optional[FaceTracker]:
+    if not FACE_TRACKING:
+        return None
+    return FaceTracker(
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_missing=TRACK_MAX_MISSING,
+        reverify_every=TRACK_REVERIFY_EVERY,
+        low_confidence=TRACK_LOW_CONFIDENCE,
+    )
+
+
+def _match_tracked_faces(
+    tracker: FaceTracker,
+    frame_idx: int,
+    frame,
+    locations,
+    individuos: Dict[str, Individuo],
+    threshold: float = MATCH_THRESHOLD,
+    top_k: int = MATCH_TOP_K,
+) -> Tuple[List[Optional[str]], Dict[str, Individuo], List[Dict]]:
+    """
+    Asocia las caras a sus tracks y sólo codifica/busca las que el tracker
+    pide verificar (en el pool de encodings, como el resto de rutas); las
+    demás heredan el individuo (y los candidatos) de su track.
+    ``individuos`` hace de caché de Mongo durante todo el video.
+    """
+    tracks, to_encode = tracker.update(frame_idx, locations)
+    if to_encode:
+        face_index, _, _ = get_models()
+        _, encodings = get_encoding_service().encode_image(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), [locations[i] for i in to_encode]
+        )
+        dist, ids, candidates = face_index.match_topk(encodings, top_k, threshold)
+        for i, d, individuo_id, cands in zip(to_encode, dist, ids, candidates):
+            tracks[i].set_identity(individuo_id, float(d), frame_idx, match_details(cands))
+
+    individuo_ids = [t.individuo for t in tracks]
+    nuevos = {i for i in individuo_ids if i and i not in individuos}
+    if nuevos:
+        individuos.update(get_individuos_cached(list(nuevos)))
+    return individuo_ids, individuos, [t.details for t in tracks]
+
+
+def iter_video_events(
+    video_path: str,
+    live: bool = False,
+    workers: int = VIDEO_WORKERS,
+    progress_cb: Optional[Callable[[Dict, Dict], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    progress_every: Optional[float] = VIDEO_PROGRESS_EVERY,
+    threshold: float = MATCH_THRESHOLD,
+    top_k: int = MATCH_TOP_K,
+) -> Iterator[Dict]:
+    """
+    Analiza un video (como process_video_from_path) y va emitiendo eventos
+    según ocurren, para devolverlos en streaming (NDJSON/SSE):
+      - {"tipo": "individuo", "individuo", "frame", "segundo", "frame_path",
+        "distancia", "margen", "ratio", "candidatos"}: la primera vez que
+        aparece cada individuo conocido (con el umbral ``threshold``), con los
+        ``top_k`` candidatos de esa cara.
+      - {"tipo": "objetos", "frame", "segundo", "nuevos", "objetos"}: cuando
+        aparecen etiquetas de YOLO nuevas (``objetos`` = todas hasta ahora).
+      - {"tipo": "progreso", ...}: cada ``progress_every`` segundos (None = nunca).
+      - {"tipo": "fin", "resultado"}: al terminar, el mismo resultado que
+        process_video_from_path.
+    Si se deja de consumir (p. ej. el cliente se desconecta) el pipeline se cierra.
+    """
+    _, _, yolo_model = get_models()
     saved_frames = {}  # Guarda un frame por individuo detectado
+    saved_details = {}  # Candidatos de la cara de ese frame
     saved_objects = set()
-    frame_count = 0
+    info: Dict = {}
+    t0 = time.monotonic()
+    ultimo_progreso = None
+    frames_procesados = 0
+    tracker = _face_tracker()
+    individuos_cache: Dict[str, Individuo] = {}
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    frames = iter_analyzed_frames(
+        video_path,
+        frame_skip=FRAME_SKIP,
+        workers=workers,
+        queue_size=VIDEO_QUEUE_SIZE,
+        batch_size=YOLO_BATCH_SIZE,
+        batch_max_wait=YOLO_BATCH_MAX_WAIT,
+        yolo_model=yolo_model,
+        yolo_model_path=YOLO_MODEL_PATH if yolo_model is not None else None,
+        info=info,
+        motion_gate=_motion_gate(),
+        with_encodings=tracker is None,
+        detection=FACE_DETECTION,
+    )
 
-        if frame_count % FRAME_SKIP == 0:
-            frame_annotated, faces = detect_faces_in_image(frame.copy())
-            frame_annotated, objects = detect_objects_with_yolo(frame_annotated, f"frame_{frame_count}")
+    try:
+        for frame_count, frame, analysis in frames:
+            if tracker is None:
+                individuo_ids, individuos, details = match_faces(analysis["encodings"], threshold, top_k)
+            else:
+                individuo_ids, individuos, details = _match_tracked_faces(
+                    tracker, frame_count, frame, analysis["locations"], individuos_cache, threshold, top_k
+                )
+            faces = annotate_faces(frame, analysis["locations"], individuo_ids, individuos, details)
+            frame_annotated = annotate_objects(frame, analysis["objects"])
+            frames_procesados += 1
+            fps_video = info.get("fps") or 0.0
+            segundo = round(frame_count / fps_video, 2) if fps_video else None
 
             # Registrar objetos detectados
-            for obj in objects:
-                saved_objects.add(obj["label"])
+            nuevos = sorted({obj["label"] for obj in analysis["objects"]} - saved_objects)
+            if nuevos:
+                saved_objects.update(nuevos)
+                yield {"tipo": "objetos", "frame": frame_count, "segundo": segundo,
+                       "nuevos": nuevos, "objetos": sorted(saved_objects)}
 
             # Guardar un único frame por individuo conocido
-            for f in faces:
+            for f, detalle in zip(faces, details):
                 ind_id = f.get("id")
                 if ind_id and ind_id != "Desconocido" and ind_id not in saved_frames:
                     path = _save_detected_image(frame_annotated, f"{ind_id}_frame_{frame_count}.jpg")
                     saved_frames[ind_id] = path
+                    saved_details[ind_id] = detalle
+                    yield {"tipo": "individuo", "individuo": ind_id, "frame": frame_count,
+                           "segundo": segundo, "frame_path": path.replace("\\", "/"), **detalle}
+
+            ahora = time.monotonic()
+            elapsed = max(ahora - t0, 1e-6)
+            total = info.get("total_frames", 0)
+            fps = (frame_count + 1) / elapsed  # frames de video recorridos por segundo
+            progreso = {
+                "frames_procesados": frames_procesados,
+                "frame_actual": frame_count,
+                "frames_totales": total,
+                "fps": round(fps, 2),
+                "eta_s": round(max(total - frame_count - 1, 0) / fps, 1) if total else None,
+            }
+            if progress_cb is not None:
+                progress_cb(progreso, _video_result(saved_frames, saved_objects, saved_details=saved_details))
+            if progress_every is not None and (ultimo_progreso is None or ahora - ultimo_progreso >= progress_every):
+                ultimo_progreso = ahora
+                yield {"tipo": "progreso", **progreso}
+
+            if should_stop is not None and should_stop():
+                break
 
             if live:
                 cv2.imshow("Video Detection", frame_annotated)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     break
+    finally:
+        frames.close()
+        if live:
+            cv2.destroyAllWindows()
 
-        frame_count += 1
+    yield {"tipo": "fin", "resultado": _video_result(saved_frames, saved_objects, info, tracker, saved_details)}
 
-    cap.release()
-    cv2.destroyAllWindows()
 
-    return {
-        "frames_deteccion": [{"individuo": k, "frame_path": v.replace("\\", "/")} for k, v in saved_frames.items()],
-        "objetos": sorted(list(saved_objects))
-    }
+def process_video_from_path(
+    video_path: str,
+    live: bool = False,
+    workers: int = VIDEO_WORKERS,
+    progress_cb: Optional[Callable[[Dict, Dict], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    threshold: float = MATCH_THRESHOLD,
+    top_k: int = MATCH_TOP_K,
+):
+    """
+    Analiza un video con el pipeline por etapas (ver utils.video_pipeline):
+    decodificación en un hilo, caras + YOLO por lotes en un pool de procesos y
+    emparejamiento/anotación en orden en este hilo.
+
+    ``progress_cb(progreso, parcial)`` se llama tras cada frame analizado con
+    frames procesados, fps y ETA, y el resultado parcial hasta ese momento.
+    Si ``should_stop()`` devuelve True se deja de procesar.
+
+    ``threshold`` es el umbral de coincidencia y ``top_k`` el nº de individuos
+    candidatos por cara: cada entrada de "frames_deteccion" lleva la
+    distancia, margen, ratio y candidatos de la cara de ese frame.
+
+    Con MOTION_GATING los frames sin cambios respecto al último analizado no
+    pasan por caras ni YOLO; el resultado incluye en "muestreo" cuántos frames
+    se leyeron, revisaron, analizaron y saltaron.
+
+    Con FACE_TRACKING cada cara se asocia a un track y sólo se codifica al
+    empezar el track o al re-verificarlo (ver utils.face_tracker); el resultado
+    incluye "tracks" con el tramo de frames/segundos de cada track por individuo.
+
+    Para recibir los resultados según aparecen, ver iter_video_events.
+    """
+    for evento in iter_video_events(video_path, live, workers, progress_cb, should_stop, progress_every=None,
+                                    threshold=threshold, top_k=top_k):
+        if evento["tipo"] == "fin":
+            return evento["resultado"]
@@ -0,0 +1,249 @@
+# encoding_cache.py
+# --------------------------
+# Caché persistente en disco de los encodings de referencia
+# --------------------------
+#
+# Guarda una matriz ``encodings.npy`` (mapeable en memoria) y un sidecar
+# ``encodings.json`` con una entrada por fichero de imagenes/referencia.
+# Cada entrada se identifica por nombre de fichero + mtime + tamaño + sha1,
+# de forma que al arrancar sólo se vuelven a codificar las imágenes nuevas
+# o modificadas y se descartan las que ya no existen.
+
+import os
+import json
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png")
+ENCODING_DIM = 128
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash sha1 del contenido de un fichero (se lee por bloques).
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write_json(path: str, data: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path: str, matrix: np.ndarray):
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, matrix)
+    os.replace(tmp, path)
+
+
+def _encode_or_error(encode_fn: Callable[[str], Optional[np.ndarray]], path: str):
+    try:
+        return encode_fn(path)
+    except Exception as e:
+        return e
+
+
+class EncodingCache:
+    """
+    Almacén persistente de encodings.
+
+    - ``encodings.npy``: matriz (N, 128) float64, se abre con mmap_mode="r".
+    - ``encodings.json``: lista de entradas {file, name, mtime_ns, size, sha1, row}.
+      ``row`` es None para imágenes que no contienen exactamente una cara,
+      así tampoco se reintentan en cada arranque. Las que fallan al codificarse
+      (error de lectura, del pool...) no se guardan y se reintentan.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.matrix_path = os.path.join(cache_dir, "encodings.npy")
+        self.index_path = os.path.join(cache_dir, "encodings.json")
+
+    # --------------------------
+    # Lectura
+    # --------------------------
+    def load(self) -> Tuple[Optional[np.ndarray], Dict[str, Dict]]:
+        """
+        Devuelve (matriz mmap o None, entradas por nombre de fichero).
+        Si la caché está corrupta o es de otra versión se ignora entera.
+        """
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.index_path)):
+            return None, {}
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION:
+                return None, {}
+
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+            entries = {e["file"]: e for e in data.get("entries", [])}
+
+            n_rows = matrix.shape[0] if matrix.ndim == 2 else 0
+            for e in entries.values():
+                row = e.get("row")
+                if row is not None and not (0 <= row < n_rows):
+                    raise ValueError(f"Fila {row} fuera de rango en la caché")
+            return matrix, entries
+        except Exception as e:
+            logger.warning(f"[WARN] Caché de encodings inválida, se regenera: {e}")
+            return None, {}
+
+    # --------------------------
+    # Escritura
+    # --------------------------
+    def save(self, matrix: np.ndarray, entries: List[Dict]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Primero la matriz y luego el índice: si se corta entre medias,
+        # load() detecta filas fuera de rango y regenera.
+        _atomic_save_npy(self.matrix_path, matrix)
+        _atomic_write_json(self.index_path, {"version": CACHE_VERSION, "entries": entries})
+
+    def add(self, filepaths: Sequence[str], encodings: np.ndarray):
+        """
+        Añade a la caché imágenes ya codificadas (importación masiva), así el
+        siguiente arranque no las vuelve a codificar. Se reescribe la matriz una vez.
+        """
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIM)
+        old_matrix, old_entries = self.load()
+        files = {os.path.basename(p) for p in filepaths}
+        entries = [e for f, e in old_entries.items() if f not in files]
+        base = old_matrix.shape[0] if old_matrix is not None else 0
+
+        for i, filepath in enumerate(filepaths):
+            st = os.stat(filepath)
+            filename = os.path.basename(filepath)
+            entries.append({
+                "file": filename,
+                "name": os.path.splitext(filename)[0],
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                "sha1": file_sha1(filepath),
+                "row": base + i,
+            })
+
+        matrix = encodings if old_matrix is None else np.vstack([np.asarray(old_matrix), encodings])
+        # Soltar el mmap antes de reemplazar el fichero (en Windows no se puede con el mmap abierto)
+        del old_matrix
+        self.save(matrix, entries)
+
+    # --------------------------
+    # Sincronizar con la carpeta de referencias
+    # --------------------------
+    def sync(
+        self,
+        image_dir: str,
+        encode_fn: Callable[[str], Optional[np.ndarray]],
+        encode_many: Optional[Callable[[List[str]], List[Optional[np.ndarray]]]] = None,
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+        Sincroniza la caché con ``image_dir`` y devuelve (encodings, nombres).
+
+        ``encode_fn(path)`` devuelve el encoding de la imagen o None si no es válida
+        (no contiene exactamente una cara; se guarda así en la caché) y lanza una
+        excepción si no se pudo codificar (no se guarda: se reintenta en el
+        siguiente arranque). Sólo se llama para ficheros nuevos o cuyo contenido
+        ha cambiado. Si se da ``encode_many(paths)`` se le pasan todos esos
+        ficheros de una vez (p. ej. para codificarlos en paralelo) en lugar de
+        llamar a ``encode_fn``; en su lista, un fallo se indica con la excepción.
+        """
+        old_matrix, old_entries = self.load()
+
+        filenames = sorted(
+            f for f in os.listdir(image_dir) if f.lower().endswith(EXTENSIONES_IMAGEN)
+        )
+
+        # (entrada, fila antigua reutilizada, posición en pending)
+        plan: List[Tuple[Dict, Optional[int], Optional[int]]] = []
+        pending: List[str] = []
+        changed = set(old_entries) != set(filenames)
+
+        for filename in filenames:
+            filepath = os.path.join(image_dir, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+
+            old = old_entries.get(filename)
+            entry = {
+                "file": filename,
+                "name": os.path.splitext(filename)[0],
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                "sha1": old.get("sha1") if old else None,
+                "row": None,
+            }
+
+            reuse = False
+            if old is not None and old_matrix is not None:
+                if old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+                    reuse = True
+                else:
+                    # mtime distinto: sólo recodificar si el contenido cambió
+                    entry["sha1"] = file_sha1(filepath)
+                    reuse = entry["sha1"] == old.get("sha1")
+                    changed = True
+
+            if reuse:
+                plan.append((entry, old["row"], None))
+                continue
+
+            changed = True
+            if entry["sha1"] is None:
+                entry["sha1"] = file_sha1(filepath)
+            plan.append((entry, None, len(pending)))
+            pending.append(filepath)
+
+        if encode_many is not None:
+            new_encodings = encode_many(pending) if pending else []
+        else:
+            new_encodings = [_encode_or_error(encode_fn, path) for path in pending]
+        n_encoded = len(pending)
+        n_failed = 0
+
+        entries: List[Dict] = []
+        rows: List = []  # int = fila reutilizada de la matriz antigua, ndarray = encoding nuevo
+        for entry, old_row, new_pos in plan:
+            source = old_row if new_pos is None else new_encodings[new_pos]
+            if isinstance(source, Exception):
+                logger.warning(f"[WARN] Error al generar encodings de {entry['file']}: {source}")
+                n_failed += 1
+                continue
+            if source is not None:
+                entry["row"] = len(rows)
+                rows.append(source if new_pos is None else np.asarray(source, dtype=np.float64))
+            entries.append(entry)
+
+        names = [e["name"] for e in entries if e["row"] is not None]
+
+        if not changed and old_matrix is not None:
+            # Nada nuevo: se devuelve directamente la matriz mapeada
+            logger.info(f"[OK] Caché de encodings al día ({len(names)} referencias)")
+            return old_matrix, names
+
+        matrix = np.empty((len(rows), ENCODING_DIM), dtype=np.float64)
+        for i, r in enumerate(rows):
+            matrix[i] = old_matrix[r] if isinstance(r, int) else r
+
+        # Soltar el mmap antes de reemplazar el fichero (en Windows no se puede con el mmap abierto)
+        del old_matrix
+        self.save(matrix, entries)
+        logger.info(
+            f"[OK] Caché de encodings actualizada: {len(names)} referencias, "
+            f"{n_encoded - n_failed} codificadas, {n_failed} con error (se reintentan), "
+            f"{len(old_entries) - len(set(old_entries) & set(filenames))} eliminadas"
+        )
+        return matrix, names
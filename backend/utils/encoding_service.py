@@ -0,0 +1,164 @@
+# encoding_service.py
+# --------------------------
+# Servicio de encodings faciales en un pool de procesos
+# --------------------------
+#
+# face_recognition (dlib) es CPU y, ejecutado en los hilos de Flask, serializa
+# las peticiones concurrentes. Este servicio reparte la localización y
+# codificación de caras entre procesos worker que cargan los modelos de dlib
+# una sola vez (al importar face_recognition).
+#
+# - Imágenes en memoria: se copian una vez a un bloque de memoria compartida
+#   y el worker las lee sin copiarlas (no se serializan con pickle).
+# - Ficheros: se pasa sólo la ruta y el worker lee la imagen.
+#
+# Con ``workers=0`` todo se ejecuta en el hilo que llama (mismo código).
+# No importa config: los parámetros llegan desde config.get_encoding_service.
+
+import logging
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.frame_analysis import detection_scale, encode_faces, locate_faces
+
+logger = logging.getLogger(__name__)
+
+EncodeResult = Tuple[List[tuple], np.ndarray]  # (locations, encodings (n, 128))
+
+
+# --------------------------
+# Lado del worker
+# --------------------------
+def _init_encoder():
+    # El paralelismo lo da el pool: un hilo por proceso
+    cv2.setNumThreads(1)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # El bloque lo crea y lo libera el proceso principal: que el worker no lo registre
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _encode_rgb(rgb: np.ndarray, locations: Optional[Sequence[tuple]], detection: Optional[Dict]) -> EncodeResult:
+    if locations is None:
+        scale = detection_scale(*rgb.shape[:2], **detection) if detection else 1.0
+        locations = locate_faces(rgb, scale)
+    locations = [tuple(int(v) for v in loc) for loc in locations]
+    return locations, encode_faces(None, locations, rgb)
+
+
+def _encode_shared(
+    shm_name: str, shape: Tuple[int, ...], locations: Optional[Sequence[tuple]], detection: Optional[Dict]
+) -> EncodeResult:
+    shm = _attach(shm_name)
+    try:
+        rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        result = _encode_rgb(rgb, locations, detection)
+        del rgb
+        return result
+    finally:
+        shm.close()
+
+
+def _read_rgb(path: str) -> np.ndarray:
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"), dtype=np.uint8)
+
+
+def _encode_path(path: str, detection: Optional[Dict]) -> EncodeResult:
+    return _encode_rgb(_read_rgb(path), None, detection)
+
+
+# --------------------------
+# Lado del proceso principal
+# --------------------------
+def _run_inline(fn, *args) -> Future:
+    fut: Future = Future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+class EncodingService:
+    def __init__(self, workers: int = 0):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # spawn: no heredar hilos/sockets (Flask, Mongo) del proceso principal
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_encoder,
+                )
+                logger.info(f"[OK] Servicio de encodings con {self.workers} procesos")
+            return self._pool
+
+    def submit_image(
+        self,
+        rgb: np.ndarray,
+        locations: Optional[Sequence[tuple]] = None,
+        detection: Optional[Dict] = None,
+    ) -> Future:
+        """
+        Localiza (si no se dan ``locations``) y codifica las caras de una imagen RGB.
+        ``detection`` son los parámetros de frame_analysis.detection_scale.
+        """
+        pool = self._get_pool()
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        if pool is None:
+            return _run_inline(_encode_rgb, rgb, locations, detection)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(rgb.nbytes, 1))
+        try:
+            np.ndarray(rgb.shape, dtype=np.uint8, buffer=shm.buf)[...] = rgb
+            locations = [tuple(loc) for loc in locations] if locations is not None else None
+            fut = pool.submit(_encode_shared, shm.name, rgb.shape, locations, detection)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+
+        def _release(_):
+            shm.close()
+            shm.unlink()
+
+        fut.add_done_callback(_release)
+        return fut
+
+    def submit_path(self, path: str, detection: Optional[Dict] = None) -> Future:
+        """
+        Lee la imagen en el worker y localiza + codifica sus caras.
+        """
+        pool = self._get_pool()
+        if pool is None:
+            return _run_inline(_encode_path, path, detection)
+        return pool.submit(_encode_path, path, detection)
+
+    def encode_image(self, rgb, locations=None, detection=None) -> EncodeResult:
+        return self.submit_image(rgb, locations, detection).result()
+
+    def encode_path(self, path: str, detection: Optional[Dict] = None) -> EncodeResult:
+        return self.submit_path(path, detection).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,828 @@
+# face_index.py
+# --------------------------
+# Índice de caras con inserciones incrementales y borrado
+# --------------------------
+#
+# Los encodings viven en un buffer preasignado que crece por duplicación
+# (inserción O(1) amortizada). Las filas [0, tree_size) están indexadas en el
+# segmento principal (un backend de utils.matchers: brute, ivf o kdtree); las
+# filas nuevas [tree_size, size) forman un segmento "delta" que se consulta por
+# fuerza bruta. Cuando el delta supera ``merge_threshold`` se reconstruye el
+# segmento principal en un hilo en segundo plano y se sustituye al terminar.
+#
+# Los borrados marcan la fila en un bitmap de "vivas" (tombstone) y las
+# consultas ignoran las filas muertas. Al superar ``compact_threshold`` filas
+# muertas se compacta el índice: se reconstruye sin ellas y el buffer se
+# reduce, de modo que memoria y latencia no crecen con las altas/bajas.
+#
+# Además se mantiene incrementalmente una plantilla (centroide) por individuo.
+# Con ``two_stage=True`` la búsqueda primero compara contra las plantillas y
+# después re-ordena sólo con las fotos de los ``two_stage_candidates`` mejores.
+#
+# ``match`` devuelve el individuo más cercano; ``match_topk`` los k individuos
+# más cercanos (uno por individuo aunque tenga varias fotos) con sus
+# distancias, en la misma consulta por lotes.
+#
+# Lecturas: cada escritura (alta, baja, fusión, compactación, recarga) publica
+# una nueva versión inmutable (IndexSnapshot) sustituyendo una sola
+# referencia; las consultas toman esa referencia una vez y trabajan sólo con
+# ella, sin lock, así que nunca mezclan el árbol de una versión con los
+# nombres o etiquetas de otra. Es válido porque las filas [0, size) de un
+# snapshot no se modifican nunca: las altas escriben detrás de ``size``, las
+# bajas copian el bitmap de vivas y la compactación crea arrays nuevos.
+# Un snapshot se puede guardar en disco (``save``) y cargar en otra réplica
+# (``FaceIndex.load`` / ``reload``).
+#
+# Galería externa (``attach_rows``, ver utils/shared_gallery.py): las filas ya
+# están en un buffer ajeno (p. ej. un fichero mapeado compartido por varios
+# procesos) y el índice sólo guarda vivas, etiquetas y nombres. En este modo
+# el índice no se compacta solo (la numeración de filas es la del fichero):
+# la galería compacta el fichero y cada proceso vuelve a construir su índice
+# sobre el fichero nuevo (``empty_like`` + ``adopt``).
+#
+# Memoria: ``buffer_dtype="float32"`` guarda las filas a la mitad de tamaño y
+# los backends "float16"/"int8" (utils.matchers.QuantizedMatcher) guardan el
+# segmento principal cuantizado. Con ``rerank=k`` se piden k candidatos al
+# segmento principal y se recalculan sus distancias exactas con las filas del
+# buffer, así que la decisión con el umbral no depende de la cuantización.
+
+import os
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from utils.matchers import build_matcher
+
+logger = logging.getLogger(__name__)
+
+
+def individuo_id_from_name(name: str) -> str:
+    """
+    Los nombres de referencia tienen el formato <individuo_id>___<uuid>.
+    """
+    return name.split("___")[0]
+
+
+class IndexSnapshot:
+    """
+    Versión inmutable del índice: segmento principal, delta, vivas, etiquetas
+    y nombres de una misma versión. Se obtiene con ``FaceIndex.snapshot()``.
+    """
+
+    __slots__ = (
+        "version", "dim", "size", "n_dead", "tree", "tree_size", "n_dead_tree",
+        "buffer", "alive", "labels", "names", "individuo_keys", "rerank",
+    )
+
+    def __init__(self, version, dim, size, n_dead, tree, tree_size, n_dead_tree,
+                 buffer, alive, labels, names, individuo_keys, rerank=0):
+        self.version = version
+        self.rerank = rerank
+        self.dim = dim
+        self.size = size
+        self.n_dead = n_dead
+        self.tree = tree
+        self.tree_size = tree_size
+        self.n_dead_tree = n_dead_tree
+        # Vistas [0, size) de arrays cuyas filas ya escritas no cambian
+        self.buffer = buffer[:size]
+        self.alive = alive[:size]
+        self.labels = labels[:size]
+        # Listas sólo-añadir: las posiciones < size (o < nº de etiquetas) no cambian
+        self.names = names
+        self.individuo_keys = individuo_keys
+
+    def __len__(self) -> int:
+        return self.size - self.n_dead
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distancias, filas) de forma (m, k), como FaceIndex.query, en esta versión.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        tree, tree_size, size = self.tree, self.tree_size, self.size
+        alive = self.alive if self.n_dead else None
+        delta = self.buffer[tree_size:size]
+
+        m = len(X)
+        parts_d = []
+        parts_i = []
+
+        if tree is not None and tree_size > 0:
+            # Se piden k (o rerank) + muertas del árbol para que sobren candidatos tras filtrar
+            d, i = tree.query(X, k=min(max(k, self.rerank) + self.n_dead_tree, tree_size))
+            if self.rerank:
+                # Distancias exactas de los candidatos con las filas del buffer
+                diff = self.buffer[np.maximum(i, 0)] - X[:, None, :]
+                d = np.sqrt(np.einsum("mkd,mkd->mk", diff, diff))
+            # Los backends aproximados pueden devolver -1 si no hay suficientes candidatos
+            valid = i >= 0
+            if alive is not None:
+                valid &= alive[np.maximum(i, 0)]
+            d = np.where(valid, d, np.inf)
+            parts_d.append(d)
+            parts_i.append(i)
+
+        if len(delta) and m:
+            d2 = (
+                np.einsum("ij,ij->i", X, X)[:, None]
+                - 2.0 * X @ delta.T
+                + np.einsum("ij,ij->i", delta, delta)[None, :]
+            )
+            d = np.sqrt(np.maximum(d2, 0.0))
+            if alive is not None:
+                d[:, ~alive[tree_size:size]] = np.inf
+            kd = min(k, len(delta))
+            i = np.argpartition(d, kd - 1, axis=1)[:, :kd]
+            parts_d.append(np.take_along_axis(d, i, axis=1))
+            parts_i.append(i + tree_size)
+
+        if not parts_d:
+            return np.full((m, k), np.inf), np.full((m, k), -1, dtype=np.intp)
+
+        dist = np.hstack(parts_d)
+        ind = np.hstack(parts_i)
+        order = np.argsort(dist, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, order, axis=1)
+        ind = np.take_along_axis(ind, order, axis=1)
+
+        if dist.shape[1] < k:
+            pad = k - dist.shape[1]
+            dist = np.hstack([dist, np.full((m, pad), np.inf)])
+            ind = np.hstack([ind, np.full((m, pad), -1, dtype=ind.dtype)])
+        ind = np.where(np.isinf(dist), -1, ind)
+        return dist, ind
+
+    def query_individuos(self, X, k: int = 1, rows_per_individuo: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Los k individuos distintos más cercanos a cada cara (la distancia de
+        un individuo es la de su foto más cercana): (distancias, etiquetas) de
+        forma (m, k), con inf / -1 si hay menos de k individuos.
+        Se piden ``k * rows_per_individuo`` filas en una sola consulta; sólo
+        las caras a las que no les llegan (muchas fotos del mismo individuo
+        entre las primeras) se vuelven a consultar con el doble de filas.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        m = len(X)
+        dist = np.full((m, k), np.inf)
+        labels = np.full((m, k), -1, dtype=np.int64)
+        if m == 0 or len(self) == 0:
+            return dist, labels
+
+        pending = np.arange(m)
+        n_rows = min(1 if k == 1 else k * rows_per_individuo, self.size)
+        while len(pending):
+            d, ind = self.query(X[pending], n_rows)
+            row_labels = np.where(ind >= 0, self.labels[np.maximum(ind, 0)], -1)
+            retry = []
+            for q, d_row, l_row in zip(pending.tolist(), d.tolist(), row_labels.tolist()):
+                best: Dict[int, float] = {}
+                for dd, l in zip(d_row, l_row):
+                    if l < 0 or len(best) == k:
+                        break
+                    best.setdefault(l, dd)
+                # Faltan individuos pero quedaban filas sin pedir: otra vuelta
+                if len(best) < k and l_row[-1] >= 0 and n_rows < self.size:
+                    retry.append(q)
+                    continue
+                for j, (l, dd) in enumerate(best.items()):
+                    dist[q, j], labels[q, j] = dd, l
+            pending = np.asarray(retry, dtype=np.intp)
+            n_rows = min(2 * n_rows, self.size)
+        return dist, labels
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    def save(self, path: str):
+        """
+        Guarda las caras vivas de esta versión en un .npz (escritura atómica:
+        fichero temporal + rename, así otra réplica nunca lee uno a medias).
+        """
+        rows = self.live_rows()
+        names = np.array([self.names[r] for r in rows.tolist()], dtype=str)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez(f, encodings=self.buffer[rows], names=names, version=np.int64(self.version))
+        os.replace(tmp, path)
+
+
+class FaceIndex:
+    def __init__(
+        self,
+        dim: int = 128,
+        merge_threshold: int = 256,
+        compact_threshold: int = 64,
+        backend: str = "auto",
+        ivf_min: int = 200_000,
+        ivf_params: Optional[Dict] = None,
+        two_stage: bool = False,
+        two_stage_candidates: int = 5,
+        initial_capacity: int = 1024,
+        background_merge: bool = True,
+        rerank: int = 0,
+        buffer_dtype: str = "float64",
+    ):
+        self.dim = dim
+        self.merge_threshold = merge_threshold
+        self.compact_threshold = compact_threshold
+        self.backend = backend
+        self.ivf_min = ivf_min
+        self.ivf_params = ivf_params or {}
+        self.two_stage = two_stage
+        self.two_stage_candidates = two_stage_candidates
+        self.background_merge = background_merge
+        self.rerank = rerank
+        self.buffer_dtype = np.dtype(buffer_dtype)
+        self._initial_capacity = max(1, initial_capacity)
+
+        self._buffer = np.empty((self._initial_capacity, dim), dtype=self.buffer_dtype)
+        # True si _buffer es externo (attach_rows): no se escribe ni se compacta
+        self._external = False
+        self._alive = np.zeros(self._initial_capacity, dtype=bool)
+        # Etiqueta entera por fila -> individuo_keys[etiqueta] es el id del individuo
+        self._labels = np.full(self._initial_capacity, -1, dtype=np.int32)
+        self.individuo_keys: List[str] = []
+        self._label_of: Dict[str, int] = {}
+        # Plantillas por individuo: suma y nº de encodings vivos por etiqueta
+        self._tpl_sum = np.zeros((64, dim), dtype=np.float64)
+        self._tpl_count = np.zeros(64, dtype=np.int64)
+        self._tpl_cache = None
+        self._size = 0
+        self._n_dead = 0
+        self._n_dead_tree = 0  # muertas dentro de [0, tree_size)
+        self.names: List[str] = []
+        self._rows_by_name: Dict[str, List[int]] = {}
+        self._rows_by_individuo: Dict[str, List[int]] = {}
+
+        self._tree = None  # segmento principal (ver utils.matchers)
+        self._tree_size = 0
+        self._merge_thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        # Se incrementa al recargar: invalida las reconstrucciones lanzadas antes
+        self._epoch = 0
+        self._version = 0
+        self._snapshot: IndexSnapshot = None
+        self._publish()
+
+    # --------------------------
+    # Construcción
+    # --------------------------
+    @classmethod
+    def from_matrix(cls, encodings: np.ndarray, names: Sequence[str], **kwargs) -> "FaceIndex":
+        """
+        Crea un índice con todas las filas ya incluidas en el segmento principal.
+        """
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, kwargs.get("dim", 128))
+        kwargs.setdefault("initial_capacity", max(len(encodings) * 2, 1024))
+        index = cls(**kwargs)
+        n = len(encodings)
+        index._buffer[:n] = encodings
+        index._alive[:n] = True
+        index._labels[:n] = [index._label_for(name) for name in names]
+        index._add_to_templates(index._labels[:n], encodings)
+        index._size = n
+        index.names = list(names)
+        index._rebuild_lookups()
+        if n:
+            index._tree = index._build_main(index._buffer[:n])
+            index._tree_size = n
+        index._publish()
+        return index
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "FaceIndex":
+        """
+        Crea un índice desde un snapshot guardado con ``save``.
+        """
+        encodings, names, version = _read_snapshot(path)
+        kwargs.setdefault("dim", encodings.shape[1])
+        index = cls.from_matrix(encodings, names, **kwargs)
+        with index._lock:
+            index._version = version
+            index._publish(bump=False)
+        return index
+
+    def save(self, path: str) -> int:
+        """
+        Guarda la versión actual en disco. Devuelve la versión guardada.
+        """
+        snap = self._snapshot
+        snap.save(path)
+        return snap.version
+
+    def reload(self, path: str) -> int:
+        """
+        Sustituye el contenido por el de un snapshot en disco (p. ej. guardado
+        por otra réplica). El índice nuevo se construye fuera del lock y se
+        publica de una vez; las consultas en curso terminan con la versión
+        anterior. Devuelve la nueva versión.
+        """
+        if self._external:
+            raise RuntimeError("El índice usa una galería externa: no se puede recargar desde un snapshot")
+        return self.adopt(FaceIndex.load(path, **self._params()))
+
+    def _params(self) -> Dict:
+        return dict(
+            dim=self.dim, merge_threshold=self.merge_threshold,
+            compact_threshold=self.compact_threshold, backend=self.backend, ivf_min=self.ivf_min,
+            ivf_params=self.ivf_params, two_stage=self.two_stage,
+            two_stage_candidates=self.two_stage_candidates, background_merge=self.background_merge,
+            rerank=self.rerank, buffer_dtype=self.buffer_dtype,
+        )
+
+    def empty_like(self) -> "FaceIndex":
+        """
+        Índice vacío con los mismos parámetros.
+        """
+        return FaceIndex(**self._params())
+
+    def adopt(self, other: "FaceIndex") -> int:
+        """
+        Sustituye el contenido por el de ``other`` (ya construido) y publica
+        una versión nueva; las reconstrucciones en curso se descartan.
+        Devuelve la nueva versión.
+        """
+        other.wait_merge()
+        with self._lock:
+            self._epoch += 1
+            for attr in ("_buffer", "_external", "_alive", "_labels", "individuo_keys", "_label_of",
+                         "_tpl_sum", "_tpl_count", "_size", "_n_dead", "_n_dead_tree", "names",
+                         "_rows_by_name", "_rows_by_individuo", "_tree", "_tree_size"):
+                setattr(self, attr, getattr(other, attr))
+            self._tpl_cache = None
+            self._version = max(self._version, other._version)
+            self._publish()
+            return self._version
+
+    # --------------------------
+    # Versiones
+    # --------------------------
+    def _publish(self, bump: bool = True):
+        """
+        Publica la versión actual (llamar con el lock tomado tras cada escritura).
+        """
+        if bump:
+            self._version += 1
+        self._snapshot = IndexSnapshot(
+            self._version, self.dim, self._size, self._n_dead, self._tree, self._tree_size,
+            self._n_dead_tree, self._buffer, self._alive, self._labels, self.names, self.individuo_keys,
+            self.rerank,
+        )
+
+    def snapshot(self) -> IndexSnapshot:
+        """
+        Versión actual, inmutable: todas las lecturas sobre ella son consistentes.
+        """
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def __len__(self) -> int:
+        """
+        Número de caras vivas.
+        """
+        return self._size - self._n_dead
+
+    @property
+    def backend_name(self) -> str:
+        """
+        Backend efectivo del segmento principal ("brute", "ivf" o "kdtree").
+        """
+        tree = self._tree
+        return tree.name if tree is not None else "brute"
+
+    def _build_main(self, data: np.ndarray):
+        return build_matcher(data, self.backend, ivf_min=self.ivf_min, ivf_params=self.ivf_params)
+
+    @property
+    def n_dead(self) -> int:
+        return self._n_dead
+
+    @property
+    def data(self) -> np.ndarray:
+        """
+        Copia de los encodings vivos.
+        """
+        with self._lock:
+            return self._buffer[: self._size][self._alive[: self._size]].copy()
+
+    def _label_for(self, name: str) -> int:
+        key = individuo_id_from_name(name)
+        label = self._label_of.get(key)
+        if label is None:
+            label = len(self.individuo_keys)
+            self.individuo_keys.append(key)
+            self._label_of[key] = label
+            if label >= len(self._tpl_count):
+                capacity = 2 * len(self._tpl_count)
+                tpl_sum = np.zeros((capacity, self.dim), dtype=np.float64)
+                tpl_sum[:label] = self._tpl_sum[:label]
+                tpl_count = np.zeros(capacity, dtype=np.int64)
+                tpl_count[:label] = self._tpl_count[:label]
+                self._tpl_sum, self._tpl_count = tpl_sum, tpl_count
+        return label
+
+    def _add_to_templates(self, labels: np.ndarray, encodings: np.ndarray, sign: int = 1):
+        np.add.at(self._tpl_sum, labels, sign * encodings)
+        np.add.at(self._tpl_count, labels, sign)
+        self._tpl_cache = None
+
+    def _rebuild_lookups(self):
+        self._rows_by_name = {}
+        self._rows_by_individuo = {}
+        for row, name in enumerate(self.names):
+            if not self._alive[row]:
+                continue
+            self._rows_by_name.setdefault(name, []).append(row)
+            self._rows_by_individuo.setdefault(individuo_id_from_name(name), []).append(row)
+
+    # --------------------------
+    # Inserción
+    # --------------------------
+    def add(self, encoding: np.ndarray, name: str) -> int:
+        """
+        Añade un encoding y devuelve su número de fila.
+        """
+        return self.add_many(np.asarray(encoding).reshape(1, -1), [name])[0]
+
+    def add_many(self, encodings: np.ndarray, names: Sequence[str]) -> List[int]:
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, self.dim)
+        if len(encodings) != len(names):
+            raise ValueError("encodings y names deben tener la misma longitud")
+        if self._external:
+            raise RuntimeError("El índice usa una galería externa: las altas se hacen en la galería")
+        return self._append_rows(names, encodings=encodings)
+
+    def attach_rows(self, buffer: np.ndarray, names: Sequence[str]) -> List[int]:
+        """
+        Galería externa: añade las filas [size, size + len(names)) que ya están
+        escritas en ``buffer`` (p. ej. un np.memmap de sólo lectura), sin
+        copiarlas. ``buffer`` sustituye al anterior y debe contener las mismas
+        filas previas (un fichero sólo-añadir que ha crecido).
+        """
+        if len(buffer) < self._size + len(names) or buffer.shape[1:] != (self.dim,):
+            raise ValueError("El buffer externo no contiene las filas indicadas")
+        return self._append_rows(names, buffer=buffer)
+
+    def _append_rows(self, names: Sequence[str], encodings: Optional[np.ndarray] = None,
+                     buffer: Optional[np.ndarray] = None) -> List[int]:
+        with self._lock:
+            if buffer is not None:
+                self._buffer = buffer
+                self._external = True
+            start = self._size
+            end = start + len(names)
+            if end > len(self._alive):
+                self._grow(end)
+            if encodings is None:
+                encodings = self._buffer[start:end]
+            else:
+                self._buffer[start:end] = encodings
+            self._alive[start:end] = True
+            self._labels[start:end] = [self._label_for(name) for name in names]
+            self._add_to_templates(self._labels[start:end], encodings)
+            self.names.extend(names)
+            for row, name in zip(range(start, end), names):
+                self._rows_by_name.setdefault(name, []).append(row)
+                self._rows_by_individuo.setdefault(individuo_id_from_name(name), []).append(row)
+            self._size = end
+            self._publish()
+            pending = self._size - self._tree_size
+
+        if pending >= self.merge_threshold:
+            self.merge(wait=not self.background_merge)
+        return list(range(start, end))
+
+    def _grow(self, min_capacity: int):
+        capacity = len(self._alive)
+        while capacity < min_capacity:
+            capacity *= 2
+        if not self._external:
+            new_buffer = np.empty((capacity, self.dim), dtype=self.buffer_dtype)
+            new_buffer[: self._size] = self._buffer[: self._size]
+            self._buffer = new_buffer
+        new_alive = np.zeros(capacity, dtype=bool)
+        new_alive[: self._size] = self._alive[: self._size]
+        new_labels = np.full(capacity, -1, dtype=np.int32)
+        new_labels[: self._size] = self._labels[: self._size]
+        # Las consultas en curso conservan una referencia al buffer anterior,
+        # cuyas filas ya escritas nunca se modifican.
+        self._alive = new_alive
+        self._labels = new_labels
+
+    # --------------------------
+    # Borrado (tombstones)
+    # --------------------------
+    def _kill_rows(self, rows: Sequence[int]) -> int:
+        killed = [row for row in rows if self._alive[row]]
+        if not killed:
+            return 0
+        # Copia del bitmap: los snapshots publicados conservan el anterior
+        alive = self._alive.copy()
+        alive[killed] = False
+        self._alive = alive
+        self._n_dead_tree += sum(1 for row in killed if row < self._tree_size)
+        self._add_to_templates(self._labels[killed], self._buffer[killed], sign=-1)
+        self._n_dead += len(killed)
+        self._publish()
+        return len(killed)
+
+    def remove(self, name: str) -> int:
+        """
+        Marca como borradas las filas con ese nombre. Devuelve cuántas se borraron.
+        """
+        with self._lock:
+            rows = self._rows_by_name.pop(name, [])
+            individuo_rows = self._rows_by_individuo.get(individuo_id_from_name(name))
+            if individuo_rows is not None:
+                dead = set(rows)
+                individuo_rows[:] = [r for r in individuo_rows if r not in dead]
+            killed = self._kill_rows(rows)
+        self._maybe_compact()
+        return killed
+
+    def remove_individuo(self, individuo_id: str) -> int:
+        """
+        Marca como borradas todas las caras de un individuo.
+        """
+        with self._lock:
+            rows = self._rows_by_individuo.pop(individuo_id, [])
+            for row in rows:
+                self._rows_by_name.pop(self.names[row], None)
+            killed = self._kill_rows(rows)
+        self._maybe_compact()
+        return killed
+
+    def _maybe_compact(self):
+        if self._n_dead >= self.compact_threshold and not self._external:
+            self.compact(wait=not self.background_merge)
+
+    # --------------------------
+    # Fusión del delta y compactación
+    # --------------------------
+    def merge(self, wait: bool = False):
+        """
+        Reconstruye el segmento principal con todas las filas actuales.
+        Si ya hay una reconstrucción en curso no se lanza otra.
+        """
+        self._start_rebuild(compact=False, wait=wait)
+
+    def compact(self, wait: bool = False):
+        """
+        Reconstruye el índice sin las filas borradas.
+        """
+        self._start_rebuild(compact=True, wait=wait)
+
+    def _start_rebuild(self, compact: bool, wait: bool):
+        with self._lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                thread = self._merge_thread
+            else:
+                n = self._size
+                # Con galería externa la numeración de filas es fija: sólo se fusiona
+                compact = not self._external and (compact or self._n_dead > 0)
+                if n == self._tree_size and not compact:
+                    return
+                # Sin copias: las filas [0, n) y su bitmap de vivas ya no cambian
+                # (las bajas sustituyen el bitmap, ver _kill_rows)
+                snapshot = (n, self._buffer[:n], self._alive[:n], self._epoch)
+                thread = threading.Thread(target=self._rebuild, args=(compact, snapshot), daemon=True)
+                self._merge_thread = thread
+                thread.start()
+        if wait:
+            thread.join()
+
+    def _rebuild(self, compact: bool, snapshot: Tuple[int, np.ndarray, np.ndarray, int]):
+        n, data, alive, epoch = snapshot
+        keep = np.flatnonzero(alive) if compact else None
+        if compact:
+            data = data[keep]
+
+        try:
+            tree = self._build_main(data) if len(data) else None
+        except Exception as e:
+            logger.error(f"[ERROR] No se pudo reconstruir el índice de caras: {e}")
+            return
+
+        with self._lock:
+            if epoch != self._epoch:
+                # El índice se recargó mientras tanto: este árbol ya no corresponde
+                return
+            if compact:
+                self._swap_compacted(n, keep, tree)
+            elif n > self._tree_size:
+                self._tree = tree
+                self._tree_size = n
+                self._n_dead_tree = int(n - np.count_nonzero(self._alive[:n]))
+            self._publish()
+            pending = self._size - self._tree_size
+            pending_dead = self._n_dead
+
+        # Si durante la reconstrucción llegaron suficientes cambios, se encadena otra
+        compact = pending_dead >= self.compact_threshold and not self._external
+        if compact or pending >= self.merge_threshold:
+            self._merge_thread = None
+            self._start_rebuild(compact=compact, wait=False)
+
+    def _swap_compacted(self, n: int, keep: np.ndarray, tree):
+        """
+        Sustituye el buffer por la versión compactada. Las filas añadidas
+        durante la reconstrucción ([n, size)) se copian al final como delta
+        y los borrados ocurridos mientras tanto se conservan.
+        """
+        rows = np.concatenate([keep, np.arange(n, self._size)]).astype(np.intp)
+        new_size = len(rows)
+        capacity = max(self._initial_capacity, 2 * new_size)
+
+        new_buffer = np.empty((capacity, self.dim), dtype=self.buffer_dtype)
+        new_buffer[:new_size] = self._buffer[rows]
+        new_alive = np.zeros(capacity, dtype=bool)
+        new_alive[:new_size] = self._alive[rows]
+        new_labels = np.full(capacity, -1, dtype=np.int32)
+        new_labels[:new_size] = self._labels[rows]
+
+        self._buffer = new_buffer
+        self._alive = new_alive
+        self._labels = new_labels
+        self._size = new_size
+        self._n_dead = int(new_size - np.count_nonzero(new_alive[:new_size]))
+        # Lista nueva (no se modifica la anterior) para no romper lecturas en curso
+        self.names = [self.names[r] for r in rows]
+        self._rebuild_lookups()
+        self._tree = tree
+        self._tree_size = len(keep)
+        self._n_dead_tree = int(len(keep) - np.count_nonzero(new_alive[: len(keep)]))
+        logger.info(f"[OK] Índice de caras compactado: {len(self)} caras vivas")
+
+    def wait_merge(self):
+        """
+        Espera a que terminen las reconstrucciones en curso (incluidas las encadenadas).
+        """
+        while True:
+            thread = self._merge_thread
+            if thread is None or thread is threading.current_thread():
+                return
+            thread.join()
+            if self._merge_thread is thread:
+                return
+
+    # --------------------------
+    # Consulta
+    # --------------------------
+    def _query_snapshot(self, X, k: int):
+        snap = self._snapshot
+        dist, ind = snap.query(X, k)
+        return dist, ind, snap.names, snap.labels
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Igual que ``KDTree.query``: devuelve (distancias, índices) de forma (m, k)
+        ordenados por distancia. Las filas borradas no aparecen nunca;
+        si hay menos de k filas vivas se rellena con inf / -1.
+        """
+        dist, ind, _, _ = self._query_snapshot(X, k)
+        return dist, ind
+
+    def query_names(self, X, k: int = 1) -> Tuple[np.ndarray, List[List[Optional[str]]]]:
+        """
+        Como ``query`` pero devuelve los nombres de referencia en lugar de filas.
+        Los nombres se resuelven con la misma versión del índice usada en la
+        búsqueda, así una compactación concurrente no puede desalinearlos.
+        """
+        dist, ind, names, _ = self._query_snapshot(X, k)
+        return dist, [[names[i] if i >= 0 else None for i in row] for row in ind]
+
+    def match(
+        self, X, threshold: float = 0.6, two_stage: Optional[bool] = None
+    ) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Búsqueda por lotes: una sola consulta k=1 para todas las caras de X.
+        Devuelve (distancias (m,), ids de individuo o None si no superan el umbral).
+        Los ids se resuelven con el array de etiquetas, sin parsear nombres.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        if len(X) == 0:
+            return np.empty(0), []
+
+        snap = self._snapshot
+        keys = snap.individuo_keys
+        if self.two_stage if two_stage is None else two_stage:
+            dist, row_labels, keys = self._match_two_stage(X)
+            dist, row_labels = dist[:, 0], row_labels[:, 0]
+        else:
+            dist, ind = snap.query(X, 1)
+            dist, ind = dist[:, 0], ind[:, 0]
+            if len(snap.labels) == 0:
+                # Galería vacía: ninguna cara coincide
+                row_labels = np.full(len(X), -1, dtype=np.int64)
+            else:
+                row_labels = np.where(ind >= 0, snap.labels[np.maximum(ind, 0)], -1)
+
+        row_labels = np.where(dist < threshold, row_labels, -1)
+        return dist, [keys[l] if l >= 0 else None for l in row_labels.tolist()]
+
+    def match_topk(
+        self, X, k: int = 3, threshold: float = 0.6, two_stage: Optional[bool] = None,
+        rows_per_individuo: int = 4,
+    ) -> Tuple[np.ndarray, List[Optional[str]], List[List[Tuple[str, float]]]]:
+        """
+        Como ``match`` pero además devuelve, por cara, los k individuos más
+        cercanos (sin repetir individuo aunque tenga varias fotos) con su
+        distancia, ordenados y sin aplicar el umbral: el primero es el de
+        ``match`` y el resto permite ver el margen con el siguiente.
+        Devuelve (distancias (m,), ids o None, candidatos [(id, distancia)]).
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        if len(X) == 0:
+            return np.empty(0), [], []
+
+        if self.two_stage if two_stage is None else two_stage:
+            dist, labels, keys = self._match_two_stage(X, k)
+        else:
+            snap = self._snapshot
+            keys = snap.individuo_keys
+            dist, labels = snap.query_individuos(X, k, rows_per_individuo)
+
+        ids = [keys[l] if l >= 0 and d < threshold else None
+               for d, l in zip(dist[:, 0].tolist(), labels[:, 0].tolist())]
+        candidates = [
+            [(keys[l], d) for d, l in zip(d_row, l_row) if l >= 0]
+            for d_row, l_row in zip(dist.tolist(), labels.tolist())
+        ]
+        return dist[:, 0], ids, candidates
+
+    # --------------------------
+    # Búsqueda en dos fases (plantillas por individuo)
+    # --------------------------
+    def templates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve (etiquetas, centroides float32) de los individuos con alguna cara viva.
+        Se recalcula sólo tras altas o bajas.
+        """
+        with self._lock:
+            if self._tpl_cache is None:
+                n_labels = len(self.individuo_keys)
+                valid = np.flatnonzero(self._tpl_count[:n_labels] > 0)
+                centroids = self._tpl_sum[valid] / self._tpl_count[valid, None]
+                self._tpl_cache = (valid, centroids.astype(np.float32))
+            return self._tpl_cache
+
+    def _match_two_stage(self, X: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        (distancias, etiquetas) de forma (m, k) con los k mejores individuos
+        entre los candidatos de la primera fase, y las claves de sus etiquetas.
+        """
+        m = len(X)
+        best_d = np.full((m, k), np.inf)
+        best_l = np.full((m, k), -1, dtype=np.int64)
+
+        # Fase 1: plantillas de individuo (una fila por persona). Las etiquetas
+        # se interpretan con las claves de la misma versión (reload las cambia).
+        with self._lock:
+            tpl_labels, centroids = self.templates()
+            keys = self.individuo_keys
+        if len(tpl_labels) == 0:
+            return best_d, best_l, keys
+        Xf = X.astype(np.float32)
+        d2 = (
+            np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2.0 * Xf @ centroids.T
+        )
+        n_cand = min(max(self.two_stage_candidates, k), len(tpl_labels))
+        cand = np.argpartition(d2, n_cand - 1, axis=1)[:, :n_cand]
+        cand_labels = tpl_labels[cand]
+
+        # Fase 2: fotos individuales de los candidatos. Las etiquetas no cambian
+        # al compactar, así que basta con leer sus filas bajo el lock.
+        with self._lock:
+            rows_by_label = {
+                l: self._rows_by_individuo.get(keys[l], [])
+                for l in np.unique(cand_labels).tolist()
+            }
+            vectors = {l: self._buffer[rows].copy() for l, rows in rows_by_label.items() if rows}
+
+        for q in range(m):
+            found = []
+            for l in cand_labels[q].tolist():
+                vecs = vectors.get(l)
+                if vecs is None:
+                    continue
+                found.append((np.sqrt(np.min(((vecs - X[q]) ** 2).sum(axis=1))), l))
+            found.sort()
+            for j, (d, l) in enumerate(found[:k]):
+                best_d[q, j], best_l[q, j] = d, l
+        return best_d, best_l, keys
+
+
+def _read_snapshot(path: str) -> Tuple[np.ndarray, List[str], int]:
+    with np.load(path, allow_pickle=False) as data:
+        return (
+            np.asarray(data["encodings"], dtype=np.float64),
+            [str(n) for n in data["names"]],
+            int(data["version"]),
+        )
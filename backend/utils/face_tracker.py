@@ -0,0 +1,191 @@
+# face_tracker.py
+# --------------------------
+# Seguimiento de caras entre frames (asociación por IoU / centroide)
+# --------------------------
+#
+# Cada cara detectada se asocia a un track del frame anterior. Sólo hace
+# falta codificar y buscar en el índice una cara cuando:
+#   - empieza un track nuevo,
+#   - han pasado ``reverify_every`` frames desde la última verificación, o
+#   - la última distancia al individuo era poco fiable (> ``low_confidence``)
+#     o era desconocido, y han pasado ``reverify_every // 4`` frames.
+# El resto de caras heredan la identidad de su track.
+#
+# No importa config: los parámetros llegan desde utils.detection_video.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left) como face_recognition
+
+
+def _iou(a: Box, b: Box) -> float:
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _center_distance(a: Box, b: Box) -> float:
+    """
+    Distancia entre centros relativa al tamaño medio de las dos cajas.
+    """
+    ca = ((a[1] + a[3]) / 2, (a[0] + a[2]) / 2)
+    cb = ((b[1] + b[3]) / 2, (b[0] + b[2]) / 2)
+    size = ((a[1] - a[3]) + (a[2] - a[0]) + (b[1] - b[3]) + (b[2] - b[0])) / 4
+    return float(np.hypot(ca[0] - cb[0], ca[1] - cb[1]) / max(size, 1.0))
+
+
+class Track:
+    def __init__(self, track_id: int, box: Box, frame_idx: int):
+        self.id = track_id
+        self.box = box
+        self.first_frame = frame_idx
+        self.last_frame = frame_idx
+        self.last_verified: Optional[int] = None
+        self.individuo: Optional[str] = None
+        self.distance: Optional[float] = None
+        # Candidatos de la última verificación (detection_images.match_details)
+        self.details: Dict = {}
+        self.missing = 0
+        # Tramos (individuo, frame inicial, frame final); cambia si una re-verificación da otro individuo
+        self.segments: List[List] = []
+
+    def set_identity(self, individuo: Optional[str], distance: Optional[float], frame_idx: int,
+                     details: Optional[Dict] = None):
+        self.last_verified = frame_idx
+        self.distance = distance
+        self.details = details or {}
+        if not self.segments or self.segments[-1][0] != individuo:
+            self.segments.append([individuo, frame_idx, frame_idx])
+        self.individuo = individuo
+
+    def seen(self, box: Box, frame_idx: int):
+        self.box = box
+        self.last_frame = frame_idx
+        self.missing = 0
+        if self.segments:
+            self.segments[-1][2] = frame_idx
+
+
+class FaceTracker:
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_center_distance: float = 1.0,
+        max_missing: int = 3,
+        reverify_every: int = 75,
+        low_confidence: float = 0.5,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_center_distance = max_center_distance
+        self.max_missing = max_missing
+        self.reverify_every = reverify_every
+        self.low_confidence = low_confidence
+
+        self.active: List[Track] = []
+        self.finished: List[Track] = []
+        self._next_id = 1
+
+        self.caras = 0
+        self.codificadas = 0
+
+    def _associate(self, boxes: Sequence[Box]) -> Dict[int, Track]:
+        """
+        Asociación voraz: pares (track, caja) de mayor a menor IoU; si no
+        solapan, se admite el centroide más cercano dentro de ``max_center_distance``.
+        """
+        pairs = []
+        for t_i, track in enumerate(self.active):
+            for b_i, box in enumerate(boxes):
+                iou = _iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((1.0 + iou, t_i, b_i))
+                else:
+                    dist = _center_distance(track.box, box)
+                    if dist <= self.max_center_distance:
+                        pairs.append((1.0 - dist / (self.max_center_distance + 1e-9), t_i, b_i))
+        pairs.sort(reverse=True)
+
+        assigned: Dict[int, Track] = {}
+        used_tracks = set()
+        for _, t_i, b_i in pairs:
+            if t_i in used_tracks or b_i in assigned:
+                continue
+            used_tracks.add(t_i)
+            assigned[b_i] = self.active[t_i]
+        return assigned
+
+    def _needs_verification(self, track: Track, frame_idx: int) -> bool:
+        if track.last_verified is None:
+            return True
+        elapsed = frame_idx - track.last_verified
+        if elapsed >= self.reverify_every:
+            return True
+        dudoso = track.individuo is None or (track.distance is not None and track.distance > self.low_confidence)
+        return dudoso and elapsed >= max(1, self.reverify_every // 4)
+
+    def update(self, frame_idx: int, boxes: Sequence[Box]) -> Tuple[List[Track], List[int]]:
+        """
+        Asocia las caras del frame a tracks (creando los nuevos) y devuelve
+        (track por cara, índices de las caras que hay que codificar y buscar).
+        """
+        boxes = [tuple(int(v) for v in b) for b in boxes]
+        assigned = self._associate(boxes)
+
+        tracks: List[Track] = []
+        for b_i, box in enumerate(boxes):
+            track = assigned.get(b_i)
+            if track is None:
+                track = Track(self._next_id, box, frame_idx)
+                self._next_id += 1
+                self.active.append(track)
+            track.seen(box, frame_idx)
+            tracks.append(track)
+
+        seen = {id(t) for t in tracks}
+        still_active = []
+        for track in self.active:
+            if id(track) not in seen:
+                track.missing += 1
+                if track.missing > self.max_missing:
+                    self.finished.append(track)
+                    continue
+            still_active.append(track)
+        self.active = still_active
+
+        to_encode = [i for i, t in enumerate(tracks) if self._needs_verification(t, frame_idx)]
+        self.caras += len(boxes)
+        self.codificadas += len(to_encode)
+        return tracks, to_encode
+
+    def all_tracks(self) -> List[Track]:
+        return sorted(self.finished + self.active, key=lambda t: t.id)
+
+    def summary(self, fps: float = 0.0) -> List[Dict]:
+        """
+        Tramos por track e individuo, en frames y (si se conoce el fps) en segundos.
+        """
+        out = []
+        for track in self.all_tracks():
+            for individuo, start, end in track.segments:
+                out.append({
+                    "track_id": track.id,
+                    "individuo": individuo,
+                    "frame_inicio": start,
+                    "frame_fin": end,
+                    "inicio_s": round(start / fps, 2) if fps else None,
+                    "fin_s": round(end / fps, 2) if fps else None,
+                })
+        return out
+
+    def stats(self) -> Dict:
+        return {
+            "tracks": self._next_id - 1,
+            "caras_detectadas": self.caras,
+            "caras_codificadas": self.codificadas,
+        }
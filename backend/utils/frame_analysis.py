@@ -0,0 +1,172 @@
+# frame_analysis.py
+# --------------------------
+# Análisis de un frame (caras + YOLO) ejecutable en procesos worker
+# --------------------------
+#
+# Este módulo NO importa config: se carga en cada proceso del pool y sólo
+# necesita face_recognition y, opcionalmente, el modelo YOLO, que se carga
+# una única vez por proceso en ``init_worker``.
+
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+import face_recognition
+
+logger = logging.getLogger(__name__)
+
+_yolo_model = None
+
+# Cara más pequeña (px) que encuentra el HOG de dlib con number_of_times_to_upsample=1
+HOG_MIN_FACE = 40
+
+
+def init_worker(yolo_model_path: Optional[str] = None):
+    """
+    Inicializador del pool: un hilo por proceso (el paralelismo lo da el pool)
+    y carga del modelo YOLO.
+    """
+    global _yolo_model
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except Exception:
+        pass
+
+    if yolo_model_path:
+        try:
+            from ultralytics import YOLO
+            _yolo_model = YOLO(yolo_model_path)
+        except Exception as e:
+            _yolo_model = None
+            logger.error(f"[ERROR] No se pudo cargar YOLO en el worker: {e}")
+
+
+def yolo_objects(results, names) -> List[Dict]:
+    """
+    Convierte la salida de Ultralytics de una imagen en [{label, bbox}].
+    """
+    objects: List[Dict] = []
+    for result in results:
+        for box, cls in zip(result.boxes.xyxy, result.boxes.cls):
+            x1, y1, x2, y2 = map(int, box)
+            objects.append({"label": names[int(cls)], "bbox": [x1, y1, x2, y2]})
+    return objects
+
+
+def detect_objects_batch(frames: Sequence[np.ndarray], yolo_model=None) -> List[List[Dict]]:
+    """
+    Pasa todos los frames por YOLO en una sola llamada (un lote).
+    Devuelve una lista de objetos por frame, en el mismo orden.
+    """
+    model = yolo_model if yolo_model is not None else _yolo_model
+    if model is None or len(frames) == 0:
+        return [[] for _ in frames]
+    results = model(list(frames), verbose=False)
+    return [yolo_objects([r], model.names) for r in results]
+
+
+def detection_scale(
+    height: int,
+    width: int,
+    downscale: Union[float, str] = 1.0,
+    min_face_size: int = 0,
+    max_side: int = 1280,
+) -> float:
+    """
+    Escala a la que se buscan las caras.
+    - ``downscale`` numérico: escala fija; "auto": la necesaria para que el
+      lado mayor quede en ``max_side`` px.
+    - ``min_face_size``: cara más pequeña (px de la imagen original) que debe
+      seguir detectándose; la escala nunca baja de HOG_MIN_FACE / min_face_size.
+    """
+    if downscale == "auto":
+        scale = max_side / max(height, width, 1)
+    else:
+        scale = float(downscale)
+    if min_face_size:
+        scale = max(scale, HOG_MIN_FACE / min_face_size)
+    return min(1.0, scale)
+
+
+def locate_faces(rgb: np.ndarray, scale: float = 1.0) -> List[tuple]:
+    """
+    Localiza caras sobre una copia reducida de la imagen y devuelve las cajas
+    (top, right, bottom, left) en coordenadas de la imagen original.
+    """
+    if scale >= 1.0:
+        return [tuple(loc) for loc in face_recognition.face_locations(rgb)]
+
+    h, w = rgb.shape[:2]
+    small = cv2.resize(rgb, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    sy, sx = h / small.shape[0], w / small.shape[1]
+    locations = []
+    for top, right, bottom, left in face_recognition.face_locations(small):
+        locations.append((
+            max(0, int(round(top * sy))),
+            min(w, int(round(right * sx))),
+            min(h, int(round(bottom * sy))),
+            max(0, int(round(left * sx))),
+        ))
+    return locations
+
+
+def encode_faces(frame_bgr: np.ndarray, locations: Sequence[tuple], rgb: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Codifica sólo las caras indicadas de un frame BGR. Devuelve ndarray (n, 128).
+    """
+    if len(locations) == 0:
+        return np.zeros((0, 128), dtype=np.float64)
+    if rgb is None:
+        rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    encodings = face_recognition.face_encodings(rgb, list(locations))
+    return np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+
+
+def analyze_faces(frame_bgr: np.ndarray, with_encodings: bool = True, detection: Optional[Dict] = None) -> Dict:
+    """
+    Localiza y (opcionalmente) codifica las caras de un frame BGR.
+    ``detection`` son los parámetros de ``detection_scale`` (downscale,
+    min_face_size, max_side); las caras se buscan a esa escala y los
+    encodings se calculan siempre sobre la imagen a resolución completa.
+    """
+    rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    scale = detection_scale(*rgb.shape[:2], **detection) if detection else 1.0
+    locations = locate_faces(rgb, scale)
+    if with_encodings:
+        encodings = encode_faces(frame_bgr, locations, rgb)
+    else:
+        encodings = np.zeros((0, 128), dtype=np.float64)
+    return {"locations": locations, "encodings": encodings}
+
+
+def analyze_frames(
+    frames: Sequence[np.ndarray],
+    yolo_model=None,
+    with_objects: bool = True,
+    with_encodings: bool = True,
+    detection: Optional[Dict] = None,
+) -> List[Dict]:
+    """
+    Analiza un lote de frames: caras frame a frame y YOLO en una sola llamada.
+    Devuelve por frame {"locations": [...], "encodings": ndarray (n, 128), "objects": [...]}.
+    Con ``with_encodings=False`` sólo se localizan las caras (encodings vacío):
+    el seguimiento decide después qué caras codificar.
+    """
+    results = [analyze_faces(frame, with_encodings, detection) for frame in frames]
+    if with_objects:
+        objects = detect_objects_batch(frames, yolo_model)
+    else:
+        objects = [[] for _ in frames]
+    for result, objs in zip(results, objects):
+        result["objects"] = objs
+    return results
+
+
+def analyze_frame(frame_bgr: np.ndarray, yolo_model=None, with_objects: bool = True) -> Dict:
+    """
+    Localiza y codifica las caras de un frame BGR y detecta objetos con YOLO.
+    """
+    return analyze_frames([frame_bgr], yolo_model, with_objects)[0]
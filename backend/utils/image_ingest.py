@@ -0,0 +1,116 @@
+# image_ingest.py
+# --------------------------
+# Lectura de imágenes subidas sin pasar por disco: decodificación directa
+# desde el buffer de la petición a un único array RGB
+# --------------------------
+#
+# Antes /detectar_imagen guardaba la subida, la releía con PIL, le daba la
+# vuelta a los canales (copia) y detect_faces_in_image volvía a RGB (otra
+# copia). Ahora:
+#   - ``upload_buffer`` expone el contenido subido como memoryview (sin copia
+#     si Werkzeug lo tiene en memoria).
+#   - ``decode_rgb`` lo decodifica con cv2.imdecode y convierte BGR -> RGB
+#     sobre el mismo array: una sola imagen en memoria para toda la petición.
+#   - ``StageTimer`` mide el tiempo de cada etapa.
+
+import io
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import cv2
+import numpy as np
+
+# Como PIL.Image.open en read_image_safe: sin aplicar la orientación EXIF
+_IMREAD_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+
+@contextmanager
+def upload_buffer(stream):
+    """
+    Contenido completo de ``stream`` (p. ej. FileStorage.stream) como memoryview.
+    Si el stream está en memoria (BytesIO, o SpooledTemporaryFile aún no
+    volcado a disco) se usa su buffer sin copiarlo; si no, se lee una vez en
+    un bytearray. La vista se libera al salir del bloque: no hay que guardar
+    referencias a ella (ni arrays creados con np.frombuffer) fuera del ``with``.
+    """
+    inner = getattr(stream, "_file", stream)
+    readinto = getattr(stream, "readinto", None)
+    if isinstance(inner, io.BytesIO):
+        view = inner.getbuffer()
+    elif readinto is None:
+        view = memoryview(stream.read())
+    else:
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        view = memoryview(bytearray(size))
+        n = 0
+        while n < size:
+            r = readinto(view[n:])
+            if not r:
+                break
+            n += r
+        view = view[:n]
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+def decode_rgb(buf) -> np.ndarray:
+    """
+    Decodifica una imagen (jpg, png, ...) desde un buffer a un array RGB uint8 (h, w, 3).
+    Lanza ValueError si no es una imagen válida.
+    """
+    encoded = np.frombuffer(buf, dtype=np.uint8)
+    try:
+        image = cv2.imdecode(encoded, _IMREAD_FLAGS) if encoded.size else None
+    except cv2.error:
+        image = None
+    finally:
+        # El array comparte memoria con ``buf``: soltarlo para poder liberar la vista
+        del encoded
+    if image is None:
+        raise ValueError("El archivo no es una imagen válida")
+    # BGR -> RGB sobre el mismo array (sin otra copia de la imagen)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+def save_upload(buf, path: str):
+    """
+    Guarda los bytes subidos tal cual (sin recodificar).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(buf)
+
+
+def write_rgb(path: str, rgb: np.ndarray) -> bool:
+    """
+    Guarda un array RGB con cv2.imwrite (que espera BGR).
+    """
+    return cv2.imwrite(path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+
+
+class StageTimer:
+    """
+    Tiempos por etapa en ms: ``with timer.stage("decodificacion"): ...``.
+    """
+
+    def __init__(self):
+        self.tiempos: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[name] = self.tiempos.get(name, 0.0) + 1000 * (time.perf_counter() - t0)
+
+    def as_dict(self) -> Dict[str, float]:
+        out = {k: round(v, 2) for k, v in self.tiempos.items()}
+        out["total"] = round(sum(self.tiempos.values()), 2)
+        return out
@@ -0,0 +1,392 @@
+# jobs.py
+# --------------------------
+# Trabajos asíncronos con estado persistido en SQLite
+# --------------------------
+#
+# Un trabajo se crea "en_cola", pasa a "procesando" en un pool acotado de
+# hilos y termina "completado", "error" o "cancelado". El progreso y los
+# resultados parciales se guardan en SQLite para poder consultarlos desde
+# otro request y para que un reinicio no pierda los trabajos pendientes:
+# al arrancar, ``resume()`` vuelve a encolar los que estaban en cola o a medias.
+#
+# Varios procesos (workers de gunicorn, el reloader de Flask) comparten la
+# base de datos:
+#   - un trabajo sólo lo ejecuta quien lo "reclama" con un UPDATE atómico
+#     (en_cola -> procesando); el resto lo ignora.
+#   - la cancelación se guarda en la fila, así la ve el proceso que lo ejecuta
+#     aunque DELETE /trabajos/<id> llegue a otro.
+#   - cada proceso renueva ``actualizado`` de sus trabajos cada ``heartbeat``
+#     segundos. Sólo reanuda trabajos un único proceso (el que tiene el lock
+#     ``<db>.lock``) y sólo los que llevan 3 latidos sin renovarse: los de
+#     procesos que murieron, nunca los que siguen en marcha en otro worker.
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+CANCELADO = "cancelado"
+ESTADOS_FINALES = (COMPLETADO, ERROR, CANCELADO)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Se pasa al handler de cada trabajo para informar del progreso
+    y comprobar si se ha pedido cancelarlo.
+    """
+
+    def __init__(self, manager: "JobManager", job_id: str, min_interval: float = 1.0,
+                 cancel_interval: float = 0.5):
+        self.manager = manager
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self.cancel_interval = cancel_interval
+        self._last_write = 0.0
+        self._last_cancel_check = 0.0
+        self._cancelled = False
+
+    def cancelled(self) -> bool:
+        """
+        Lee la petición de cancelación de la base de datos (como mucho una vez
+        cada ``cancel_interval`` segundos: el video lo pregunta en cada frame).
+        """
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_cancel_check >= self.cancel_interval:
+            self._last_cancel_check = now
+            self._cancelled = self.manager.store.cancel_requested(self.job_id)
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+    def progress(self, progreso: Dict, parcial: Optional[Dict] = None, force: bool = False):
+        """
+        Guarda progreso y resultado parcial. Las escrituras se limitan a una
+        cada ``min_interval`` segundos salvo con ``force``.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.manager.store.update(self.job_id, progreso=progreso, parcial=parcial)
+
+
+class JobStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progreso TEXT,
+                    parcial TEXT,
+                    resultado TEXT,
+                    error TEXT,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos(estado)")
+            # Bases de datos creadas antes de guardar la cancelación en la fila
+            columnas = {row["name"] for row in conn.execute("PRAGMA table_info(trabajos)")}
+            if "cancelar" not in columnas:
+                conn.execute("ALTER TABLE trabajos ADD COLUMN cancelar INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, tipo: str, params: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO trabajos (id, tipo, estado, params, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, tipo, EN_COLA, json.dumps(params), now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if not fields:
+            return
+        cols, values = [], []
+        for key, value in fields.items():
+            cols.append(f"{key} = ?")
+            values.append(json.dumps(value) if key in ("progreso", "parcial", "resultado") else value)
+        cols.append("actualizado = ?")
+        values.append(time.time())
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE trabajos SET {', '.join(cols)} WHERE id = ?", (*values, job_id))
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def claim(self, job_id: str) -> bool:
+        """
+        en_cola -> procesando si nadie lo ha reclamado ni cancelado antes.
+        El UPDATE es atómico entre procesos: sólo uno recibe True.
+        """
+        return self._execute(
+            "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ? AND estado = ? AND cancelar = 0",
+            (PROCESANDO, time.time(), job_id, EN_COLA),
+        ) == 1
+
+    def request_cancel(self, job_id: str):
+        """
+        Marca la cancelación en la fila; si aún no ha empezado queda cancelado ya.
+        """
+        now = time.time()
+        self._execute(
+            f"UPDATE trabajos SET cancelar = 1, actualizado = ? WHERE id = ? AND estado NOT IN "
+            f"({', '.join('?' * len(ESTADOS_FINALES))})",
+            (now, job_id, *ESTADOS_FINALES),
+        )
+        self._execute(
+            "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ? AND estado = ?",
+            (CANCELADO, now, job_id, EN_COLA),
+        )
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT cancelar FROM trabajos WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancelar"])
+
+    def touch(self, job_ids: List[str]):
+        """
+        Latido: renueva ``actualizado`` de los trabajos que lleva este proceso.
+        """
+        if job_ids:
+            self._execute(
+                f"UPDATE trabajos SET actualizado = ? WHERE id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), *job_ids),
+            )
+
+    def requeue_stale(self, job_id: str, older_than: float) -> bool:
+        """
+        Vuelve a poner en cola un trabajo pendiente cuyo proceso ya no lo
+        renueva (``actualizado`` anterior a ``older_than``).
+        """
+        return self._execute(
+            "UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ? AND estado IN (?, ?) "
+            "AND cancelar = 0 AND actualizado < ?",
+            (EN_COLA, time.time(), job_id, EN_COLA, PROCESANDO, older_than),
+        ) == 1
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        data = dict(row)
+        data.pop("cancelar", None)
+        for key in ("params", "progreso", "parcial", "resultado"):
+            data[key] = json.loads(data[key]) if data[key] else None
+        return data
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM trabajos WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, tipo, estado, progreso, error, creado, actualizado FROM trabajos "
+                "ORDER BY creado DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        out = []
+        for row in rows:
+            data = dict(row)
+            data["progreso"] = json.loads(data["progreso"]) if data["progreso"] else None
+            out.append(data)
+        return out
+
+    def pending(self) -> List[Dict]:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM trabajos WHERE estado IN (?, ?) ORDER BY creado",
+                (EN_COLA, PROCESANDO),
+            ).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+
+class JobManager:
+    """
+    Ejecuta trabajos en un pool acotado de hilos.
+    Los handlers se registran por tipo: ``handler(params, ctx) -> resultado (dict)``.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = 2, max_queue: int = 32, heartbeat: float = 5.0):
+        self.store = JobStore(db_path)
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.lock_path = f"{db_path}.lock"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trabajo")
+        self._handlers: Dict[str, Callable[[Dict, JobContext], Dict]] = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        # Tipos que este proceso reanuda (None = todos) y lock de "reanudador"
+        self._resume_types: Optional[set] = set()
+        self._owner_file = None
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, tipo: str, handler: Callable[[Dict, JobContext], Dict]):
+        self._handlers[tipo] = handler
+
+    def submit(self, tipo: str, params: Dict) -> str:
+        if tipo not in self._handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        with self._lock:
+            if len(self._active) >= self.max_queue:
+                raise QueueFull(f"Hay {len(self._active)} trabajos pendientes")
+            job_id = self.store.create(tipo, params)
+            self._active.add(job_id)
+        self._start_thread()
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Pide la cancelación. Un trabajo en cola se cancela al instante; uno en
+        curso se detiene en el siguiente ``check_cancelled`` de su handler.
+        """
+        job = self.store.get(job_id)
+        if not job or job["estado"] in ESTADOS_FINALES:
+            return job
+        self.store.request_cancel(job_id)
+        return self.store.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def resume(self, tipo: Optional[str] = None):
+        """
+        Vuelve a encolar los trabajos que quedaron pendientes o a medias
+        en una ejecución anterior (empiezan de cero). Con ``tipo`` sólo los de
+        ese tipo, para que cada módulo reanude los suyos al registrar su handler.
+
+        Sólo en el proceso principal (no en los hijos del pool de encodings,
+        que vuelven a importar la app) y, de todos los procesos que comparten
+        la base de datos, sólo en el que consigue el lock ``<db>.lock``; si lo
+        tiene otro, este proceso lo reintenta en cada latido y toma el relevo
+        si aquel termina. Se revisa en cada latido, así también se reanudan
+        los trabajos de un worker que muere.
+        """
+        if multiprocessing.parent_process() is not None:
+            return
+        with self._lock:
+            if tipo is None or self._resume_types is None:
+                self._resume_types = None
+            else:
+                self._resume_types.add(tipo)
+        self._start_thread()
+
+    def _start_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="trabajos-latido", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                with self._lock:
+                    active = list(self._active)
+                self.store.touch(active)
+                if (self._resume_types is None or self._resume_types) and self._is_owner():
+                    self._resume_stale()
+            except Exception as e:
+                logger.error(f"[ERROR] Latido de trabajos: {e}")
+            time.sleep(self.heartbeat)
+
+    def _is_owner(self) -> bool:
+        """
+        True si este proceso tiene (o consigue ahora) el lock de reanudador.
+        El lock se mantiene mientras viva el proceso; al morir lo libera el SO.
+        """
+        if self._owner_file is not None:
+            return True
+        f = open(self.lock_path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._owner_file = f
+        logger.info(f"[OK] Este proceso ({os.getpid()}) reanuda los trabajos pendientes")
+        return True
+
+    def _resume_stale(self):
+        older_than = time.time() - 3 * self.heartbeat
+        for job in self.store.pending():
+            if job["tipo"] not in self._handlers:
+                continue
+            if self._resume_types is not None and job["tipo"] not in self._resume_types:
+                continue
+            with self._lock:
+                if job["id"] in self._active:
+                    continue
+            if not self.store.requeue_stale(job["id"], older_than):
+                continue
+            with self._lock:
+                self._active.add(job["id"])
+            self._executor.submit(self._run, job["id"])
+            logger.info(f"[OK] Trabajo {job['id']} reanudado")
+
+    def _run(self, job_id: str):
+        try:
+            job = self.store.get(job_id)
+            # Sólo lo ejecuta el proceso que lo reclama (otro puede haberlo hecho ya)
+            if not job or not self.store.claim(job_id):
+                return
+
+            ctx = JobContext(self, job_id)
+            try:
+                resultado = self._handlers[job["tipo"]](job["params"], ctx)
+                self.store.update(job_id, estado=COMPLETADO, resultado=resultado)
+            except JobCancelled:
+                self.store.update(job_id, estado=CANCELADO)
+            except Exception as e:
+                logger.exception(e)
+                self.store.update(job_id, estado=ERROR, error=str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
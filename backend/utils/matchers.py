@@ -0,0 +1,433 @@
+# matchers.py
+# --------------------------
+# Backends de búsqueda de vecinos para el índice de caras
+# --------------------------
+#
+# Todos los backends se construyen sobre una matriz (N, dim) y exponen
+# ``query(X, k) -> (distancias, índices)`` con la misma forma que
+# ``KDTree.query``; los índices son filas de la matriz de construcción y,
+# si un backend aproximado encuentra menos de k candidatos, se rellena
+# con inf / -1.
+#
+# - "brute": fuerza bruta exacta en float32 con multiplicación de matrices.
+# - "ivf":   IVF (cuantizador grueso k-means) con PQ opcional, aproximado.
+# - "kdtree": el KDTree de sklearn usado hasta ahora.
+# - "float16" / "int8": fuerza bruta sobre la galería cuantizada (2 o 1 byte
+#   por componente), aproximada; ver FaceIndex(rerank=...) para re-ordenar
+#   los mejores candidatos con las distancias exactas.
+# - "auto":  brute hasta ``ivf_min`` referencias, ivf a partir de ahí (el
+#   cambio a búsqueda aproximada se registra en el log).
+
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "brute", "ivf", "kdtree", "float16", "int8")
+
+
+def _empty_result(m: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return np.full((m, k), np.inf), np.full((m, k), -1, dtype=np.intp)
+
+
+def _sq_norms(X: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", X, X)
+
+
+def _topk(d2: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Los k menores de cada fila de una matriz de distancias al cuadrado, ordenados.
+    Devuelve distancias (no al cuadrado) e índices de columna.
+    """
+    m, n = d2.shape
+    if n == 0:
+        return _empty_result(m, k)
+    kk = min(k, n)
+    idx = np.argpartition(d2, kk - 1, axis=1)[:, :kk] if kk < n else np.tile(np.arange(n), (m, 1))
+    part = np.take_along_axis(d2, idx, axis=1)
+    order = np.argsort(part, axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    dist = np.sqrt(np.maximum(np.take_along_axis(part, order, axis=1), 0.0)).astype(np.float64)
+    if kk < k:
+        pad_d, pad_i = _empty_result(m, k - kk)
+        dist = np.hstack([dist, pad_d])
+        idx = np.hstack([idx, pad_i])
+    return dist, idx
+
+
+def _scan_blocks(m: int, n: int, k: int, chunk: int,
+                 block_d2: Callable[[int, int], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k sobre n filas recorridas por bloques de ``chunk`` para acotar la
+    memoria; ``block_d2(start, end)`` da las distancias al cuadrado (m, end - start).
+    """
+    best_d = best_i = None
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        d, i = _topk(block_d2(start, end), k)
+        i = np.where(i >= 0, i + start, -1)
+        if best_d is None:
+            best_d, best_i = d, i
+        else:
+            d = np.hstack([best_d, d])
+            i = np.hstack([best_i, i])
+            order = np.argsort(d, axis=1)[:, :k]
+            best_d = np.take_along_axis(d, order, axis=1)
+            best_i = np.take_along_axis(i, order, axis=1)
+    return best_d, best_i
+
+
+# --------------------------
+# K-means en NumPy puro
+# --------------------------
+def _assign(data: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    c_norms = _sq_norms(centroids)
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = data[start: start + chunk]
+        d2 = c_norms[None, :] - 2.0 * block @ centroids.T
+        out[start: start + chunk] = np.argmin(d2, axis=1)
+    return out
+
+
+def kmeans(
+    data: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 12,
+    max_train: int = 100_000,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Lloyd sobre una muestra de ``data``. Devuelve los centroides (n_clusters, dim) en float32.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    if len(data) > max_train:
+        data = data[rng.choice(len(data), max_train, replace=False)]
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = _assign(data, centroids)
+        counts = np.bincount(assign, minlength=n_clusters).astype(np.float32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Clusters vacíos: se reinician con puntos aleatorios
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+# --------------------------
+# Fuerza bruta exacta (float32 + BLAS)
+# --------------------------
+class BruteForceMatcher:
+    name = "brute"
+
+    def __init__(self, data: np.ndarray, chunk: int = 262_144):
+        self.data = np.ascontiguousarray(data, dtype=np.float32)
+        self.norms = _sq_norms(self.data)
+        self.chunk = chunk
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.norms.nbytes
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.data.shape[1])
+        m = len(X)
+        if m == 0 or len(self.data) == 0:
+            return _empty_result(m, k)
+
+        x_norms = _sq_norms(X)
+
+        def block_d2(start, end):
+            return x_norms[:, None] - 2.0 * X @ self.data[start:end].T + self.norms[None, start:end]
+
+        return _scan_blocks(m, len(self.data), k, self.chunk, block_d2)
+
+
+# --------------------------
+# Galería cuantizada (float16 / int8)
+# --------------------------
+class QuantizedMatcher:
+    """
+    Fuerza bruta sobre la galería guardada en float16 o en int8 con escala y
+    desplazamiento por dimensión (c = round((x - offset) / scale), 256 niveles
+    entre el mínimo y el máximo de cada dimensión).
+
+    Las distancias se calculan por bloques descuantizando sólo el bloque a
+    float32: x·(c·scale + offset) = (x·scale)·c + x·offset, así que la
+    galería no existe nunca entera en coma flotante. Son aproximadas (error
+    del orden de 1e-3 en int8); FaceIndex(rerank=k) recalcula las exactas de
+    los k mejores candidatos.
+    """
+
+    def __init__(self, data: np.ndarray, precision: str = "int8", chunk: int = 32_768):
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"Precisión desconocida: {precision} (opciones: float16, int8)")
+        self.name = precision
+        self.chunk = chunk
+        self.n, self.dim = data.shape
+        self.scale = np.ones(self.dim, dtype=np.float32)
+        self.offset = np.zeros(self.dim, dtype=np.float32)
+
+        if precision == "float16":
+            self.codes = np.asarray(data, dtype=np.float16)
+        else:
+            self.codes = np.empty((self.n, self.dim), dtype=np.int8)
+            if self.n:
+                lo = data.min(axis=0).astype(np.float32)
+                hi = data.max(axis=0).astype(np.float32)
+                self.scale = np.where(hi > lo, (hi - lo) / 255.0, 1.0).astype(np.float32)
+                # offset = valor del código 0 (los códigos van de -128 a 127)
+                self.offset = (lo + 128.0 * self.scale).astype(np.float32)
+            for start in range(0, self.n, chunk):
+                block = (np.asarray(data[start: start + chunk], dtype=np.float32) - self.offset) / self.scale
+                self.codes[start: start + chunk] = np.clip(np.rint(block), -128, 127)
+
+        # Normas de los vectores descuantizados (las que usa la distancia aproximada)
+        self.norms = np.empty(self.n, dtype=np.float32)
+        for start in range(0, self.n, chunk):
+            self.norms[start: start + chunk] = _sq_norms(self.dequantize(start, start + chunk))
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.norms.nbytes + self.scale.nbytes + self.offset.nbytes
+
+    def dequantize(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        return self.codes[start:end].astype(np.float32) * self.scale + self.offset
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.dim)
+        m = len(X)
+        if m == 0 or self.n == 0:
+            return _empty_result(m, k)
+
+        x_norms = _sq_norms(X)
+        x_scaled = X * self.scale
+        x_offset = X @ self.offset
+
+        def block_d2(start, end):
+            # Descuantización al vuelo: sólo este bloque de códigos pasa a float32
+            dots = x_scaled @ self.codes[start:end].astype(np.float32).T + x_offset[:, None]
+            return x_norms[:, None] - 2.0 * dots + self.norms[None, start:end]
+
+        return _scan_blocks(m, self.n, k, self.chunk, block_d2)
+
+
+# --------------------------
+# KDTree (sklearn)
+# --------------------------
+class KDTreeMatcher:
+    name = "kdtree"
+
+    def __init__(self, data: np.ndarray):
+        data = np.asarray(data, dtype=np.float64)
+        self.n, self.dim = data.shape
+        self.tree = KDTree(data) if self.n else None
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        # El árbol guarda su propia copia de los datos en float64
+        return sum(a.nbytes for a in self.tree.get_arrays()) if self.tree is not None else 0
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        m = len(X)
+        if m == 0 or self.tree is None:
+            return _empty_result(m, k)
+        kk = min(k, self.n)
+        d, i = self.tree.query(X, k=kk)
+        if kk < k:
+            pad_d, pad_i = _empty_result(m, k - kk)
+            d, i = np.hstack([d, pad_d]), np.hstack([i, pad_i])
+        return d, i
+
+
+# --------------------------
+# IVF (+ PQ opcional)
+# --------------------------
+class IVFMatcher:
+    """
+    Índice invertido: cada vector se asigna a su centroide k-means más cercano
+    y una consulta sólo examina las ``n_probe`` listas más próximas.
+
+    Con ``pq_m > 0`` los vectores se guardan como códigos PQ de ``pq_m``
+    subespacios (1 byte por subespacio) sobre el residuo respecto a su
+    centroide, y las distancias se aproximan con tablas (ADC). Sin PQ las
+    distancias dentro de las listas sondeadas son exactas.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        pq_m: int = 0,
+        seed: int = 0,
+        query_chunk: int = 256,
+    ):
+        data = np.asarray(data, dtype=np.float32)
+        self.n, self.dim = data.shape
+        self.n_lists = n_lists or max(1, int(np.sqrt(max(self.n, 1))))
+        self.n_probe = n_probe
+        self.pq_m = pq_m
+        self.query_chunk = query_chunk
+
+        if self.n == 0:
+            self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+            self.ids = np.zeros(0, dtype=np.intp)
+            self.offsets = np.zeros(1, dtype=np.intp)
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+            return
+
+        self.centroids = kmeans(data, self.n_lists, seed=seed)
+        self.n_lists = len(self.centroids)
+        assign = _assign(data, self.centroids)
+
+        # Listas contiguas: ids ordenados por lista + offsets
+        self.ids = np.argsort(assign, kind="stable").astype(np.intp)
+        counts = np.bincount(assign, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.intp)
+        sorted_data = data[self.ids]
+
+        if pq_m:
+            if self.dim % pq_m:
+                raise ValueError(f"dim={self.dim} no es divisible entre pq_m={pq_m}")
+            self.dsub = self.dim // pq_m
+            residuals = sorted_data - self.centroids[assign[self.ids]]
+            self.codebooks = np.stack([
+                kmeans(residuals[:, j * self.dsub:(j + 1) * self.dsub], 256, max_train=25_000, seed=seed + j)
+                for j in range(pq_m)
+            ])
+            self.codes = np.stack([
+                _assign(residuals[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j])
+                for j in range(pq_m)
+            ], axis=1).astype(np.uint8)
+            self.vectors = None
+        else:
+            self.vectors = np.ascontiguousarray(sorted_data)
+            self.vec_norms = _sq_norms(self.vectors)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        payload = self.codes.nbytes + self.codebooks.nbytes if self.pq_m else self.vectors.nbytes
+        return payload + self.centroids.nbytes + self.ids.nbytes
+
+    def _pq_tables(self, X: np.ndarray, probes: np.ndarray) -> np.ndarray:
+        """
+        Tablas ADC de cada par (consulta, lista sondeada): distancia al cuadrado
+        del residuo de cada subespacio a los 256 códigos, (m, n_probe, pq_m, 256).
+        """
+        m, n_probe = probes.shape
+        R = (X[:, None, :] - self.centroids[probes]).reshape(m, n_probe, self.pq_m, self.dsub)
+        cb_norms = np.einsum("jcd,jcd->jc", self.codebooks, self.codebooks)
+        return (np.einsum("qpjd,qpjd->qpj", R, R)[..., None]
+                - 2.0 * np.einsum("qpjd,jcd->qpjc", R, self.codebooks) + cb_norms)
+
+    def _query_block(self, X: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        m = len(X)
+        dist, ind = _empty_result(m, k)
+        n_probe = min(self.n_probe, self.n_lists)
+        coarse = _sq_norms(self.centroids)[None, :] - 2.0 * X @ self.centroids.T
+        probes = np.argpartition(coarse, n_probe - 1, axis=1)[:, :n_probe]
+
+        # Candidatos de cada consulta en una matriz (m, ancho) rellena con inf / -1:
+        # las listas sondeadas de cada consulta van una detrás de otra
+        sizes = np.diff(self.offsets)[probes]
+        starts = np.cumsum(sizes, axis=1) - sizes
+        width = int(sizes.sum(axis=1).max())
+        if width == 0:
+            return dist, ind
+        d2 = np.full((m, width), np.inf, dtype=np.float32)
+        rows = np.full((m, width), -1, dtype=np.intp)
+        if self.pq_m:
+            tables = self._pq_tables(X, probes)
+        else:
+            x_norms = _sq_norms(X)
+
+        # Una operación por lista sondeada con todas las consultas que la sondean
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        lists, first = np.unique(flat[order], return_index=True)
+        for l, pairs in zip(lists, np.split(order, first[1:])):
+            start, end = self.offsets[l], self.offsets[l + 1]
+            if start == end:
+                continue
+            qs, js = np.divmod(pairs, n_probe)
+            if self.pq_m:
+                block = tables[qs, js][:, np.arange(self.pq_m), self.codes[start:end]].sum(axis=2)
+            else:
+                block = (x_norms[qs, None] - 2.0 * X[qs] @ self.vectors[start:end].T
+                         + self.vec_norms[None, start:end])
+            cols = starts[qs, js][:, None] + np.arange(end - start)
+            d2[qs[:, None], cols] = block
+            rows[qs[:, None], cols] = np.arange(start, end)
+
+        d, i = _topk(d2, k)
+        cand = np.take_along_axis(rows, np.maximum(i, 0), axis=1)
+        valid = (i >= 0) & (cand >= 0)
+        dist[valid] = d[valid]
+        ind[valid] = self.ids[cand[valid]]
+        return dist, ind
+
+    def query(self, X, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.dim)
+        m = len(X)
+        if m == 0 or self.n == 0:
+            return _empty_result(m, k)
+        # Por bloques de consultas para acotar las tablas ADC y la matriz de candidatos
+        parts = [self._query_block(X[s:s + self.query_chunk], k) for s in range(0, m, self.query_chunk)]
+        return np.vstack([p[0] for p in parts]), np.vstack([p[1] for p in parts])
+
+
+# --------------------------
+# Selección de backend
+# --------------------------
+def build_matcher(
+    data: np.ndarray,
+    backend: str = "auto",
+    ivf_min: int = 200_000,
+    ivf_params: Optional[Dict] = None,
+):
+    """
+    Construye el backend indicado sobre ``data``.
+    Con "auto" se usa fuerza bruta exacta para galerías de menos de
+    ``ivf_min`` caras e IVF (aproximado) a partir de ese tamaño, avisando en el log.
+    "float16" e "int8" son fuerza bruta sobre la galería cuantizada.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de búsqueda desconocido: {backend} (opciones: {BACKENDS})")
+    if backend == "auto":
+        backend = "ivf" if len(data) >= ivf_min else "brute"
+        if backend == "ivf":
+            logger.warning(f"[WARN] Backend \"auto\" con {len(data)} caras (>= {ivf_min}): "
+                           f"se usa IVF, búsqueda aproximada")
+
+    if backend == "brute":
+        return BruteForceMatcher(data)
+    if backend == "kdtree":
+        return KDTreeMatcher(data)
+    if backend in ("float16", "int8"):
+        return QuantizedMatcher(data, precision=backend)
+    return IVFMatcher(data, **(ivf_params or {}))
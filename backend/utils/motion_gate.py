@@ -0,0 +1,85 @@
+# motion_gate.py
+# --------------------------
+# Muestreo adaptativo de frames por movimiento / cambio de escena
+# --------------------------
+#
+# En vez de analizar siempre un frame de cada FRAME_SKIP, el decodificador
+# revisa frames cada ``step`` y sólo manda a analizar (caras + YOLO) los que
+# difieren lo bastante del último frame analizado. La métrica es barata: media
+# de la diferencia absoluta entre miniaturas en gris (64 px de ancho).
+#
+# - Si hay movimiento, ``step`` baja a ``min_step`` (muestreo denso).
+# - Si la escena está quieta, ``step`` se duplica hasta ``max_step``.
+# - Cada ``max_gap`` frames se analiza uno aunque no haya cambios, para no
+#   perder caras que aparecen sin mover casi la imagen.
+#
+# No importa config: los parámetros llegan desde utils.detection_video.
+
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(
+        self,
+        threshold: float = 4.0,
+        min_step: int = 1,
+        max_step: int = 20,
+        max_gap: int = 150,
+        thumb_width: int = 64,
+    ):
+        self.threshold = threshold
+        self.min_step = max(1, min_step)
+        self.max_step = max(self.min_step, max_step)
+        self.max_gap = max_gap
+        self.thumb_width = thumb_width
+
+        self.step = self.min_step
+        self._ref: Optional[np.ndarray] = None
+        self._last_idx = -1
+        self.last_score = 0.0
+
+        self.revisados = 0
+        self.analizados = 0
+        self.saltados = 0
+
+    def _thumbnail(self, frame_bgr: np.ndarray) -> np.ndarray:
+        h, w = frame_bgr.shape[:2]
+        tw = min(self.thumb_width, w)
+        th = max(1, int(round(h * tw / w)))
+        small = cv2.resize(frame_bgr, (tw, th), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Suavizado para que el ruido del sensor / compresión no cuente como movimiento
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def check(self, frame_idx: int, frame_bgr: np.ndarray) -> bool:
+        """
+        Decide si el frame se analiza y ajusta ``step`` (frames hasta la siguiente revisión).
+        """
+        self.revisados += 1
+        thumb = self._thumbnail(frame_bgr)
+
+        if self._ref is None or self._ref.shape != thumb.shape:
+            motion, self.last_score = True, float("inf")
+        else:
+            self.last_score = float(cv2.absdiff(thumb, self._ref).mean())
+            motion = self.last_score >= self.threshold
+
+        self.step = self.min_step if motion else min(self.step * 2, self.max_step)
+
+        if motion or frame_idx - self._last_idx >= self.max_gap:
+            self._ref = thumb
+            self._last_idx = frame_idx
+            self.analizados += 1
+            return True
+        self.saltados += 1
+        return False
+
+    def stats(self) -> Dict:
+        return {
+            "frames_revisados": self.revisados,
+            "frames_analizados": self.analizados,
+            "frames_saltados": self.saltados,
+        }
@@ -0,0 +1,378 @@
+# shared_gallery.py
+# --------------------------
+# Galería de encodings compartida entre procesos (varios workers de gunicorn):
+# fichero sólo-añadir mapeado en memoria + contador de generación
+# --------------------------
+#
+# En un directorio (GALERIA_DIR):
+#   - ``encodings.f32``: cabecera de 4 KB y después las filas (N, dim) float32,
+#     contiguas. Todos los workers la mapean de sólo lectura, así que las
+#     páginas están una vez en memoria (caché de páginas) por muchos workers
+#     que haya, y el segmento principal de fuerza bruta se construye sobre
+#     ellas sin copiarlas (ver utils.face_index.FaceIndex.attach_rows).
+#   - ``eventos.log``: un evento por línea, en orden: ``+nombre`` (alta: la
+#     siguiente fila del fichero), ``-nombre`` (baja de una cara) o
+#     ``*individuo_id`` (baja de todas las caras de un individuo).
+#   - ``galeria.lock``: lock entre procesos (flock) para las escrituras.
+#
+# Un escritor añade filas y eventos detrás de lo ya confirmado y al final
+# reescribe la cabecera (filas, bytes de log y generación + 1). Los lectores
+# (``sync``) leen la cabecera; si la generación ha cambiado aplican a su
+# FaceIndex los eventos nuevos, volviendo a mapear el fichero si ha crecido.
+# El fichero nunca se trunca mientras está en uso (crece con ftruncate) y una
+# reconstrucción completa escribe otro fichero y lo sustituye con rename: los
+# mapeos antiguos siguen siendo válidos.
+#
+# Compactación: las bajas sólo marcan filas muertas, que cada consulta tiene
+# que saltarse. Cuando los eventos de baja desde la última reconstrucción
+# llegan a ``compact_threshold``, el escritor (con el lock) reescribe la
+# galería sólo con las filas vivas e incrementa ``build``; cada lector, al
+# ver otro ``build``, mapea el fichero nuevo y reconstruye su índice con él.
+#
+# Sólo POSIX (fcntl), como gunicorn.
+
+import os
+import uuid
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.face_index import individuo_id_from_name
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin galería compartida
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FACEGAL2"
+HEADER_SIZE = 4096
+# magic, dim, capacidad (filas), filas, bytes de log, generación, reconstrucción,
+# eventos de baja desde la reconstrucción, sesión
+_HEADER = struct.Struct("<8sQQQQQQQ32s")
+ALTA, BAJA, BAJA_INDIVIDUO = "+", "-", "*"
+
+
+class Header:
+    __slots__ = ("dim", "capacity", "rows", "log_bytes", "generation", "build", "removals", "session")
+
+    def __init__(self, dim: int, capacity: int = 0, rows: int = 0, log_bytes: int = 0,
+                 generation: int = 0, build: int = 0, removals: int = 0, session: str = ""):
+        self.dim = dim
+        self.capacity = capacity
+        self.rows = rows
+        self.log_bytes = log_bytes
+        self.generation = generation
+        self.build = build
+        self.removals = removals
+        self.session = session
+
+    def pack(self) -> bytes:
+        return _HEADER.pack(MAGIC, self.dim, self.capacity, self.rows, self.log_bytes,
+                            self.generation, self.build, self.removals, self.session.encode()[:32])
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "Header":
+        magic, dim, capacity, rows, log_bytes, generation, build, removals, session = \
+            _HEADER.unpack(data[: _HEADER.size])
+        if magic != MAGIC:
+            raise ValueError("El fichero no es una galería de encodings")
+        return cls(dim, capacity, rows, log_bytes, generation, build, removals,
+                   session.rstrip(b"\0").decode())
+
+
+class SharedGallery:
+    """
+    Galería compartida en ``directory``. Cada proceso crea la suya (no se
+    comparte el objeto) y la sincroniza con su FaceIndex con ``sync``.
+    """
+
+    def __init__(self, directory: str, dim: int = 128, compact_threshold: int = 64):
+        if fcntl is None:
+            raise RuntimeError("La galería compartida necesita fcntl (Linux/macOS)")
+        self.directory = directory
+        self.dim = dim
+        self.compact_threshold = compact_threshold
+        self.data_path = os.path.join(directory, "encodings.f32")
+        self.log_path = os.path.join(directory, "eventos.log")
+        self.lock_path = os.path.join(directory, "galeria.lock")
+        os.makedirs(directory, exist_ok=True)
+
+        # Entre hilos del mismo proceso (flock es por descriptor abierto)
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Estado de la sincronización de este proceso
+        self._generation = -1
+        self._build = -1
+        self._log_offset = 0
+        self._mmap: Optional[np.memmap] = None
+
+    # --------------------------
+    # Cabecera y lock
+    # --------------------------
+    def header(self) -> Optional[Header]:
+        """
+        Cabecera confirmada (None si la galería no existe todavía o es de un
+        formato anterior). Se lee dos veces para no quedarse con una escritura
+        a medias.
+        """
+        try:
+            with open(self.data_path, "rb") as f:
+                while True:
+                    a = os.pread(f.fileno(), _HEADER.size, 0)
+                    b = os.pread(f.fileno(), _HEADER.size, 0)
+                    if a == b:
+                        break
+        except FileNotFoundError:
+            return None
+        if len(a) < _HEADER.size:
+            return None
+        try:
+            return Header.unpack(a)
+        except ValueError:
+            return None
+
+    @contextmanager
+    def locked(self):
+        """
+        Lock exclusivo entre procesos (y entre hilos de este proceso).
+        """
+        with self._write_lock:
+            with self._flock(fcntl.LOCK_EX):
+                yield
+
+    @contextmanager
+    def _flock(self, mode: int):
+        with open(self.lock_path, "a+") as f:
+            fcntl.flock(f.fileno(), mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _write_header(self, fd: int, header: Header):
+        os.pwrite(fd, header.pack(), 0)
+
+    # --------------------------
+    # Escritura
+    # --------------------------
+    def ensure(self, session: str, build) -> bool:
+        """
+        Si la galería no es de esta sesión (``session``, común a todos los
+        workers de un mismo arranque) la reconstruye con ``build() ->
+        (encodings, names)``; sólo el primer worker que llega lo hace, el resto
+        espera al lock y la reutiliza. Devuelve True si la ha reconstruido.
+        """
+        with self.locked():
+            header = self.header()
+            if header is not None and header.session == session and header.dim == self.dim:
+                return False
+            encodings, names = build()
+            self._rebuild(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim), names, session, header)
+            return True
+
+    def _rebuild(self, encodings: np.ndarray, names: Sequence[str], session: str,
+                 previous: Optional[Header] = None):
+        # Ficheros nuevos + rename: los workers que tengan mapeada la anterior no la pierden
+        tmp = f".tmp{uuid.uuid4().hex[:8]}"
+        log = "".join(f"{ALTA}{name}\n" for name in names).encode("utf-8")
+        capacity = max(1024, 2 * len(encodings))
+        generation, build = (previous.generation + 1, previous.build + 1) if previous else (1, 1)
+        header = Header(self.dim, capacity, len(encodings), len(log), generation, build, 0, session)
+
+        with open(self.log_path + tmp, "wb") as f:
+            f.write(log)
+        with open(self.data_path + tmp, "wb") as f:
+            f.truncate(HEADER_SIZE + capacity * self.dim * 4)
+            f.seek(HEADER_SIZE)
+            f.write(encodings.tobytes())
+            self._write_header(f.fileno(), header)
+        # Primero el de datos: un lector que lea el log nuevo ve ya la cabecera nueva (ver sync)
+        os.replace(self.data_path + tmp, self.data_path)
+        os.replace(self.log_path + tmp, self.log_path)
+        logger.info(f"[OK] Galería compartida creada con {len(encodings)} caras en {self.directory} "
+                    f"(reconstrucción {build})")
+
+    def _append(self, events: str, encodings: Optional[np.ndarray] = None):
+        with self.locked():
+            header = self.header()
+            if header is None:
+                raise RuntimeError(f"La galería {self.directory} no está inicializada")
+            n = 0 if encodings is None else len(encodings)
+            data = events.encode("utf-8")
+            with open(self.data_path, "r+b") as f, open(self.log_path, "r+b") as log:
+                if n:
+                    if header.rows + n > header.capacity:
+                        # Sólo crece: los mapeos existentes siguen siendo válidos
+                        header.capacity = max(2 * header.capacity, header.rows + n)
+                        f.truncate(HEADER_SIZE + header.capacity * self.dim * 4)
+                    os.pwrite(f.fileno(), encodings.tobytes(), HEADER_SIZE + header.rows * self.dim * 4)
+                # Se escribe en la posición confirmada: un escritor que falló a medias se sobrescribe
+                os.pwrite(log.fileno(), data, header.log_bytes)
+                header.rows += n
+                header.log_bytes += len(data)
+                header.generation += 1
+                if not n:
+                    header.removals += events.count("\n")
+                # La cabecera, al final: hasta aquí los lectores no ven nada nuevo
+                self._write_header(f.fileno(), header)
+            if header.removals >= self.compact_threshold:
+                self._compact(header)
+
+    def _compact(self, header: Header):
+        """
+        Reescribe la galería sólo con las filas vivas (con el lock tomado).
+        """
+        with open(self.log_path, "rb") as f:
+            lines = f.read(header.log_bytes).decode("utf-8").splitlines()
+        names: List[str] = []
+        rows_by_name: Dict[str, List[int]] = {}
+        rows_by_individuo: Dict[str, List[int]] = {}
+        alive = np.zeros(header.rows, dtype=bool)
+        for line in lines:
+            op, value = line[:1], line[1:]
+            if op == ALTA:
+                row = len(names)
+                names.append(value)
+                alive[row] = True
+                rows_by_name.setdefault(value, []).append(row)
+                rows_by_individuo.setdefault(individuo_id_from_name(value), []).append(row)
+            elif op == BAJA:
+                alive[rows_by_name.pop(value, [])] = False
+            elif op == BAJA_INDIVIDUO:
+                alive[rows_by_individuo.pop(value, [])] = False
+        keep = np.flatnonzero(alive)
+        data = np.memmap(self.data_path, dtype=np.float32, mode="r",
+                         offset=HEADER_SIZE, shape=(header.rows, self.dim))
+        encodings = np.array(data[keep])
+        del data
+        self._rebuild(encodings, [names[r] for r in keep.tolist()], header.session, header)
+        logger.info(f"[OK] Galería compartida compactada: {header.rows - len(keep)} filas borradas eliminadas")
+
+    def append(self, encodings: np.ndarray, names: Sequence[str]):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(encodings) != len(names):
+            raise ValueError("encodings y names deben tener la misma longitud")
+        if len(names):
+            self._append("".join(f"{ALTA}{name}\n" for name in names), encodings)
+
+    def remove(self, name: str):
+        self._append(f"{BAJA}{name}\n")
+
+    def remove_individuo(self, individuo_id: str):
+        self._append(f"{BAJA_INDIVIDUO}{individuo_id}\n")
+
+    # --------------------------
+    # Lectura
+    # --------------------------
+    @property
+    def generation(self) -> int:
+        """
+        Última generación aplicada por este proceso.
+        """
+        return self._generation
+
+    def sync(self, index) -> bool:
+        """
+        Aplica a ``index`` (un FaceIndex) los eventos confirmados desde la
+        última sincronización. Sin cambios sólo cuesta leer la cabecera.
+        Si la galería se ha reconstruido (compactación) ``index`` se
+        sustituye por uno construido sobre el fichero nuevo.
+        Devuelve True si había una generación nueva.
+        """
+        header = self.header()
+        if header is None or header.generation == self._generation:
+            return False
+        with self._sync_lock:
+            header = self.header()
+            if header is None or header.generation == self._generation:
+                return False
+            if header.build == self._build and self._sync_events(index, header):
+                return True
+            # Reconstruida: con el lock compartido el escritor no la cambia mientras se lee
+            with self._flock(fcntl.LOCK_SH):
+                header = self.header()
+                self._mmap = np.memmap(self.data_path, dtype=np.float32, mode="r",
+                                       offset=HEADER_SIZE, shape=(header.capacity, self.dim))
+                with open(self.log_path, "rb") as f:
+                    data = f.read(header.log_bytes)
+            fresh = index.empty_like()
+            self._apply(fresh, data.decode("utf-8").splitlines())
+            fresh.merge(wait=True)
+            index.adopt(fresh)
+            self._log_offset = header.log_bytes
+            self._generation = header.generation
+            self._build = header.build
+            return True
+
+    def _sync_events(self, index, header: Header) -> bool:
+        """
+        Sincronización incremental sin lock. Devuelve False (sin tocar
+        ``index``) si entretanto la galería se ha reconstruido.
+        """
+        mmap = self._mmap
+        if mmap is None or len(mmap) < header.rows:
+            try:
+                mmap = np.memmap(self.data_path, dtype=np.float32, mode="r",
+                                 offset=HEADER_SIZE, shape=(header.capacity, self.dim))
+            except ValueError:
+                # El fichero ya es el de una reconstrucción más pequeña
+                return False
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(header.log_bytes - self._log_offset)
+        # El fichero de datos se sustituye antes que el log: si lo leído es del
+        # log nuevo, la cabecera ya es la de la reconstrucción
+        current = self.header()
+        if current is None or current.build != header.build:
+            return False
+        self._mmap = mmap
+        self._apply(index, data.decode("utf-8").splitlines())
+        self._log_offset = header.log_bytes
+        self._generation = header.generation
+        return True
+
+    def _apply(self, index, lines: List[str]):
+        altas: List[str] = []
+
+        def flush():
+            if altas:
+                index.attach_rows(self._mmap, altas)
+                altas.clear()
+
+        for line in lines:
+            op, value = line[:1], line[1:]
+            if op == ALTA:
+                altas.append(value)
+                continue
+            flush()
+            if op == BAJA:
+                index.remove(value)
+            elif op == BAJA_INDIVIDUO:
+                index.remove_individuo(value)
+        flush()
+
+    def status(self) -> dict:
+        header = self.header()
+        return {
+            "directorio": self.directory,
+            "generacion": header.generation if header else None,
+            "generacion_aplicada": self._generation,
+            "reconstruccion": header.build if header else None,
+            "bajas_sin_compactar": header.removals if header else 0,
+            "filas": header.rows if header else 0,
+            "mb": round(header.rows * self.dim * 4 / 1e6, 2) if header else 0.0,
+        }
+
+
+def session_id() -> str:
+    """
+    Identificador del arranque actual: GALERIA_SESION (lo pone gunicorn.conf.py
+    en el master, así todos sus workers lo heredan) o, si no, el pid del padre.
+    """
+    return os.environ.get("GALERIA_SESION") or f"ppid-{os.getppid()}"
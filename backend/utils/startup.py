@@ -0,0 +1,163 @@
+# startup.py
+# --------------------------
+# Arranque no bloqueante: cada componente (encodings de referencia, YOLO,
+# MongoDB) se carga en su propio hilo y su estado se puede consultar
+# --------------------------
+#
+# Cada componente pasa por "pendiente" -> "cargando" -> "listo" | "error",
+# con su hora de inicio, duración y error. ``wait`` bloquea hasta que unos
+# componentes han terminado (o vence el timeout) y ``ready`` indica si todos
+# los obligatorios están listos; lo usan get_models y /health/ready.
+#
+# Un componente registrado con ``retry_max_delay`` (MongoDB) que falla queda
+# en "error" y se reintenta en segundo plano con espera creciente (1 s, 2 s,
+# 4 s... hasta ``retry_max_delay``) hasta que carga: una caída breve al
+# arrancar no deja /health/ready en 503 hasta reiniciar.
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+CARGANDO = "cargando"
+LISTO = "listo"
+ERROR = "error"
+
+
+class NotReady(RuntimeError):
+    """
+    Se lanza cuando se pide algo que todavía no ha terminado de cargar.
+    """
+
+    def __init__(self, message: str, status: Optional[Dict] = None):
+        super().__init__(message)
+        self.status = status or {}
+
+
+class _Component:
+    def __init__(self, name: str, fn: Callable[[], None], required: bool, retry_max_delay: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.required = required
+        self.retry_max_delay = retry_max_delay
+        self.estado = PENDIENTE
+        self.inicio: Optional[float] = None
+        self.duracion: Optional[float] = None
+        self.error: Optional[str] = None
+        self.intentos = 0
+        self.done = threading.Event()
+
+    def run(self):
+        # ``done`` se marca tras el primer intento, aunque luego se reintente
+        self._attempt()
+        self.done.set()
+        if self.estado == ERROR and self.retry_max_delay:
+            threading.Thread(target=self._retry, name=f"reintento-{self.name}", daemon=True).start()
+
+    def _attempt(self):
+        self.estado = CARGANDO
+        self.inicio = time.time()
+        self.intentos += 1
+        t0 = time.perf_counter()
+        try:
+            self.fn()
+            self.estado = LISTO
+            self.error = None
+        except Exception as e:
+            self.estado = ERROR
+            self.error = str(e)
+            logger.error(f"[ERROR] Arranque de {self.name} (intento {self.intentos}): {e}")
+        finally:
+            self.duracion = time.perf_counter() - t0
+
+    def _retry(self):
+        delay = 1.0
+        while self.estado == ERROR:
+            time.sleep(delay)
+            delay = min(2 * delay, self.retry_max_delay)
+            self._attempt()
+        logger.info(f"[OK] {self.name} cargado tras {self.intentos} intentos")
+
+    def status(self) -> Dict:
+        return {
+            "estado": self.estado,
+            "obligatorio": self.required,
+            "inicio": self.inicio,
+            "duracion_s": round(self.duracion, 3) if self.duracion is not None else None,
+            "error": self.error,
+            "intentos": self.intentos,
+        }
+
+
+class Startup:
+    """
+    Registro de componentes que se cargan al arrancar.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, _Component] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.t0 = time.time()
+
+    def register(self, name: str, fn: Callable[[], None], required: bool = True,
+                 retry_max_delay: Optional[float] = None):
+        """
+        ``retry_max_delay`` (s): si falla, reintentar en segundo plano con espera
+        creciente hasta ese máximo entre intentos (None = un único intento).
+        """
+        self._components[name] = _Component(name, fn, required, retry_max_delay)
+
+    def start(self, background: bool = True):
+        """
+        Lanza la carga de todos los componentes (una vez). Con ``background``
+        cada uno en su hilo y se vuelve al momento; si no, en serie en este hilo.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for comp in self._components.values():
+            if background:
+                threading.Thread(target=comp.run, name=f"arranque-{comp.name}", daemon=True).start()
+            else:
+                comp.run()
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def wait(self, names: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que terminen (listos o con error) los componentes ``names``
+        (todos si es None). Arranca la carga si nadie lo había hecho.
+        Devuelve False si vence el timeout.
+        """
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names if names is not None else list(self._components):
+            restante = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if not self._components[name].done.wait(restante):
+                return False
+        return True
+
+    def is_done(self, name: str) -> bool:
+        return self._components[name].done.is_set()
+
+    def is_ready(self, name: str) -> bool:
+        return self._components[name].estado == LISTO
+
+    def ready(self) -> bool:
+        return all(c.estado == LISTO for c in self._components.values() if c.required)
+
+    def status(self) -> Dict:
+        componentes = {name: c.status() for name, c in self._components.items()}
+        return {
+            "listo": self.ready(),
+            "arrancado": self._started,
+            "segundos_desde_inicio": round(time.time() - self.t0, 3),
+            "componentes": componentes,
+        }
@@ -0,0 +1,221 @@
+# video_pipeline.py
+# --------------------------
+# Pipeline de video por etapas: decodificación -> análisis en paralelo -> resultados en orden
+# --------------------------
+#
+# - Un hilo decodificador lee el video. Los frames que no se van a analizar se
+#   saltan con ``cap.grab()`` (sin decodificarlos) y los muestreados se dejan
+#   en una cola acotada. Con un ``MotionGate`` (utils.motion_gate) el paso de
+#   muestreo es adaptativo y los frames sin cambios no llegan a la cola.
+# - Los frames muestreados se agrupan en lotes de hasta ``batch_size`` frames
+#   (esperando como mucho ``batch_max_wait`` segundos a completar el lote) y
+#   cada lote se analiza en un pool de procesos: caras frame a frame y YOLO
+#   en una sola llamada para todo el lote.
+# - Los resultados se devuelven en el orden del video. Como mucho hay
+#   ``max_in_flight`` lotes en vuelo; si el consumidor va lento, el
+#   decodificador se bloquea en la cola (backpressure).
+#
+# No importa config: los parámetros llegan desde utils.detection_video.
+
+import time
+import queue
+import threading
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.frame_analysis import analyze_frames, init_worker
+from utils.motion_gate import MotionGate
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_frame_pool(workers: int, yolo_model_path: Optional[str]) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido entre peticiones. Cada worker carga sus
+    modelos una sola vez, así que el pool se crea la primera vez y se reutiliza.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn: no heredar hilos/sockets (Flask, Mongo) del proceso principal
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(yolo_model_path,),
+            )
+            _pool_workers = workers
+            logger.info(f"[OK] Pool de análisis de video con {workers} procesos")
+        return _pool
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode(
+    video_path: str,
+    frame_skip: int,
+    frames_q: queue.Queue,
+    stop: threading.Event,
+    info: Dict,
+    motion_gate: Optional[MotionGate] = None,
+):
+    cap = cv2.VideoCapture(video_path)
+    info["fps"] = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    info["total_frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    frame_idx = 0
+    next_check = 0
+    enviados = 0
+    try:
+        while not stop.is_set():
+            if frame_idx == next_check:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if motion_gate is None:
+                    send = True
+                    next_check += frame_skip
+                else:
+                    send = motion_gate.check(frame_idx, frame)
+                    next_check += motion_gate.step
+                if send:
+                    if not _put(frames_q, (frame_idx, frame), stop):
+                        break
+                    enviados += 1
+            elif not cap.grab():
+                break
+            frame_idx += 1
+    except Exception as e:
+        info["error"] = e
+    finally:
+        info["frames_leidos"] = frame_idx
+        if motion_gate is not None:
+            info.update(motion_gate.stats())
+        else:
+            info.update({"frames_revisados": enviados, "frames_analizados": enviados, "frames_saltados": 0})
+        cap.release()
+        _put(frames_q, None, stop)
+
+
+def _done(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+def _next_batch(
+    frames_q: queue.Queue, block: bool, batch_size: int, batch_max_wait: float
+) -> Tuple[List[Tuple[int, np.ndarray]], bool]:
+    """
+    Saca de la cola hasta ``batch_size`` frames. Tras el primero espera como
+    mucho ``batch_max_wait`` segundos a completar el lote.
+    Devuelve (lote, fin_de_video).
+    """
+    batch: List[Tuple[int, np.ndarray]] = []
+    try:
+        item = frames_q.get(block=block)
+    except queue.Empty:
+        return batch, False
+    if item is None:
+        return batch, True
+    batch.append(item)
+
+    deadline = time.monotonic() + batch_max_wait
+    while len(batch) < batch_size:
+        remaining = deadline - time.monotonic()
+        try:
+            item = frames_q.get(timeout=remaining) if remaining > 0 else frames_q.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+def iter_analyzed_frames(
+    video_path: str,
+    frame_skip: int = 5,
+    workers: int = 0,
+    queue_size: int = 8,
+    max_in_flight: Optional[int] = None,
+    batch_size: int = 1,
+    batch_max_wait: float = 0.05,
+    yolo_model=None,
+    yolo_model_path: Optional[str] = None,
+    info: Optional[Dict] = None,
+    motion_gate: Optional[MotionGate] = None,
+    with_encodings: bool = True,
+    detection: Optional[Dict] = None,
+) -> Iterator[Tuple[int, np.ndarray, Dict]]:
+    """
+    Genera (frame_idx, frame_bgr, análisis) para cada frame muestreado, en orden.
+
+    Con ``workers=0`` el análisis se hace en el hilo actual con ``yolo_model``
+    (útil para depurar); con ``workers>0`` se usa el pool de procesos.
+    ``info`` se rellena con fps y nº total de frames del video y, al terminar
+    la decodificación, con los frames leídos / revisados / analizados / saltados.
+    Con ``motion_gate`` se ignora ``frame_skip`` y el muestreo es adaptativo.
+    Con ``with_encodings=False`` los workers sólo localizan caras (ver utils.face_tracker).
+    ``detection`` fija la escala de detección de caras (ver frame_analysis.detection_scale).
+    """
+    info = info if info is not None else {}
+    frames_q: queue.Queue = queue.Queue(maxsize=max(queue_size, batch_size))
+    stop = threading.Event()
+    decoder = threading.Thread(
+        target=_decode, args=(video_path, frame_skip, frames_q, stop, info, motion_gate), daemon=True
+    )
+    decoder.start()
+
+    pool = get_frame_pool(workers, yolo_model_path) if workers > 0 else None
+    max_in_flight = max_in_flight or max(1, 2 * workers)
+    pending: deque = deque()
+    eof = False
+
+    try:
+        while True:
+            while not eof and len(pending) < max_in_flight:
+                # Sólo se bloquea esperando frames si no hay nada en vuelo
+                batch, eof = _next_batch(frames_q, not pending, batch_size, batch_max_wait)
+                if not batch:
+                    break
+                frames = [frame for _, frame in batch]
+                if pool is not None:
+                    fut = pool.submit(analyze_frames, frames, with_encodings=with_encodings, detection=detection)
+                else:
+                    fut = _done(analyze_frames(
+                        frames, yolo_model=yolo_model, with_encodings=with_encodings, detection=detection))
+                pending.append((batch, fut))
+
+            if not pending:
+                break
+            batch, fut = pending.popleft()
+            for (frame_idx, frame), analysis in zip(batch, fut.result()):
+                yield frame_idx, frame, analysis
+
+        if "error" in info:
+            raise info["error"]
+    finally:
+        stop.set()
+        for _, fut in pending:
+            fut.cancel()
+        decoder.join(timeout=5)
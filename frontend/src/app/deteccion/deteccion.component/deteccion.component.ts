@@ -32,6 +32,8 @@ export class DeteccionComponent {
   individuosVideo: IndividuoConFrames[] = [];
   framesVideo: FrameVideo[] = [];
   objetosVideo: any[] = [];
+  progresoVideo: any = null;
+  procesandoVideo = false;
 
   constructor(
     private individuosService: IndividuosService,
@@ -77,23 +79,59 @@ export class DeteccionComponent {
     const formData = new FormData();
     formData.append('file', this.selectedFileVideo);
 
-    this.individuosService.detectarVideo(formData).subscribe((res: any) => {
-      this.framesVideo = (res.frames_deteccion || []).map((f: any) => ({
-        frame_path: `http://localhost:5000/${f.frame_path}`,
-        individuo: f.individuo,
-      }));
+    this.individuosVideo = [];
+    this.framesVideo = [];
+    this.objetosVideo = [];
+    this.progresoVideo = null;
+    this.procesandoVideo = true;
+
+    // Los resultados se muestran según aparecen en el vídeo
+    this.individuosService.detectarVideoStream(formData).subscribe({
+      next: (evento: any) => {
+        if (evento.tipo === 'individuo') {
+          const frame: FrameVideo = {
+            frame_path: `http://localhost:5000/${evento.frame_path}`,
+            individuo: evento.individuo,
+          };
+          this.framesVideo.push(frame);
+          this.individuosVideo.push({ ...evento.individuo, frames: [frame] });
+        } else if (evento.tipo === 'objetos') {
+          this.objetosVideo = evento.objetos || [];
+        } else if (evento.tipo === 'progreso') {
+          this.progresoVideo = evento;
+        } else if (evento.tipo === 'fin') {
+          this.mostrarResultadoVideo(evento.resultado);
+        } else if (evento.tipo === 'error') {
+          console.error('Error detectando vídeo:', evento.error);
+        }
+        // 🔹 Forzar actualización de la vista
+        this.cdr.detectChanges();
+      },
+      error: (err) => {
+        console.error('Error detectando vídeo:', err);
+        this.procesandoVideo = false;
+        this.cdr.detectChanges();
+      },
+      complete: () => {
+        this.procesandoVideo = false;
+        this.cdr.detectChanges();
+      },
+    });
+  }
 
-      this.objetosVideo = res.objetos || [];
+  private mostrarResultadoVideo(res: any) {
+    this.framesVideo = (res.frames_deteccion || []).map((f: any) => ({
+      frame_path: `http://localhost:5000/${f.frame_path}`,
+      individuo: f.individuo,
+    }));
 
-      // Mapear individuos y asignar sus frames
-      this.individuosVideo = (res.individuos_detectados || []).map((ind: any) => {
-        const indConFrames: IndividuoConFrames = { ...ind };
-        indConFrames.frames = this.framesVideo.filter(fv => fv.individuo._id === ind._id);
-        return indConFrames;
-      });
+    this.objetosVideo = res.objetos || [];
 
-      // 🔹 Forzar actualización de la vista
-      this.cdr.detectChanges();
+    // Mapear individuos y asignar sus frames
+    this.individuosVideo = (res.individuos_detectados || []).map((ind: any) => {
+      const indConFrames: IndividuoConFrames = { ...ind };
+      indConFrames.frames = this.framesVideo.filter(fv => fv.individuo._id === ind._id);
+      return indConFrames;
     });
   }
 
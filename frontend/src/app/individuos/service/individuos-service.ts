@@ -43,5 +43,39 @@ export class IndividuosService {
   detectarVideo(formData: FormData) {
     return this.http.post(`${this.baseUrl}/detectar_video`, formData);
   }
+  // Detección de vídeo en streaming: emite cada evento NDJSON según llega
+  // (individuo, objetos, progreso y fin con el resultado completo)
+  detectarVideoStream(formData: FormData): Observable<any> {
+    return new Observable<any>(subscriber => {
+      const controller = new AbortController();
+      fetch(`${this.baseUrl}/detectar_video?stream=ndjson`, {
+        method: 'POST',
+        body: formData,
+        signal: controller.signal,
+      })
+        .then(async res => {
+          if (!res.ok || !res.body) {
+            throw new Error(`HTTP ${res.status}`);
+          }
+          const reader = res.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() ?? '';
+            for (const line of lines) {
+              if (line.trim()) subscriber.next(JSON.parse(line));
+            }
+          }
+          if (buffer.trim()) subscriber.next(JSON.parse(buffer));
+          subscriber.complete();
+        })
+        .catch(err => subscriber.error(err));
+      return () => controller.abort();
+    });
+  }
 
 }